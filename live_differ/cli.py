@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
 import typer
 import logging
+from typing import List, Optional
 from flask_socketio import SocketIO
 from watchdog.observers import Observer
-from .core import app, setup_logging, init_app_with_debug
-from .modules.differ import FileDiffer
+from .core import app, setup_logging, init_app_with_debug, register_socket_handlers
+from .modules.broker import UnixSocketBroker, socketio_options, unix_socket_path
+from .modules.cache import DiffCache
+from .modules.delivery import UpdateDispatcher
+from .modules.differ import BinaryFileError, FileDiffer
+from .modules.gitblob import parse_revision_spec
+from .modules.normalize import NormalizeOptions
+from .modules.structure import STRUCTURE_MODES
+from .modules.profiling import Profiler, set_profiler
+from .modules.history import HistoryStore
+from .modules.sessions import SessionError, SessionManager
+from .modules.shared import SharedState
 from .modules.watcher import FileChangeHandler
 
 # Configure Flask and Werkzeug loggers to be quiet
 logging.getLogger('werkzeug').disabled = True
+# all: watch and serve in one process; producer: watch and publish only;
+# web: serve what a producer publishes
+ROLES = ('all', 'producer', 'web')
+
 cli = typer.Typer(
     name="live_differ",
     help="A real-time file difference viewer with live updates",
@@ -68,15 +84,109 @@ class QuietSocketIO(SocketIO):
         # Call the original run method
         super().run(app, **kwargs)
 
+def absolute_spec(spec: str) -> str:
+    """Make a file argument absolute; git revision specs (REV:PATH) are kept
+    as given and resolved by FileDiffer"""
+    return spec if parse_revision_spec(spec) else os.path.abspath(spec)
+
+def start_single_pair(file1: str, file2: str, socket, history_size: int, debug: bool, logger,
+                      shared_state: Optional[SharedState] = None):
+    """Watch one pair of files for the classic single-diff server.
+
+    With ``shared_state``, every version is also published for web nodes.
+    Returns a function that stops the watchers.
+    """
+    file1_abs = absolute_spec(file1)
+    file2_abs = absolute_spec(file2)
+    
+    if debug:
+        logger.debug(f"File 1: {file1_abs}")
+        logger.debug(f"File 2: {file2_abs}")
+    
+    # Validate files exist
+    for spec, path in ((file1, file1_abs), (file2, file2_abs)):
+        if not parse_revision_spec(spec) and not os.path.exists(path):
+            raise typer.BadParameter(f"File not found: {spec}")
+    
+    # Store file paths in app config
+    app.config['FILE1'] = file1_abs
+    app.config['FILE2'] = file2_abs
+    
+    # Initialize differ to validate files are readable
+    if debug:
+        logger.debug("Initializing differ...")
+    differ = FileDiffer(
+        app.config['FILE1'], app.config['FILE2'],
+        debug=debug, cache=app.config['DIFF_CACHE'], highlight=app.config['HIGHLIGHT'],
+        normalize=app.config['NORMALIZE']
+    )
+    
+    # Keep a timeline of each working file, starting with its current contents
+    history = None
+    if history_size > 0:
+        history = HistoryStore(max_versions=history_size)
+        for path in differ.watch_paths():
+            try:
+                history.record(path, differ.read_file(path))
+            except BinaryFileError:
+                # Binary files have no line history
+                pass
+    app.config['HISTORY'] = history
+    
+    # Warm the diff so the first page load doesn't pay for it; web nodes
+    # can then serve the current version before the first change
+    if debug:
+        logger.debug("Warming the diff...")
+    diff_data = differ.get_diff()
+    if shared_state is not None:
+        shared_state.publish(differ, diff_data)
+    
+    # Set up file watching
+    if debug:
+        logger.debug("Setting up file watchers...")
+    event_handler = FileChangeHandler(differ, socket, history, shared_state=shared_state)
+    observer = Observer()
+    for watch_dir in sorted({os.path.dirname(path) for path in differ.watch_paths()}):
+        observer.schedule(event_handler, path=watch_dir, recursive=False)
+    observer.start()
+    
+    def stop():
+        observer.stop()
+        observer.join()
+    return stop
+
+def run_producer(file1: str, file2: str, message_queue: str, shared_state: SharedState,
+                 debug: bool, logger):
+    """Watch the files and publish updates for web nodes until interrupted."""
+    broker = None
+    broker_path = unix_socket_path(message_queue)
+    if broker_path is not None:
+        broker = UnixSocketBroker(broker_path)
+        broker.start()
+    # Emits go to the queue only; web nodes deliver them to their clients
+    emitter = SocketIO()
+    emitter.init_app(None, **socketio_options(message_queue, write_only=True))
+    stop_watching = start_single_pair(file1, file2, emitter, 0, debug, logger, shared_state)
+    typer.echo(f"Producer publishing updates to {message_queue}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_watching()
+        if broker is not None:
+            broker.stop()
+
 @cli.command()
 def run(
-    file1: str = typer.Argument(
-        ...,
+    file1: Optional[str] = typer.Argument(
+        None,
         help="First file to compare",
         show_default=False
     ),
-    file2: str = typer.Argument(
-        ...,
+    file2: Optional[str] = typer.Argument(
+        None,
         help="Second file to compare",
         show_default=False
     ),
@@ -99,15 +209,140 @@ def run(
         "--debug",
         help="Enable debug mode",
         envvar="FLASK_DEBUG"
+    ),
+    history_size: int = typer.Option(
+        1000,
+        "--history",
+        help="Number of past versions to keep per file (0 to disable)",
+        envvar="LIVE_DIFFER_HISTORY"
+    ),
+    cache_dir: str = typer.Option(
+        None,
+        "--cache-dir",
+        help="Directory for a persistent diff cache shared across restarts and processes",
+        envvar="LIVE_DIFFER_CACHE_DIR"
+    ),
+    cache_size: int = typer.Option(
+        256,
+        "--cache-size",
+        help="Maximum size of the persistent diff cache in MB",
+        envvar="LIVE_DIFFER_CACHE_SIZE"
+    ),
+    highlight: bool = typer.Option(
+        False,
+        "--highlight",
+        help="Syntax highlight the diff (requires pygments)",
+        envvar="LIVE_DIFFER_HIGHLIGHT"
+    ),
+    ignore_whitespace: bool = typer.Option(
+        False,
+        "--ignore-whitespace",
+        "-w",
+        help="Ignore all whitespace when comparing lines"
+    ),
+    ignore_case: bool = typer.Option(
+        False,
+        "--ignore-case",
+        "-i",
+        help="Ignore case differences when comparing lines"
+    ),
+    ignore_blank_lines: bool = typer.Option(
+        False,
+        "--ignore-blank-lines",
+        "-B",
+        help="Ignore changes that only add or remove blank lines"
+    ),
+    mask: Optional[List[str]] = typer.Option(
+        None,
+        "--mask",
+        help="Regex whose matches are ignored when comparing lines (repeatable)"
+    ),
+    structure: Optional[str] = typer.Option(
+        None,
+        "--structure",
+        help="Compare JSON/YAML documents by key path: auto (by extension), json or yaml",
+        show_default=False
+    ),
+    daemon: bool = typer.Option(
+        False,
+        "--daemon",
+        help="Serve many diff pairs, registered at runtime through /api/sessions",
+        envvar="LIVE_DIFFER_DAEMON"
+    ),
+    idle_timeout: int = typer.Option(
+        600,
+        "--idle-timeout",
+        help="Seconds before an unviewed daemon session is evicted (0 to keep sessions)",
+        envvar="LIVE_DIFFER_IDLE_TIMEOUT"
+    ),
+    root: Optional[List[str]] = typer.Option(
+        None,
+        "--root",
+        help="Directory daemon sessions may read files from (repeatable; default: the current directory)",
+        show_default=False
+    ),
+    reference: Optional[str] = typer.Option(
+        None,
+        "--reference",
+        help="Compare this file against every --variant (implies --daemon)",
+        show_default=False
+    ),
+    variant: Optional[List[str]] = typer.Option(
+        None,
+        "--variant",
+        help="File to compare against --reference (repeatable)",
+        show_default=False
+    ),
+    workers: int = typer.Option(
+        4,
+        "--workers",
+        help="Threads recomputing diffs of daemon sessions",
+        envvar="LIVE_DIFFER_WORKERS"
+    ),
+    role: str = typer.Option(
+        "all",
+        "--role",
+        help="all: watch and serve; producer: only watch and publish; web: only serve a producer's diffs",
+        envvar="LIVE_DIFFER_ROLE"
+    ),
+    message_queue: str = typer.Option(
+        None,
+        "--message-queue",
+        help="Queue relaying updates between a producer and web nodes (redis://..., unix:///path/broker.sock)",
+        envvar="LIVE_DIFFER_MESSAGE_QUEUE"
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Save a cProfile of every diff update and request, and enable /debug/profile",
+        envvar="LIVE_DIFFER_PROFILE"
+    ),
+    profile_dir: str = typer.Option(
+        "profiles",
+        "--profile-dir",
+        help="Directory for --profile output; only the newest files are kept",
+        envvar="LIVE_DIFFER_PROFILE_DIR"
     )
 ):
     """
     Run the Live Differ application to compare two files in real-time.
+
+    With --daemon, one server hosts any number of diff sessions; FILE1 and
+    FILE2 are then optional and register the first session. Sessions may
+    only read files under --root.
+
+    With --reference and --variant, one reference file is compared against
+    many variants: it is read and indexed once, the variants are diffed in
+    parallel, and /compare/<id> summarizes them with a link to each diff.
+
+    To serve more viewers than one process can, run one --role producer and
+    any number of --role web nodes with the same files, --message-queue and
+    --cache-dir. The producer hosts a unix:// queue itself.
     """
     import logging
     
-    # Set up basic logging based on debug flag
-    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
+    # Adjust the queue-based logging set up on import to the debug flag
+    setup_logging(debug)
     logger = logging.getLogger(__name__)
     
     try:
@@ -117,45 +352,113 @@ def run(
             logger.debug(f"Port: {port}")
             logger.debug(f"Debug mode: {debug}")
         
-        # Convert to absolute paths
-        file1_abs = os.path.abspath(file1)
-        file2_abs = os.path.abspath(file2)
+        if bool(reference) != bool(variant):
+            raise typer.BadParameter("--reference and --variant must be given together")
+        # A compare set is a group of daemon sessions
+        daemon = daemon or bool(reference)
+        if (file1 is None) != (file2 is None) or (file1 is None and not daemon):
+            raise typer.BadParameter("FILE1 and FILE2 are required unless --daemon is given")
+        if role not in ROLES:
+            raise typer.BadParameter(f"--role must be one of: {', '.join(ROLES)}")
+        if structure is not None and structure not in STRUCTURE_MODES:
+            raise typer.BadParameter(f"--structure must be one of: {', '.join(STRUCTURE_MODES)}")
+        if role != 'all':
+            if daemon:
+                raise typer.BadParameter("--role can't be combined with --daemon")
+            if not message_queue or not cache_dir:
+                raise typer.BadParameter(f"--role {role} requires --message-queue and --cache-dir")
         
-        if debug:
-            logger.debug(f"File 1: {file1_abs}")
-            logger.debug(f"File 2: {file2_abs}")
+        # Initialize app with debug settings
+        init_app_with_debug(debug)
         
-        # Validate files exist
-        if not os.path.exists(file1_abs):
-            raise typer.BadParameter(f"File not found: {file1}")
-        if not os.path.exists(file2_abs):
-            raise typer.BadParameter(f"File not found: {file2}")
+        # Open the persistent diff cache if one was requested
+        diff_cache = None
+        if cache_dir:
+            if debug:
+                logger.debug(f"Using diff cache in {cache_dir}")
+            diff_cache = DiffCache(cache_dir, max_bytes=cache_size * 1024 * 1024)
+        app.config['DIFF_CACHE'] = diff_cache
+        app.config['HIGHLIGHT'] = highlight
+        app.config['NORMALIZE'] = NormalizeOptions(
+            ignore_whitespace=ignore_whitespace,
+            ignore_case=ignore_case,
+            ignore_blank_lines=ignore_blank_lines,
+            mask_patterns=tuple(mask or ()),
+            structure=structure
+        )
         
-        # Store file paths in app config
-        app.config['FILE1'] = file1_abs
-        app.config['FILE2'] = file2_abs
+        if profile:
+            set_profiler(Profiler(profile_dir))
+            typer.echo(f"Profiling into {os.path.abspath(profile_dir)}")
         
-        # Initialize app with debug settings
-        init_app_with_debug(debug)
+        shared_state = None
+        if role != 'all':
+            # Producer and web nodes find the pair's latest version in the shared cache
+            shared_state = SharedState(
+                diff_cache, absolute_spec(file1), absolute_spec(file2), app.config['NORMALIZE']
+            )
+            # History lives in the producer's memory, which web nodes can't reach
+            history_size = 0
         
-        # Initialize differ to validate files are readable
-        if debug:
-            logger.debug("Initializing differ...")
-        differ = FileDiffer(app.config['FILE1'], app.config['FILE2'], debug=debug)
+        if role == 'producer':
+            run_producer(file1, file2, message_queue, shared_state, debug, logger)
+            return
         
         # Create quiet version of SocketIO
         if debug:
             logger.debug("Setting up SocketIO...")
-        quiet_socketio = QuietSocketIO(app)
+        quiet_socketio = QuietSocketIO(app, **socketio_options(message_queue))
+        register_socket_handlers(quiet_socketio)
+        # Updates go through per-client latest-wins slots instead of a broadcast
+        dispatcher = UpdateDispatcher(quiet_socketio)
+        app.config['DISPATCHER'] = dispatcher
+        if role == 'web':
+            # ...including the updates the producer queues
+            dispatcher.relay_through(quiet_socketio.server.manager)
         
-        # Set up file watching
-        if debug:
-            logger.debug("Setting up file watchers...")
-        event_handler = FileChangeHandler(differ, quiet_socketio)
-        observer = Observer()
-        observer.schedule(event_handler, path=os.path.dirname(differ.file1_path), recursive=False)
-        observer.schedule(event_handler, path=os.path.dirname(differ.file2_path), recursive=False)
-        observer.start()
+        if daemon:
+            # One observer, worker pool and cache shared by every session
+            sessions = SessionManager(
+                dispatcher,
+                cache=diff_cache,
+                highlight=highlight,
+                normalize=app.config['NORMALIZE'],
+                history_size=history_size,
+                idle_timeout=idle_timeout,
+                max_workers=workers,
+                debug=debug,
+                # Anything a session is given is readable through the API
+                roots=root or [os.getcwd()]
+            )
+            app.config['SESSIONS'] = sessions
+            sessions.start()
+            if file1 is not None:
+                try:
+                    session = sessions.create(file1, file2)
+                except SessionError as e:
+                    sessions.stop()
+                    raise typer.BadParameter(str(e))
+                typer.echo(f"Session {session.id} available at: http://localhost:{port}{session.url}")
+            if reference:
+                try:
+                    compare_set = sessions.create_set(reference, variant)
+                except SessionError as e:
+                    sessions.stop()
+                    raise typer.BadParameter(str(e))
+                typer.echo(
+                    f"{reference} against {len(variant)} variants available at: "
+                    f"http://localhost:{port}{compare_set.url}"
+                )
+            stop_watching = sessions.stop
+        elif role == 'web':
+            # Updates arrive through the message queue; no files are watched here
+            app.config['FILE1'] = absolute_spec(file1)
+            app.config['FILE2'] = absolute_spec(file2)
+            app.config['HISTORY'] = None
+            app.config['SHARED_STATE'] = shared_state
+            stop_watching = lambda: None
+        else:
+            stop_watching = start_single_pair(file1, file2, dispatcher, history_size, debug, logger)
         
         # Display startup message
         start_message(host, port, debug)
@@ -186,8 +489,7 @@ def run(
             raise typer.Exit(code=1)
         finally:
             logger.debug("Shutting down file watchers...")
-            observer.stop()
-            observer.join()
+            stop_watching()
             
     except Exception as e:
         logger.error(f"Error in run command: {e}", exc_info=True)
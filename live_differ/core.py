@@ -1,40 +1,91 @@
 #!/usr/bin/env python3
 import os
+import re
+import atexit
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
-from flask import Flask, render_template, request, jsonify, Response
-from flask_socketio import SocketIO
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from urllib.parse import urlsplit
+from flask import Flask, g, render_template, request, jsonify, Response
+from flask_socketio import SocketIO, join_room
 from flask_cors import CORS
-from .modules.differ import FileDiffer
+from .modules.differ import DifferError, FileDiffer
+from .modules.history import HistoryError
+from .modules.normalize import NormalizeOptions
+from .modules.profiling import MAX_SAMPLE_SECONDS, get_profiler, sample_stacks
+from .modules.sessions import SessionError
+from .modules.timing import TIMING_LOGGER, TimingFormatter
+
+# Directory of the log files, unless overridden by the environment (the tests do)
+LOG_DIR_ENV = 'LIVE_DIFFER_LOG_DIR'
+
+# Background writer of the log; setup_logging creates it once
+_log_listener = None
+_log_handlers = {}
 
-# Configure logging
 def setup_logging(debug=False):
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Set up file handler
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, 'app.log'),
-        maxBytes=10485760,  # 10MB
-        backupCount=10
-    )
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.DEBUG if debug else logging.WARNING)  # Only debug logs in file if debug mode
+    """Route log records through a queue to a background writer.
+
+    Request, socket and watcher threads only enqueue records; formatting,
+    file I/O and rotation happen on the listener's thread. Calling it again
+    (the CLI does, after the import-time call) only updates the levels.
+    """
+    global _log_listener
+    if _log_listener is None:
+        log_dir = os.environ.get(LOG_DIR_ENV, 'logs')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        
+        # Set up file handler
+        file_handler = RotatingFileHandler(
+            os.path.join(log_dir, 'app.log'),
+            maxBytes=10485760,  # 10MB
+            backupCount=10
+        )
+        file_handler.setFormatter(formatter)
+        
+        # Set up console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        
+        # Per-diff timing records go to their own file, as JSON lines
+        timing_handler = RotatingFileHandler(
+            os.path.join(log_dir, 'timing.log'),
+            maxBytes=10485760,
+            backupCount=3
+        )
+        timing_handler.setFormatter(TimingFormatter())
+        timing_handler.addFilter(logging.Filter(TIMING_LOGGER))
+        timing_handler.setLevel(logging.INFO)
+        # ...and only there
+        not_timing = lambda record: not record.name.startswith(TIMING_LOGGER)
+        file_handler.addFilter(not_timing)
+        console_handler.addFilter(not_timing)
+        
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        _log_listener = QueueListener(
+            log_queue, file_handler, console_handler, timing_handler,
+            respect_handler_level=True
+        )
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+        _log_handlers.update(file=file_handler, console=console_handler, queue=queue_handler)
+        logging.getLogger().addHandler(queue_handler)
     
-    # Set up console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.DEBUG if debug else logging.ERROR)  # Only error logs in console if not debug
+    _log_handlers['file'].setLevel(logging.DEBUG if debug else logging.WARNING)  # Only debug logs in file if debug mode
+    _log_handlers['console'].setLevel(logging.DEBUG if debug else logging.ERROR)  # Only error logs in console if not debug
+    # Drop records no handler wants before they are queued; timing records are INFO
+    _log_handlers['queue'].setLevel(logging.DEBUG if debug else logging.INFO)
     
     # Configure root logger
     logger = logging.getLogger()
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
     logger.setLevel(logging.DEBUG if debug else logging.WARNING)
     
     # Configure Flask and related loggers to be quiet unless in debug mode
@@ -99,49 +150,119 @@ def init_app_with_debug(debug=False):
 
 @app.before_request
 def log_request_info():
-    """Log details about each request."""
+    """Note when each request starts, for logging its duration."""
     if app.debug:
-        app.logger.debug("=" * 50)
-        app.logger.debug("Incoming request:")
-        app.logger.debug(f"Method: {request.method}")
-        app.logger.debug(f"URL: {request.url}")
-        app.logger.debug(f"Headers: {dict(request.headers)}")
-        app.logger.debug("=" * 50)
+        g.request_started = time.perf_counter()
+
+@app.before_request
+def start_request_profile():
+    """Profile the request when --profile is on."""
+    profiler = get_profiler()
+    if profiler is not None and request.endpoint != 'debug_profile':
+        g.profile = profiler.start()
+
+@app.teardown_request
+def save_request_profile(exc=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        get_profiler().stop(profile, f"request-{request.endpoint or 'unknown'}")
 
 @app.after_request
 def after_request(response):
-    """Log response info."""
+    """Log one line per request: method, URL, status and duration."""
     if app.debug:
-        app.logger.debug("=" * 50)
-        app.logger.debug("Outgoing response:")
-        app.logger.debug(f"Status: {response.status}")
-        app.logger.debug(f"Headers: {dict(response.headers)}")
-        app.logger.debug("=" * 50)
+        started = g.get('request_started')
+        elapsed = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        # %-style arguments are only formatted when debug records are enabled
+        app.logger.debug("%s %s -> %s in %.1f ms", request.method, request.full_path, response.status, elapsed)
     return response
 
+# Largest page of search matches or rows served per request
+MAX_PAGE = 1000
+
+def make_differ():
+    """Create a differ for the configured pair of files"""
+    shared_state = app.config.get('SHARED_STATE')
+    if shared_state is not None:
+        # Web nodes diff the latest version published by the producer
+        return shared_state.differ(debug=app.debug, highlight=app.config.get('HIGHLIGHT', False))
+    return FileDiffer(
+        app.config.get('FILE1'), app.config.get('FILE2'),
+        debug=app.debug,
+        cache=app.config.get('DIFF_CACHE'),
+        highlight=app.config.get('HIGHLIGHT', False),
+        normalize=app.config.get('NORMALIZE')
+    )
+
+def get_session(session_id):
+    """Return a daemon session and mark it active, or None if there is no such session"""
+    sessions = app.config.get('SESSIONS')
+    if sessions is None:
+        return None
+    try:
+        session = sessions.get(session_id)
+    except SessionError:
+        return None
+    session.touch()
+    return session
+
+def differ_for(session_id=None):
+    """The differ behind a request: a daemon session's, or one for the configured files"""
+    if session_id is not None:
+        session = get_session(session_id)
+        return session.differ if session is not None else None
+    if not app.config.get('FILE1') or not app.config.get('FILE2'):
+        return None
+    return make_differ()
+
+def history_for(session_id=None):
+    if session_id is not None:
+        session = get_session(session_id)
+        return session.history if session is not None else None
+    return app.config.get('HISTORY')
+
+def missing_target(session_id=None):
+    if session_id is not None:
+        return jsonify({"error": f"Unknown session: {session_id}"}), 404
+    return jsonify({"error": "File paths not configured"}), 400
+
 @app.route('/')
-def index():
+@app.route('/s/<session_id>')
+def index(session_id=None):
     """Render the index page with file comparison."""
     try:
         if app.debug:
             app.logger.debug("Index route accessed")
         
-        # Get file paths
-        file1 = app.config.get('FILE1')
-        file2 = app.config.get('FILE2')
-        
-        if app.debug:
-            app.logger.debug(f"File1: {file1}")
-            app.logger.debug(f"File2: {file2}")
+        if session_id is not None:
+            session = get_session(session_id)
+            if session is None:
+                return render_template('error.html', error=f"Unknown session: {session_id}"), 404
+        else:
+            # Get file paths
+            file1 = app.config.get('FILE1')
+            file2 = app.config.get('FILE2')
+            
+            if app.debug:
+                app.logger.debug(f"File1: {file1}")
+                app.logger.debug(f"File2: {file2}")
+            
+            if not file1 or not file2:
+                error_msg = "File paths not configured"
+                if app.config.get('SESSIONS') is not None:
+                    error_msg = "No default diff; create a session with POST /api/sessions"
+                app.logger.error(error_msg)
+                return render_template('error.html', error=error_msg), 400
         
-        if not file1 or not file2:
-            error_msg = "File paths not configured"
-            app.logger.error(error_msg)
-            return render_template('error.html', error=error_msg), 400
+        # Page URLs and socket.io room are scoped to the session in daemon mode
+        page = {
+            'base_url': f"/s/{session_id}" if session_id is not None else '',
+            'session_id': session_id or ''
+        }
         
         # Initialize differ and get diff
         try:
-            differ = FileDiffer(file1, file2, debug=app.debug)
+            differ = session.differ if session_id is not None else make_differ()
             diff_data = differ.get_diff()
             if app.debug:
                 app.logger.debug("Diff generated successfully")
@@ -155,7 +276,7 @@ def index():
                     app.logger.debug("Large diff detected, streaming response")
                 def generate():
                     # Yield the template header
-                    yield render_template('index_header.html', diff_data=diff_data)
+                    yield render_template('index_header.html', diff_data=diff_data, **page)
                     # Yield the diff content div start
                     yield '<div class="diff-content" id="diff-view">'
                     # Yield the diff in chunks
@@ -165,14 +286,14 @@ def index():
                         yield diff_html[i:i + chunk_size]
                     # Yield the diff content div end and footer
                     yield '</div>'
-                    yield render_template('index_footer.html')
+                    yield render_template('index_footer.html', **page)
                 
                 return app.response_class(generate(), mimetype='text/html')
             
             # For smaller diffs, render normally
             if app.debug:
                 app.logger.debug("Rendering template...")
-            response = render_template('index.html', diff_data=diff_data)
+            response = render_template('index.html', diff_data=diff_data, **page)
             if app.debug:
                 app.logger.debug("Template rendered successfully")
             return response
@@ -190,6 +311,272 @@ def health_check():
     """Simple health check endpoint."""
     return jsonify({"status": "ok"})
 
+@app.route('/api/history')
+@app.route('/s/<session_id>/api/history')
+def history_versions(session_id=None):
+    """List the recorded versions of each watched file."""
+    if session_id is not None and get_session(session_id) is None:
+        return missing_target(session_id)
+    history = history_for(session_id)
+    if history is None:
+        return jsonify({"error": "History is disabled"}), 404
+    return jsonify({"files": history.to_dict()})
+
+@app.route('/api/history/diff')
+@app.route('/s/<session_id>/api/history/diff')
+def history_diff(session_id=None):
+    """Diff two recorded versions of a watched file."""
+    if session_id is not None and get_session(session_id) is None:
+        return missing_target(session_id)
+    history = history_for(session_id)
+    if history is None:
+        return jsonify({"error": "History is disabled"}), 404
+    path = request.args.get('path', '')
+    from_id = request.args.get('from', type=int)
+    to_id = request.args.get('to', type=int)
+    if not path or from_id is None or to_id is None:
+        return jsonify({"error": "path, from and to are required"}), 400
+    try:
+        from_lines = history.get(path, from_id)
+        to_lines = history.get(path, to_id)
+    except HistoryError as e:
+        return jsonify({"error": str(e)}), 404
+    name = os.path.basename(path)
+    diff_html = FileDiffer.make_diff_table(
+        from_lines, to_lines, f"{name} (v{from_id})", f"{name} (v{to_id})"
+    )
+    return jsonify({"path": path, "from": from_id, "to": to_id, "diff_html": diff_html})
+
+@app.route('/api/search')
+@app.route('/s/<session_id>/api/search')
+def search_diff(session_id=None):
+    """Search both files and return the diff rows of the matches, a page at a time."""
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_PAGE)
+    differ = differ_for(session_id)
+    if differ is None:
+        return missing_target(session_id)
+    try:
+        return jsonify(differ.search(query, offset, limit))
+    except DifferError as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stats')
+@app.route('/s/<session_id>/api/stats')
+def diff_statistics(session_id=None):
+    """Count added, removed and changed lines without rendering the diff."""
+    differ = differ_for(session_id)
+    if differ is None:
+        return missing_target(session_id)
+    try:
+        return jsonify(differ.get_stats())
+    except DifferError as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/rows')
+@app.route('/s/<session_id>/api/rows')
+def diff_rows(session_id=None):
+    """Render a range of diff rows, e.g. ones trimmed from the initial view.
+
+    ``format=json`` returns the rows as data instead of a table body.
+    """
+    start = request.args.get('start', type=int)
+    stop = request.args.get('stop', type=int)
+    if start is None or stop is None:
+        return jsonify({"error": "start and stop are required"}), 400
+    stop = min(stop, start + MAX_PAGE)
+    row_format = request.args.get('format', 'html')
+    if row_format not in ('html', 'json'):
+        return jsonify({"error": "format must be html or json"}), 400
+    differ = differ_for(session_id)
+    if differ is None:
+        return missing_target(session_id)
+    try:
+        return jsonify(differ.get_rows(start, stop, format=row_format))
+    except DifferError as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/unified')
+@app.route('/s/<session_id>/api/unified')
+def unified_diff(session_id=None):
+    """Stream the diff in unified format, hunk by hunk."""
+    context = min(max(request.args.get('context', 3, type=int), 0), 100)
+    differ = differ_for(session_id)
+    if differ is None:
+        return missing_target(session_id)
+    try:
+        hunks = differ.iter_unified(context)
+    except DifferError as e:
+        return jsonify({"error": str(e)}), 500
+    return Response(hunks, mimetype='text/x-diff')
+
+def sessions_or_404():
+    sessions = app.config.get('SESSIONS')
+    if sessions is None:
+        return None, (jsonify({"error": "Sessions are only available in daemon mode"}), 404)
+    return sessions, None
+
+def normalize_options(body, sessions):
+    """Options a request body overrides, or None to use the daemon's"""
+    normalize_keys = ('ignore_whitespace', 'ignore_case', 'ignore_blank_lines', 'mask', 'structure')
+    if not any(key in body for key in normalize_keys):
+        return None
+    defaults = sessions.normalize
+    return NormalizeOptions(
+        ignore_whitespace=bool(body.get('ignore_whitespace', defaults.ignore_whitespace)),
+        ignore_case=bool(body.get('ignore_case', defaults.ignore_case)),
+        ignore_blank_lines=bool(body.get('ignore_blank_lines', defaults.ignore_blank_lines)),
+        mask_patterns=tuple(body.get('mask', defaults.mask_patterns)),
+        structure=body.get('structure', defaults.structure)
+    )
+
+@app.route('/api/sessions', methods=['GET'])
+def list_sessions():
+    """List the diff sessions of a daemon."""
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    return jsonify({"sessions": [session.to_dict() for session in sessions.list()]})
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Register a new diff pair with a daemon.
+
+    The JSON body names ``file1`` and ``file2`` and may override
+    ``highlight``, ``ignore_whitespace``, ``ignore_case``,
+    ``ignore_blank_lines`` and ``mask`` (a list of regexes).
+    """
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    body = request.get_json(silent=True) or {}
+    file1, file2 = body.get('file1'), body.get('file2')
+    if not file1 or not file2:
+        return jsonify({"error": "file1 and file2 are required"}), 400
+    try:
+        session = sessions.create(
+            file1, file2, highlight=body.get('highlight'), normalize=normalize_options(body, sessions)
+        )
+    except SessionError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(session.to_dict()), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session_info(session_id):
+    """Describe one diff session."""
+    session = get_session(session_id)
+    if session is None:
+        return missing_target(session_id)
+    return jsonify(session.to_dict())
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Stop a diff session and release its watches."""
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    try:
+        sessions.delete(session_id)
+    except SessionError:
+        return missing_target(session_id)
+    return '', 204
+
+@app.route('/compare/<set_id>')
+def compare_page(set_id):
+    """Summary of a compare set: one row per variant, linking to its diff."""
+    sessions = app.config.get('SESSIONS')
+    try:
+        compare_set = sessions.get_set(set_id) if sessions is not None else None
+    except SessionError:
+        compare_set = None
+    if compare_set is None:
+        return render_template('error.html', error=f"Unknown compare set: {set_id}"), 404
+    compare_set.touch()
+    return render_template('compare.html', compare_set=compare_set.to_dict())
+
+@app.route('/api/compare', methods=['GET'])
+def list_compare_sets():
+    """List the compare sets of a daemon."""
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    return jsonify({"sets": [compare_set.to_dict() for compare_set in sessions.list_sets()]})
+
+@app.route('/api/compare', methods=['POST'])
+def create_compare_set():
+    """Compare one reference file against many variants.
+
+    The JSON body names ``reference`` and ``variants`` (a list of files) and
+    takes the same overrides as ``POST /api/sessions``.
+    """
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    body = request.get_json(silent=True) or {}
+    reference, variants = body.get('reference'), body.get('variants')
+    if not reference or not variants or not isinstance(variants, list):
+        return jsonify({"error": "reference and a list of variants are required"}), 400
+    try:
+        compare_set = sessions.create_set(
+            reference, variants, highlight=body.get('highlight'), normalize=normalize_options(body, sessions)
+        )
+    except SessionError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(compare_set.to_dict()), 201
+
+@app.route('/api/compare/<set_id>', methods=['GET'])
+def compare_summary(set_id):
+    """A compare set with the diff statistics of every variant."""
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    try:
+        return jsonify(sessions.summary(set_id))
+    except SessionError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.route('/api/compare/<set_id>', methods=['DELETE'])
+def delete_compare_set(set_id):
+    """Stop a compare set and the sessions of its variants."""
+    sessions, error = sessions_or_404()
+    if error:
+        return error
+    try:
+        sessions.delete_set(set_id)
+    except SessionError as e:
+        return jsonify({"error": str(e)}), 404
+    return '', 204
+
+# Only one sampling profile runs at a time
+_sampling = threading.Lock()
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample the stacks of every server thread for ``seconds`` (folded format).
+
+    Only available with --profile, and only to local clients.
+    """
+    if get_profiler() is None:
+        return jsonify({"error": "Profiling is disabled; start with --profile"}), 404
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Profiling is only available from localhost"}), 403
+    seconds = request.args.get('seconds', 5, type=float)
+    if not 0 < seconds <= MAX_SAMPLE_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {MAX_SAMPLE_SECONDS}"}), 400
+    if not _sampling.acquire(blocking=False):
+        return jsonify({"error": "A profile is already being taken"}), 409
+    try:
+        stacks = sample_stacks(seconds)
+    finally:
+        _sampling.release()
+    return Response(
+        stacks, mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename="live-differ.folded"'}
+    )
+
 @app.errorhandler(404)
 def not_found_error(error):
     app.logger.error(f"404 error: {error}")
@@ -200,8 +587,70 @@ def internal_error(error):
     app.logger.exception(f"500 error: {error}")
     return render_template('error.html', error="Internal server error"), 500
 
+def register_socket_handlers(socket):
+    """Track clients for per-client delivery and daemon session rooms."""
+    @socket.on('connect')
+    def on_connect(*args):
+        dispatcher = app.config.get('DISPATCHER')
+        if dispatcher is not None:
+            dispatcher.connect(request.sid)
+
+    @socket.on('join')
+    def on_join(data):
+        sessions = app.config.get('SESSIONS')
+        session_id = (data or {}).get('session')
+        if sessions is None or not session_id:
+            return
+        try:
+            session = sessions.join(request.sid, session_id)
+        except SessionError:
+            socket.emit('session_closed', {'id': session_id}, to=request.sid)
+            return
+        join_room(session.room)
+        dispatcher = app.config.get('DISPATCHER')
+        if dispatcher is not None:
+            dispatcher.set_room(request.sid, session.room)
+
+    @socket.on('pause_updates')
+    def on_pause_updates(*args):
+        dispatcher = app.config.get('DISPATCHER')
+        if dispatcher is not None:
+            dispatcher.pause(request.sid)
+
+    @socket.on('resume_updates')
+    def on_resume_updates(*args):
+        dispatcher = app.config.get('DISPATCHER')
+        if dispatcher is not None:
+            dispatcher.resume(request.sid)
+
+    @socket.on('disconnect')
+    def on_disconnect(*args):
+        sessions = app.config.get('SESSIONS')
+        if sessions is not None:
+            sessions.leave(request.sid)
+        dispatcher = app.config.get('DISPATCHER')
+        if dispatcher is not None:
+            dispatcher.disconnect(request.sid)
+
+register_socket_handlers(socketio)
+
+# Daemon endpoints register files and serve their contents, so only the
+# daemon's own pages may call them
+_DAEMON_PATHS = r"api/sessions|api/compare|s/|compare/"
+_daemon_path = re.compile(rf"/({_DAEMON_PATHS})")
+
+@app.before_request
+def reject_cross_origin():
+    """Refuse requests to daemon endpoints that come from another site's page"""
+    origin = request.headers.get('Origin')
+    if origin is None or not _daemon_path.match(request.path):
+        return None
+    if urlsplit(origin).netloc != request.host:
+        return jsonify({"error": "Cross-origin requests are not allowed"}), 403
+    return None
+
 # Security and CORS settings
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={rf"/(?!{_DAEMON_PATHS}).*": {"origins": "*"}})
 
 # Initialize logging
 setup_logging(debug=False)  # Default to non-debug mode, will be overridden by CLI flag
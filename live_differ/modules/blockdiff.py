@@ -0,0 +1,411 @@
+"""
+Block diff of binary files, the way rsync finds what it doesn't have to send.
+
+Both files are streamed, never loaded whole. First the common prefix and
+suffix are found by comparing aligned chunks, which covers appends,
+truncations and in-place patches at memcmp speed. The middle of the first
+file is then cut into fixed-size blocks, and each block's signature is
+indexed: a weak Adler-32 checksum plus a strong BLAKE2 digest. The middle of
+the second file is scanned against that index. At each position the block
+there is checksummed with ``zlib.adler32``, and a hit confirmed by its
+digest is a copied block. After a miss the checksum is rolled forward a
+byte at a time across one block length. That tries every alignment, so
+content shifted by an insertion or deletion is found again.
+
+Rolling happens in Python, so it is only done right after the files
+diverge and then once every ``RESYNC_EVERY`` missed blocks. Regions that
+match nothing therefore cost a fraction of a byte-by-byte scan. Blocks grow
+with the file so the index never holds more than ``MAX_BLOCKS``
+signatures, and the scan keeps at most a few blocks of the second file in
+memory.
+
+The result is a list of opcodes over byte offsets, in the format of
+``SequenceMatcher.get_opcodes()``. ``render_hex`` shows the changed regions
+as a hex dump. A side is a path, or the bytes of a git blob, which git
+hands over whole anyway.
+"""
+import hashlib
+import html
+import io
+import os
+import zlib
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+Opcode = Tuple[str, int, int, int, int]
+Source = Union[str, bytes]
+
+# Smallest block; blocks double until there are at most MAX_BLOCKS of them
+BLOCK_SIZE = 4096
+MAX_BLOCKS = 1 << 16
+# Bytes read at a time
+READ_SIZE = 1 << 20
+# Missed blocks between two rolling scans while the files are out of sync
+RESYNC_EVERY = 16
+
+_ADLER_MOD = 65521
+
+# Hex view
+BYTES_PER_ROW = 16
+# Changed regions shown, and bytes shown per side of a region
+MAX_REGIONS = 200
+MAX_REGION_BYTES = 4096
+
+
+def _open(source: Source):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+
+def source_size(source: Source) -> int:
+    """Size in bytes of a side"""
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+
+def block_size_for(size: int) -> int:
+    """Block size that keeps the signature index under MAX_BLOCKS entries"""
+    block = BLOCK_SIZE
+    while size // block > MAX_BLOCKS:
+        block *= 2
+    return block
+
+
+def roll_adler32(checksum: int, out_byte: int, in_byte: int, length: int) -> int:
+    """Slide an Adler-32 checksum of ``length`` bytes forward by one byte"""
+    a = checksum & 0xffff
+    b = checksum >> 16
+    a = (a - out_byte + in_byte) % _ADLER_MOD
+    b = (b - length * out_byte + a - 1) % _ADLER_MOD
+    return (b << 16) | a
+
+
+def _strong(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _read_at(f, offset: int, length: int) -> bytes:
+    f.seek(offset)
+    return f.read(length)
+
+
+def _first_difference(data1: bytes, data2: bytes) -> int:
+    """Number of leading bytes two byte strings share, found by halving"""
+    low, high = 0, min(len(data1), len(data2))
+    while low < high:
+        middle = (low + high) // 2
+        if data1[low:middle + 1] == data2[low:middle + 1]:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def common_prefix(f1, f2, limit: int) -> int:
+    """Number of leading bytes the files share, at most ``limit``"""
+    offset = 0
+    while offset < limit:
+        length = min(READ_SIZE, limit - offset)
+        chunk1, chunk2 = _read_at(f1, offset, length), _read_at(f2, offset, length)
+        if chunk1 == chunk2:
+            offset += length
+            continue
+        return offset + _first_difference(chunk1, chunk2)
+    return limit
+
+
+def common_suffix(f1, f2, size1: int, size2: int, limit: int) -> int:
+    """Number of trailing bytes the files share, at most ``limit``"""
+    matched = 0
+    while matched < limit:
+        length = min(READ_SIZE, limit - matched)
+        chunk1 = _read_at(f1, size1 - matched - length, length)
+        chunk2 = _read_at(f2, size2 - matched - length, length)
+        if chunk1 == chunk2:
+            matched += length
+            continue
+        return matched + _first_difference(chunk1[::-1], chunk2[::-1])
+    return limit
+
+
+class Signature:
+    """Weak and strong checksums of the blocks of a byte range of a file."""
+
+    def __init__(self, f, start: int, stop: int, block: int):
+        self.start = start
+        self.block = block
+        self.weak: Dict[int, List[int]] = {}
+        self.strong: List[bytes] = []
+        read_size = max(READ_SIZE // block, 1) * block
+        offset = start
+        f.seek(start)
+        while offset + block <= stop:
+            data = f.read(min(read_size, (stop - offset) // block * block))
+            for begin in range(0, len(data) - block + 1, block):
+                chunk = data[begin:begin + block]
+                self.weak.setdefault(zlib.adler32(chunk), []).append(len(self.strong))
+                self.strong.append(_strong(chunk))
+            offset += len(data)
+
+    def find(self, weak: int, data, expected: int) -> Optional[int]:
+        """Offset of a block with these contents, preferring ``expected``"""
+        candidates = self.weak.get(weak)
+        if not candidates:
+            return None
+        strong = _strong(data)
+        found = None
+        for index in candidates:
+            if self.strong[index] == strong:
+                offset = self.start + index * self.block
+                if offset == expected:
+                    return offset
+                if found is None:
+                    found = offset
+        return found
+
+
+class _Window:
+    """A sliding view of a byte range of a file, read a chunk at a time."""
+
+    def __init__(self, f, start: int, stop: int):
+        self.f = f
+        self.stop = stop
+        self.base = start
+        self.data = b''
+
+    def get(self, start: int, stop: int) -> bytes:
+        """Bytes ``start`` to ``stop``; earlier bytes may then be dropped"""
+        stop = min(stop, self.stop)
+        if start < self.base or stop > self.base + len(self.data):
+            # Keep only what is still ahead, then read on
+            kept = self.data[start - self.base:] if start >= self.base else b''
+            end = start + len(kept)
+            self.f.seek(end)
+            more = self.f.read(max(READ_SIZE, stop - end)) if end < self.stop else b''
+            self.base = start
+            self.data = kept + more[:self.stop - end]
+        return self.data[start - self.base:stop - self.base]
+
+
+def _scan(f2, start2: int, stop2: int, signature: Signature,
+          start1: int) -> Iterator[Tuple[int, int, Optional[int]]]:
+    """Yield ``(start, stop, source)`` ranges of the second file, where
+    ``source`` is the offset of a matching block in the first, or None"""
+    block = signature.block
+    window = _Window(f2, start2, stop2)
+    pos = literal = start2
+    expected = start1
+    misses = 0
+    while pos + block <= stop2:
+        data = window.get(pos, pos + block)
+        source = signature.find(zlib.adler32(data), data, expected)
+        if source is None and misses % RESYNC_EVERY == 0:
+            source, pos = _roll(window, pos, stop2, signature, expected)
+        if source is None:
+            misses += 1
+            pos += block
+            continue
+        if literal < pos:
+            yield literal, pos, None
+        yield pos, pos + block, source
+        pos = literal = pos + block
+        expected = source + block
+        misses = 0
+    if literal < stop2:
+        yield literal, stop2, None
+
+
+def _roll(window: _Window, pos: int, stop2: int, signature: Signature,
+          expected: int) -> Tuple[Optional[int], int]:
+    """Roll the checksum from ``pos`` across one block; return the matching
+    block and the position it was found at, or None and ``pos``"""
+    block = signature.block
+    data = window.get(pos, pos + 2 * block)
+    weak = zlib.adler32(data[:block])
+    for shift in range(1, min(block, len(data) - block) + 1):
+        weak = roll_adler32(weak, data[shift - 1], data[shift + block - 1], block)
+        if weak in signature.weak:
+            source = signature.find(weak, data[shift:shift + block], expected)
+            if source is not None:
+                return source, pos + shift
+    return None, pos
+
+
+class _Opcodes:
+    """Collects opcodes, merging neighbours the way SequenceMatcher would."""
+
+    def __init__(self):
+        self.items: List[Opcode] = []
+
+    def add(self, tag: str, i1: int, i2: int, j1: int, j2: int):
+        if i1 == i2 and j1 == j2:
+            return
+        if tag != 'equal':
+            tag = 'replace' if i1 < i2 and j1 < j2 else ('delete' if i1 < i2 else 'insert')
+        if self.items:
+            last = self.items[-1]
+            if last[2] == i1 and last[4] == j1 and (last[0] == 'equal') == (tag == 'equal'):
+                i1, j1 = last[1], last[3]
+                self.items.pop()
+                if tag != 'equal':
+                    tag = 'replace' if i1 < i2 and j1 < j2 else ('delete' if i1 < i2 else 'insert')
+        self.items.append((tag, i1, i2, j1, j2))
+
+
+def diff_files(source1: Source, source2: Source) -> List[Opcode]:
+    """Opcodes over the byte offsets of two files"""
+    size1, size2 = source_size(source1), source_size(source2)
+    opcodes = _Opcodes()
+    with _open(source1) as f1, _open(source2) as f2:
+        prefix = common_prefix(f1, f2, min(size1, size2))
+        suffix = common_suffix(f1, f2, size1, size2, min(size1, size2) - prefix)
+        stop1, stop2 = size1 - suffix, size2 - suffix
+        opcodes.add('equal', 0, prefix, 0, prefix)
+        signature = Signature(f1, prefix, stop1, block_size_for(stop1 - prefix))
+        i = prefix
+        for j1, j2, source in _scan(f2, prefix, stop2, signature, prefix):
+            if source is None or source < i:
+                # New bytes, or bytes copied from earlier in the first file
+                opcodes.add('insert', i, i, j1, j2)
+                continue
+            opcodes.add('delete', i, source, j1, j1)
+            opcodes.add('equal', source, source + j2 - j1, j1, j2)
+            i = source + j2 - j1
+        opcodes.add('delete', i, stop1, stop2, stop2)
+        opcodes.add('equal', stop1, size1, stop2, size2)
+        return _narrow(f1, f2, opcodes.items)
+
+
+def _narrow(f1, f2, items: List[Opcode]) -> List[Opcode]:
+    """Shrink replaced regions, which are whole blocks, to the bytes that differ"""
+    opcodes = _Opcodes()
+    for tag, i1, i2, j1, j2 in items:
+        if tag != 'replace' or max(i2 - i1, j2 - j1) > READ_SIZE:
+            opcodes.add(tag, i1, i2, j1, j2)
+            continue
+        data1, data2 = _read_at(f1, i1, i2 - i1), _read_at(f2, j1, j2 - j1)
+        prefix = _first_difference(data1, data2)
+        suffix = _first_difference(data1[prefix:][::-1], data2[prefix:][::-1])
+        opcodes.add('equal', i1, i1 + prefix, j1, j1 + prefix)
+        opcodes.add(tag, i1 + prefix, i2 - suffix, j1 + prefix, j2 - suffix)
+        opcodes.add('equal', i2 - suffix, i2, j2 - suffix, j2)
+    return opcodes.items
+
+
+def file_digest(source: Source) -> str:
+    """SHA-256 of a file's contents, read a chunk at a time"""
+    digest = hashlib.sha256()
+    with _open(source) as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def byte_stats(opcodes: Sequence[Opcode], size1: int, size2: int) -> Dict:
+    """Changed, removed and added byte counts, as ``diff_stats`` counts lines"""
+    added = removed = changed = matched = regions = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            matched += i2 - i1
+            continue
+        regions += 1
+        paired = min(i2 - i1, j2 - j1)
+        changed += paired
+        removed += i2 - i1 - paired
+        added += j2 - j1 - paired
+    total = size1 + size2
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'hunks': regions,
+        'similarity': round(2.0 * matched / total, 6) if total else 1.0,
+    }
+
+
+def _hex_cells(row: Optional[Tuple[int, bytes]], changed_start: int, changed_stop: int,
+               css: str) -> str:
+    if row is None:
+        return '<td class="diff_header"></td><td nowrap="nowrap"></td>'
+    offset, data = row
+    hex_parts, text_parts = [], []
+    for k, byte in enumerate(data):
+        position = offset + k
+        shown_hex = f"{byte:02x}"
+        shown_text = html.escape(chr(byte) if 32 <= byte < 127 else '.', quote=False)
+        if changed_start <= position < changed_stop:
+            shown_hex = f'<span class="{css}">{shown_hex}</span>'
+            shown_text = f'<span class="{css}">{shown_text}</span>'
+        hex_parts.append(shown_hex)
+        text_parts.append(shown_text)
+    padding = '   ' * (BYTES_PER_ROW - len(data))
+    return (
+        f'<td class="diff_header">{offset:08x}</td>'
+        f'<td nowrap="nowrap">{" ".join(hex_parts)}{padding}  {"".join(text_parts)}</td>'
+    )
+
+
+def _region_rows(f, start: int, stop: int) -> List[Tuple[int, bytes]]:
+    """Rows of the hex dump around ``start:stop``, whole rows of context included"""
+    first = start - start % BYTES_PER_ROW
+    last = min(stop, start + MAX_REGION_BYTES)
+    if last == start:
+        return []
+    data = _read_at(f, first, last - first + (-last) % BYTES_PER_ROW)
+    return [(first + k, data[k:k + BYTES_PER_ROW]) for k in range(0, len(data), BYTES_PER_ROW)]
+
+
+def render_hex(source1: Source, source2: Source, opcodes: Sequence[Opcode],
+               file1_name: str, file2_name: str) -> str:
+    """Render the changed regions of two binary files side by side as hex dumps"""
+    parts = [f'''
+        <table class="diff-table diff-binary" cellspacing="0" cellpadding="0">
+        <colgroup>
+            <col class="diff_header" width="6%" />
+            <col width="44%" />
+            <col class="diff_header" width="6%" />
+            <col width="44%" />
+        </colgroup>
+        <thead>
+            <tr>
+                <th colspan="2" class="diff_header">{html.escape(file1_name)} (binary)</th>
+                <th colspan="2" class="diff_header">{html.escape(file2_name)} (binary)</th>
+            </tr>
+        </thead>
+''']
+    regions = [opcode for opcode in opcodes if opcode[0] != 'equal']
+    if not regions:
+        parts.append(
+            '        <tbody>\n'
+            '            <tr><td colspan="4" class="diff_none">No differences found</td></tr>\n'
+            '        </tbody>\n'
+        )
+    with _open(source1) as f1, _open(source2) as f2:
+        for tag, i1, i2, j1, j2 in regions[:MAX_REGIONS]:
+            left = _region_rows(f1, i1, i2)
+            right = _region_rows(f2, j1, j2)
+            css = 'diff_chg' if tag == 'replace' else None
+            parts.append('        <tbody>\n')
+            for row in range(max(len(left), len(right))):
+                cells = []
+                for rows, start, stop, side_css in ((left, i1, i2, css or 'diff_sub'),
+                                                    (right, j1, j2, css or 'diff_add')):
+                    cells.append(_hex_cells(rows[row] if row < len(rows) else None,
+                                            start, stop, side_css))
+                parts.append(f'            <tr>{"".join(cells)}</tr>\n')
+            shown = (min(i2 - i1, MAX_REGION_BYTES), min(j2 - j1, MAX_REGION_BYTES))
+            if shown != (i2 - i1, j2 - j1):
+                parts.append(
+                    f'            <tr><td colspan="4" class="diff_none">'
+                    f'{i2 - i1} bytes at {i1:08x} and {j2 - j1} bytes at {j1:08x}; '
+                    f'only the first {MAX_REGION_BYTES} of each are shown</td></tr>\n'
+                )
+            parts.append('        </tbody>\n')
+    if len(regions) > MAX_REGIONS:
+        parts.append(
+            '        <tbody>\n'
+            f'            <tr><td colspan="4" class="diff_none">'
+            f'{len(regions) - MAX_REGIONS} more changed regions not shown</td></tr>\n'
+            '        </tbody>\n'
+        )
+    parts.append('        </table>\n')
+    return ''.join(parts)
@@ -0,0 +1,166 @@
+"""
+Message queue plumbing for running a producer and several web nodes.
+
+Flask-SocketIO relays events between processes through a message queue
+(``redis://``, ``amqp://``, ...). Those need an external service, so for a
+single box and for tests this module also provides a small broker on a Unix
+socket (``unix:///path/to/broker.sock``): every JSON line a publisher writes
+is fanned out to every subscribed connection. ``UnixSocketManager`` plugs it
+into python-socketio as a pub/sub client manager.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from socketio import PubSubManager
+
+logger = logging.getLogger(__name__)
+
+UNIX_SCHEME = 'unix'
+
+
+def unix_socket_path(url: str) -> Optional[str]:
+    """Return the socket path of a ``unix://`` URL, or None for other queues"""
+    parsed = urlparse(url)
+    if parsed.scheme != UNIX_SCHEME:
+        return None
+    return parsed.path or parsed.netloc
+
+
+class UnixSocketBroker:
+    """Fans out newline-delimited messages to subscribed Unix socket clients."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Each subscriber's write lock: publishers fan out on their own
+        # threads, and their lines must not interleave on one connection
+        self.subscribers: Dict[socket.socket, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(64)
+        threading.Thread(target=self._accept, name='live-differ-broker', daemon=True).start()
+        logger.info(f"Message broker listening on {self.path}")
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.close()
+        with self.lock:
+            for conn in self.subscribers:
+                conn.close()
+            self.subscribers.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        reader = conn.makefile('rb')
+        try:
+            for line in reader:
+                if line.startswith(b'SUBSCRIBE'):
+                    with self.lock:
+                        self.subscribers[conn] = threading.Lock()
+                    continue
+                self._fan_out(line)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.subscribers.pop(conn, None)
+            conn.close()
+
+    def _fan_out(self, line: bytes):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for conn, write_lock in subscribers:
+            try:
+                with write_lock:
+                    conn.sendall(line)
+            except OSError:
+                with self.lock:
+                    self.subscribers.pop(conn, None)
+
+
+class UnixSocketManager(PubSubManager):
+    """python-socketio client manager that talks to a ``UnixSocketBroker``."""
+
+    name = 'unix'
+
+    def __init__(self, url: str, channel: str = 'flask-socketio', write_only: bool = False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = unix_socket_path(url)
+        self.publisher = None
+        self.publish_lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.path)
+        return conn
+
+    def _publish(self, data: Dict):
+        line = (json.dumps({'channel': self.channel, 'data': data}) + '\n').encode('utf-8')
+        with self.publish_lock:
+            for attempt in range(2):
+                try:
+                    if self.publisher is None:
+                        self.publisher = self._connect()
+                    self.publisher.sendall(line)
+                    return
+                except OSError as e:
+                    # The broker may have restarted; reconnect once
+                    self.publisher = None
+                    if attempt:
+                        self._get_logger().error(f"Cannot publish to {self.path}: {str(e)}")
+
+    def _listen(self):
+        delay = 0.1
+        while True:
+            try:
+                conn = self._connect()
+            except OSError:
+                # Web nodes may start before the producer hosting the broker
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+                continue
+            delay = 0.1
+            conn.sendall(b'SUBSCRIBE\n')
+            with conn, conn.makefile('rb') as reader:
+                for line in reader:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        self._get_logger().error(
+                            f"Dropped a malformed message from {self.path} ({len(line)} bytes)"
+                        )
+                        continue
+                    if message.get('channel') == self.channel:
+                        yield message['data']
+
+
+def socketio_options(url: Optional[str], write_only: bool = False) -> Dict:
+    """SocketIO keyword arguments for relaying events through ``url``"""
+    if not url:
+        return {}
+    if unix_socket_path(url) is not None:
+        return {'client_manager': UnixSocketManager(url, write_only=write_only)}
+    return {'message_queue': url}
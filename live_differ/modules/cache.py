@@ -0,0 +1,151 @@
+"""
+Persistent diff cache shared across restarts and processes.
+
+Results are stored in a SQLite database keyed by a hash of the input contents
+and the differ options, so a restarted server (or a second live_differ process
+pointed at the same cache directory) can serve a diff without recomputing it.
+The database runs in WAL mode, which lets several processes read while one
+writes; least recently used entries are evicted once the cache grows past its
+size limit.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored format or rendering changes so stale entries are ignored
+CACHE_FORMAT = 5
+
+# Only refresh an entry's access time this often to keep reads from writing
+_TOUCH_INTERVAL = 60
+
+
+def content_hash(lines) -> str:
+    """Hash the contents of a file given as a list of lines.
+
+    Each item is prefixed with its length: segments and document entries
+    carry no newline, so ``['ab', 'c']`` and ``['a', 'bc']`` must differ.
+    """
+    digest = hashlib.sha256()
+    for line in lines:
+        data = line.encode('utf-8', 'surrogatepass')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def make_key(kind: str, **parts: Any) -> str:
+    """Build a cache key from a result kind and the values it depends on"""
+    payload = json.dumps(
+        {'format': CACHE_FORMAT, 'kind': kind, **parts},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiffCache:
+    """SQLite-backed store of diff results."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(self.cache_dir, 'diff-cache.sqlite3')
+        self.local = threading.local()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY,'
+                ' value BLOB NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored value for ``key``, or None on a miss"""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, accessed FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, accessed = row
+            now = time.time()
+            if now - accessed > _TOUCH_INTERVAL:
+                conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            return json.loads(zlib.decompress(value).decode('utf-8'))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logger.warning(f"Diff cache read failed: {str(e)}")
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store ``value`` under ``key`` and evict old entries if needed"""
+        blob = zlib.compress(json.dumps(value).encode('utf-8'), 6)
+        if len(blob) > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                    (key, blob, len(blob), time.time())
+                )
+                self._evict(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Diff cache write failed: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the limit so eviction doesn't run on every write
+        target = self.max_bytes * 0.9
+        for key, size in conn.execute(
+            'SELECT key, size FROM entries ORDER BY accessed'
+        ).fetchall():
+            if total <= target:
+                break
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+        logger.debug(f"Diff cache evicted entries down to {total} bytes")
+
+    def size(self) -> int:
+        """Total stored bytes"""
+        return self._connect().execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()[0]
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entries')
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
@@ -0,0 +1,195 @@
+"""
+Per-client flow control for diff updates.
+
+Broadcasting every ``update_diff`` lets payloads pile up in server memory for
+clients that read slowly or not at all (a laggy VPN, a background tab). The
+dispatcher instead gives every connection one in-flight update and one
+pending slot. A new version replaces whatever is pending, so intermediate
+versions a client hasn't received are dropped rather than queued, and the next
+update is only sent once the client acknowledges the previous one, or once
+the ack is overdue (a timer per update, so no later emit is needed). Hidden
+clients pause delivery and get the latest state when they resume.
+
+The dispatcher has the same ``emit`` signature as a SocketIO server, so it
+can be handed to ``FileChangeHandler`` and ``SessionManager`` in its place.
+On web nodes, ``relay_through`` sends the updates a producer queues through
+it too, instead of broadcasting them.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Events where only the newest payload matters; others pass straight through
+LATEST_WINS_EVENTS = frozenset({'update_diff'})
+
+
+class ClientSlot:
+    """Delivery state of one connection."""
+
+    __slots__ = ('sid', 'room', 'pending', 'in_flight', 'sent_at', 'timer', 'paused', 'dropped')
+
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.room: Optional[str] = None
+        # (event, payload) waiting to be sent, replaced by newer versions
+        self.pending = None
+        # Sequence number of the update awaiting an ack
+        self.in_flight: Optional[int] = None
+        self.sent_at = 0.0
+        # Gives up on the ack, so a pending update doesn't wait for the next emit
+        self.timer: Optional[threading.Timer] = None
+        self.paused = False
+        self.dropped = 0
+
+
+class UpdateDispatcher:
+    """Delivers latest-wins updates to each client at the pace it acknowledges."""
+
+    def __init__(self, socket, ack_timeout: float = 30.0):
+        self.socket = socket
+        # An update that isn't acknowledged in time is presumed lost
+        self.ack_timeout = ack_timeout
+        self.clients: Dict[str, ClientSlot] = {}
+        self.lock = threading.Lock()
+        self.seq = itertools.count(1)
+
+    def connect(self, sid: str):
+        with self.lock:
+            self.clients.setdefault(sid, ClientSlot(sid))
+
+    def disconnect(self, sid: str):
+        with self.lock:
+            slot = self.clients.pop(sid, None)
+            if slot is not None and slot.timer is not None:
+                slot.timer.cancel()
+
+    def set_room(self, sid: str, room: Optional[str]):
+        with self.lock:
+            self.clients.setdefault(sid, ClientSlot(sid)).room = room
+
+    def emit(self, event: str, data: Any, namespace: str = '/', to: Optional[str] = None, **kwargs):
+        """Send ``event`` to every client, or to the clients in room ``to``"""
+        if event not in LATEST_WINS_EVENTS:
+            if to is None:
+                self.socket.emit(event, data, namespace=namespace, **kwargs)
+            elif to in self.clients:
+                # A connection of this node; other nodes would only discard it
+                self.socket.emit(event, data, namespace=namespace, to=to, ignore_queue=True, **kwargs)
+            else:
+                self.socket.emit(event, data, namespace=namespace, to=to, **kwargs)
+            return
+        with self.lock:
+            targets = [
+                slot for slot in self.clients.values()
+                if to is None or slot.room == to or slot.sid == to
+            ]
+            for slot in targets:
+                if slot.pending is not None:
+                    slot.dropped += 1
+                slot.pending = (event, data, namespace)
+        for slot in targets:
+            self._pump(slot.sid)
+
+    def _pump(self, sid: str):
+        with self.lock:
+            slot = self.clients.get(sid)
+            if slot is None or slot.paused or slot.pending is None:
+                return
+            if slot.in_flight is not None:
+                if time.monotonic() - slot.sent_at < self.ack_timeout:
+                    return
+                logger.debug(f"Update {slot.in_flight} to {sid} was never acknowledged")
+            event, data, namespace = slot.pending
+            slot.pending = None
+            seq = next(self.seq)
+            slot.in_flight = seq
+            slot.sent_at = time.monotonic()
+            if slot.timer is not None:
+                slot.timer.cancel()
+            slot.timer = threading.Timer(self.ack_timeout, self._expire, (sid, seq))
+            slot.timer.daemon = True
+            slot.timer.start()
+        # The client is connected to this node, so the payload stays off the
+        # message queue rather than being published to every other node
+        self.socket.emit(
+            event, {**data, 'seq': seq},
+            namespace=namespace, to=sid,
+            callback=lambda *args: self.acknowledge(sid, seq),
+            ignore_queue=True
+        )
+
+    def acknowledge(self, sid: str, seq: int):
+        """The client has rendered update ``seq``; send it anything newer"""
+        with self.lock:
+            slot = self.clients.get(sid)
+            if slot is None or slot.in_flight != seq:
+                return
+            slot.in_flight = None
+            if slot.timer is not None:
+                slot.timer.cancel()
+                slot.timer = None
+        self._pump(sid)
+
+    def _expire(self, sid: str, seq: int):
+        """Update ``seq`` was never acknowledged: send what is pending anyway"""
+        with self.lock:
+            slot = self.clients.get(sid)
+            if slot is None or slot.in_flight != seq:
+                return
+            logger.debug(f"Update {seq} to {sid} was never acknowledged")
+            slot.in_flight = None
+            slot.timer = None
+        self._pump(sid)
+
+    def pause(self, sid: str):
+        """Hold updates for a hidden client, keeping only the latest"""
+        with self.lock:
+            slot = self.clients.get(sid)
+            if slot is not None:
+                slot.paused = True
+
+    def resume(self, sid: str):
+        """Deliver the latest held update, if any, to a client that is visible again"""
+        with self.lock:
+            slot = self.clients.get(sid)
+            if slot is None:
+                return
+            slot.paused = False
+        self._pump(sid)
+
+    def relay_through(self, manager):
+        """Deliver latest-wins events relayed by a pub/sub client ``manager``
+        (python-socketio's, for redis:// or unix:// queues) through the
+        per-client slots; other relayed events are broadcast as before"""
+        handle_emit = manager._handle_emit
+
+        def relay(message):
+            # Local emits pass through here too; only other hosts' broadcasts
+            # are taken, and the per-client sends never reach the queue
+            if message.get('event') not in LATEST_WINS_EVENTS or message.get('binary') \
+                    or message.get('callback') or message.get('host_id') == manager.host_id:
+                return handle_emit(message)
+            data = message['data']
+            if isinstance(data, list) and len(data) == 1:
+                data = data[0]
+            self.emit(message['event'], data, namespace=message.get('namespace') or '/',
+                      to=message.get('room'))
+
+        manager._handle_emit = relay
+
+    def stats(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {
+                sid: {
+                    'room': slot.room,
+                    'paused': slot.paused,
+                    'pending': slot.pending is not None,
+                    'in_flight': slot.in_flight,
+                    'dropped': slot.dropped,
+                }
+                for sid, slot in self.clients.items()
+            }
@@ -1,30 +1,92 @@
 import os
 import difflib
 import logging
-import re
+import time
 from datetime import datetime
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from .blockdiff import byte_stats, diff_files, file_digest, render_hex
+from .cache import DiffCache, content_hash, make_key
+from .encoding import BinaryDataError, is_binary_file, read_lines
+from .gitblob import GitError, GitRevision, parse_revision_spec
+from .highlight import FileHighlighter, get_highlighter
+from .moves import MIN_MOVE_LINES, find_moves
+from .normalize import NormalizeError, NormalizeOptions, compile_pattern, get_normalizer, match_ignoring_blanks
+from .render import (
+    MOVED_FROM, RowModel, build_rows, iter_unified, line_rows, render_rows, render_table,
+    rows_to_json
+)
+from .search import get_line_index
+from .segments import LONG_LINE, SegmentedLines, line_count, segment_lines
+from .singleflight import SingleFlight
+from .stats import diff_stats
+from .structure import (
+    STRUCTURE_MODES, DocumentLines, StructureError, document_format, match_documents, parse_document
+)
+from .timing import log_timing
+from .trim import common_affixes, untrim_opcodes
+
+# Table rendering options; part of every cache key
+RENDER_OPTIONS = {'tabsize': 2, 'context': 5, 'min_move_lines': MIN_MOVE_LINES, 'long_line': LONG_LINE}
+
+# Row models and rendered tables of the most recent diffs, shared by the
+# differs of every request and the watcher; concurrent requests for the same
+# version wait on one computation
+_ROW_MODELS_MAX = 4
+_row_models = SingleFlight(keep=_ROW_MODELS_MAX)
+_tables = SingleFlight(keep=_ROW_MODELS_MAX)
+# Statistics are small and polled often, so more versions are kept
+_STATS_MAX = 64
+_stats = SingleFlight(keep=_STATS_MAX)
+# Byte opcodes of binary pairs, keyed by the version of each file
+_byte_diffs = SingleFlight(keep=_ROW_MODELS_MAX)
 
 class DifferError(Exception):
     """Custom exception for differ-related errors"""
     pass
 
+class BinaryFileError(DifferError):
+    """Raised when the lines of a binary file are asked for"""
+    pass
+
 class FileDiffer:
-    def __init__(self, file1_path: str, file2_path: str, debug: bool = False):
+    def __init__(self, file1_path: str, file2_path: str, debug: bool = False,
+                 cache: Optional[DiffCache] = None, highlight: bool = False,
+                 normalize: Optional[NormalizeOptions] = None):
         self.logger = logging.getLogger(__name__)
         self.debug = debug
+        self.cache = cache
+        self.highlight = highlight
+        self.normalize = normalize or NormalizeOptions()
+        
+        # Fail early on a bad mask pattern rather than on the first diff
+        try:
+            for pattern in self.normalize.mask_patterns:
+                compile_pattern(pattern)
+        except NormalizeError as e:
+            self.logger.error(str(e))
+            raise DifferError(str(e))
+        if self.normalize.structure and self.normalize.structure not in STRUCTURE_MODES:
+            raise DifferError(
+                f"Unknown structure mode {self.normalize.structure!r} "
+                f"(expected one of {', '.join(STRUCTURE_MODES)})"
+            )
         
         if self.debug:
             self.logger.debug(f"Initializing FileDiffer with files: {file1_path}, {file2_path}")
         
         if not all([file1_path, file2_path]):
             raise DifferError("Both file paths must be provided")
-            
-        self.file1_path = os.path.abspath(file1_path)
-        self.file2_path = os.path.abspath(file2_path)
         
-        # Validate files exist and are readable
-        for path in [self.file1_path, self.file2_path]:
+        # Either side may be a git revision spec such as HEAD:path/to/file
+        self.file1_revision = self._resolve_revision(file1_path)
+        self.file2_revision = self._resolve_revision(file2_path)
+        self.file1_path = self.file1_revision.path if self.file1_revision else os.path.abspath(file1_path)
+        self.file2_path = self.file2_revision.path if self.file2_revision else os.path.abspath(file2_path)
+        # Lines of each working file as of the last get_diff()
+        self.last_read: Dict[str, List[str]] = {}
+        
+        # Validate working files exist and are readable
+        for path in self.watch_paths():
             try:
                 with open(path, 'r') as f:
                     pass  # attempt to open the file to verify existence and readability
@@ -41,6 +103,97 @@ class FileDiffer:
         if self.debug:
             self.logger.debug("FileDiffer initialized successfully")
     
+    def _resolve_revision(self, spec: str) -> Optional[GitRevision]:
+        """Return a GitRevision if the spec names a git revision, else None"""
+        if parse_revision_spec(spec) is None:
+            return None
+        try:
+            revision = GitRevision(spec)
+        except GitError as e:
+            self.logger.error(f"Error resolving revision {spec}: {str(e)}")
+            raise DifferError(str(e))
+        if self.debug:
+            self.logger.debug(f"Resolved {spec} to blob {revision.sha}")
+        return revision
+    
+    def watch_paths(self) -> List[str]:
+        """Paths of the working files; revision sides never change on disk"""
+        paths = []
+        if self.file1_revision is None:
+            paths.append(self.file1_path)
+        if self.file2_revision is None:
+            paths.append(self.file2_path)
+        return paths
+    
+    def _get_side_info(self, file_path: str, revision: Optional[GitRevision]) -> Dict[str, Union[str, int]]:
+        if revision is not None:
+            return revision.get_info()
+        return self.get_file_info(file_path)
+    
+    def _read_side(self, file_path: str, revision: Optional[GitRevision]) -> List[str]:
+        if revision is not None:
+            if revision.is_binary():
+                raise BinaryFileError(f"{revision.spec} is a binary file")
+            if self.debug:
+                self.logger.debug(f"Using cached blob {revision.sha} for {revision.spec}")
+            return revision.read_lines()
+        lines = self.read_file(file_path)
+        self.last_read[file_path] = lines
+        return lines
+    
+    def _prepare_sides(self, file1_lines: List[str], file2_lines: List[str]) -> Tuple[List[str], List[str]]:
+        """The lines that are diffed: the flattened documents in structural
+        mode, otherwise the lines with overlong lines cut into segments"""
+        formats = [document_format(path, self.normalize.structure)
+                   for path in (self.file1_path, self.file2_path)]
+        if None not in formats:
+            try:
+                return parse_document(file1_lines, formats[0]), parse_document(file2_lines, formats[1])
+            except StructureError as e:
+                # Half-written files don't parse; show them as lines until they do
+                self.logger.warning(f"Comparing by lines: {str(e)}")
+        return segment_lines(file1_lines), segment_lines(file2_lines)
+    
+    def is_binary(self) -> bool:
+        """Whether either side is binary; such pairs are diffed by bytes"""
+        for path, revision in ((self.file1_path, self.file1_revision), (self.file2_path, self.file2_revision)):
+            if revision is not None:
+                if revision.is_binary():
+                    return True
+                continue
+            try:
+                if is_binary_file(path):
+                    return True
+            except OSError:
+                # Reading it will report the error
+                pass
+        return False
+    
+    def _byte_sources(self) -> List[Union[str, bytes]]:
+        """What the block diff reads: the path of a working file, the bytes of a blob"""
+        return [revision.read_bytes() if revision is not None else path
+                for path, revision in ((self.file1_path, self.file1_revision),
+                                       (self.file2_path, self.file2_revision))]
+    
+    def _byte_key(self, kind: str, **extra) -> str:
+        return make_key(
+            kind,
+            paths=[self.file1_path, self.file2_path],
+            sides=[self._side_digest(self.file1_path, self.file1_revision),
+                   self._side_digest(self.file2_path, self.file2_revision)],
+            **extra
+        )
+    
+    def _byte_opcodes(self) -> List[Tuple[str, int, int, int, int]]:
+        return _byte_diffs.do(self._byte_key('bytes'), lambda: diff_files(*self._byte_sources()))
+    
+    def _read_sides(self) -> Tuple[List[str], List[str]]:
+        """Read both sides, prepared for diffing"""
+        return self._prepare_sides(
+            self._read_side(self.file1_path, self.file1_revision),
+            self._read_side(self.file2_path, self.file2_revision),
+        )
+    
     def get_file_info(self, file_path: str) -> Dict[str, Union[str, int]]:
         """Get metadata about a file"""
         if self.debug:
@@ -61,86 +214,458 @@ class FileDiffer:
             raise DifferError(f"Failed to get file info: {str(e)}")
     
     def read_file(self, file_path: str) -> List[str]:
-        """Read and return the lines of a file"""
+        """Read and return the lines of a text file, in whatever encoding it is"""
         if self.debug:
             self.logger.debug(f"Reading file: {file_path}")
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                if self.debug:
-                    self.logger.debug(f"Read {len(lines)} lines from {file_path}")
-                return lines
-        except UnicodeDecodeError:
-            self.logger.error(f"File {file_path} is not UTF-8 encoded")
-            raise DifferError(f"File {file_path} must be UTF-8 encoded")
+            lines, encoding = read_lines(file_path)
+            if self.debug:
+                self.logger.debug(f"Read {len(lines)} lines from {file_path} as {encoding}")
+            return lines
+        except BinaryDataError:
+            raise BinaryFileError(f"File {file_path} is a binary file")
         except IOError as e:
             self.logger.error(f"Error reading file {file_path}: {str(e)}")
             raise DifferError(f"Failed to read file: {str(e)}")
 
+    @staticmethod
+    def _middle_ids(file1_lines: List[str], file2_lines: List[str],
+                    normalize: Optional[NormalizeOptions]) -> Tuple[int, int, List[int], List[int]]:
+        """Trim the lines both files share at either end; return the prefix and
+        suffix lengths and the normalized IDs of the two middle regions"""
+        prefix, suffix = common_affixes(file1_lines, file2_lines)
+        # Both sides in one call, so their IDs are of the same generation
+        file1_ids, file2_ids = get_normalizer(normalize).ids(
+            file1_lines[prefix:len(file1_lines) - suffix],
+            file2_lines[prefix:len(file2_lines) - suffix]
+        )
+        return prefix, suffix, file1_ids, file2_ids
+
+    @staticmethod
+    def match_lines(file1_lines: List[str], file2_lines: List[str],
+                    normalize: Optional[NormalizeOptions] = None) -> List[Tuple[str, int, int, int, int]]:
+        """Match two lists of lines on their normalized comparison IDs.
+
+        Only the region between the common prefix and suffix goes through the
+        matcher, so a small edit to a large file costs little more than the
+        edit itself.
+        """
+        prefix, suffix, file1_ids, file2_ids = FileDiffer._middle_ids(file1_lines, file2_lines, normalize)
+        if normalize is not None and normalize.ignore_blank_lines:
+            opcodes = match_ignoring_blanks(
+                file1_lines[prefix:len(file1_lines) - suffix],
+                file2_lines[prefix:len(file2_lines) - suffix],
+                file1_ids, file2_ids
+            )
+        else:
+            opcodes = difflib.SequenceMatcher(None, file1_ids, file2_ids).get_opcodes()
+        return untrim_opcodes(opcodes, prefix, len(file1_lines), len(file2_lines))
+    
+    @staticmethod
+    def build_row_model(file1_lines: List[str], file2_lines: List[str],
+                        normalize: Optional[NormalizeOptions] = None,
+                        opcodes: Optional[List[Tuple[str, int, int, int, int]]] = None) -> RowModel:
+        """Build the rows of the diff table, with moved blocks paired up"""
+        normalize = normalize or NormalizeOptions()
+        if opcodes is None:
+            opcodes = FileDiffer.match_lines(file1_lines, file2_lines, normalize)
+        # IDs are already cached by the normalizer, so this is a dict lookup per
+        # middle line. Moves lie in changed ranges, which are all in the middle,
+        # so the shared ends only need placeholders (different on each side)
+        prefix, suffix, file1_ids, file2_ids = FileDiffer._middle_ids(file1_lines, file2_lines, normalize)
+        moves = find_moves(
+            file1_lines, file2_lines,
+            [-1] * prefix + file1_ids + [-1] * suffix, [-2] * prefix + file2_ids + [-2] * suffix,
+            opcodes, RENDER_OPTIONS['min_move_lines']
+        )
+        rows = build_rows(file1_lines, file2_lines, opcodes, normalize.ignore_blank_lines, moves)
+        return RowModel(rows, moves, line_rows(rows, moves, len(file1_lines), len(file2_lines)))
+    
+    @staticmethod
+    def make_diff_table(file1_lines: List[str], file2_lines: List[str],
+                        file1_name: str, file2_name: str,
+                        file1_highlighter: Optional[FileHighlighter] = None,
+                        file2_highlighter: Optional[FileHighlighter] = None,
+                        normalize: Optional[NormalizeOptions] = None,
+                        opcodes: Optional[List[Tuple[str, int, int, int, int]]] = None,
+                        row_model: Optional[RowModel] = None) -> str:
+        """Render two lists of lines as the side-by-side diff table"""
+        if row_model is None:
+            file1_lines, file2_lines = segment_lines(file1_lines), segment_lines(file2_lines)
+            row_model = FileDiffer.build_row_model(file1_lines, file2_lines, normalize, opcodes)
+        return render_table(
+            row_model.rows, file1_lines, file2_lines, file1_name, file2_name,
+            context=RENDER_OPTIONS['context'],
+            tabsize=RENDER_OPTIONS['tabsize'],
+            file1_highlighter=file1_highlighter,
+            file2_highlighter=file2_highlighter,
+            moves=row_model.moves
+        )
+
+    def _side_hash(self, lines: List[str], revision: Optional[GitRevision]) -> str:
+        # A blob id already identifies the content of a revision side
+        if revision is not None:
+            return f"git:{revision.sha}"
+        return content_hash(lines)
+    
+    def _cache_key(self, kind: str, file1_lines: List[str], file2_lines: List[str], **extra) -> str:
+        return make_key(
+            kind,
+            file1=self._side_hash(file1_lines, self.file1_revision),
+            file2=self._side_hash(file2_lines, self.file2_revision),
+            options={
+                **RENDER_OPTIONS,
+                'highlight': self.highlight,
+                'normalize': self.normalize.to_dict()
+            },
+            **extra
+        )
+    
+    @staticmethod
+    def _side_key(file_path: str, revision: Optional[GitRevision]) -> str:
+        # Identifies one side for the shared highlighters and search indexes
+        return revision.spec if revision is not None else file_path
+    
+    def side_keys(self) -> List[str]:
+        """Keys of the shared highlighters and search indexes of both sides"""
+        return [self._side_key(self.file1_path, self.file1_revision),
+                self._side_key(self.file2_path, self.file2_revision)]
+    
+    def _get_highlighter(self, file_path: str, revision: Optional[GitRevision],
+                         lines: List[str]) -> Optional[FileHighlighter]:
+        # Segments of a minified line or flattened documents can't be lexed
+        if isinstance(lines, (SegmentedLines, DocumentLines)):
+            return None
+        # The table shows tabs expanded, so highlight the expanded text
+        tabsize = RENDER_OPTIONS['tabsize']
+        expanded = [line.expandtabs(tabsize) if '\t' in line else line for line in lines]
+        return get_highlighter(self._side_key(file_path, revision), file_path, expanded)
+    
+    def _get_highlighters(self, file1_lines: List[str], file2_lines: List[str]):
+        if not self.highlight:
+            return None, None
+        return (
+            self._get_highlighter(self.file1_path, self.file1_revision, file1_lines),
+            self._get_highlighter(self.file2_path, self.file2_revision, file2_lines),
+        )
+    
+    def _match(self, file1_lines: List[str], file2_lines: List[str]) -> List[Tuple[str, int, int, int, int]]:
+        if isinstance(file1_lines, DocumentLines) and isinstance(file2_lines, DocumentLines):
+            return match_documents(file1_lines, file2_lines)
+        return self.match_lines(file1_lines, file2_lines, self.normalize)
+    
+    def _opcodes_for(self, file1_lines: List[str], file2_lines: List[str]) -> List[Tuple[str, int, int, int, int]]:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key('opcodes', file1_lines, file2_lines)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return [tuple(opcode) for opcode in cached['opcodes']]
+        opcodes = self._match(file1_lines, file2_lines)
+        if cache_key is not None:
+            self.cache.put(cache_key, {'opcodes': opcodes})
+        return opcodes
+    
+    def _row_model_for(self, file1_lines: List[str], file2_lines: List[str]) -> RowModel:
+        return _row_models.do(
+            self._cache_key('rows', file1_lines, file2_lines),
+            lambda: self.build_row_model(
+                file1_lines, file2_lines, self.normalize,
+                self._opcodes_for(file1_lines, file2_lines)
+            )
+        )
+    
+    def _table_for(self, cache_key: str, file1_lines: List[str], file2_lines: List[str],
+                   file1_name: str, file2_name: str) -> Tuple[str, str]:
+        """Return the rendered table and where it came from (cache or render)"""
+        # Serve the rendered table from the persistent cache when possible
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if self.debug:
+                    self.logger.debug("Diff served from cache")
+                return cached['diff_html'], 'cache'
+        if self.debug:
+            self.logger.debug("Creating diff table...")
+        diff_table = self.make_diff_table(
+            file1_lines, file2_lines, file1_name, file2_name,
+            *self._get_highlighters(file1_lines, file2_lines),
+            normalize=self.normalize,
+            row_model=self._row_model_for(file1_lines, file2_lines)
+        )
+        if self.cache is not None:
+            self.cache.put(cache_key, {'diff_html': diff_table})
+        return diff_table, 'render'
+    
+    def get_opcodes(self) -> List[Tuple[str, int, int, int, int]]:
+        """Return the SequenceMatcher opcodes between the two files"""
+        try:
+            file1_lines, file2_lines = self._read_sides()
+            return self._opcodes_for(file1_lines, file2_lines)
+        except DifferError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Error computing opcodes:")
+            raise DifferError(f"Failed to compute opcodes: {str(e)}")
+    
+    def update_search_index(self):
+        """Bring the search index of each side up to date with the last read"""
+        if self.is_binary():
+            # Binary pairs have no lines to index
+            return
+        sides = ((self.file1_path, self.file1_revision), (self.file2_path, self.file2_revision))
+        lines = [revision.read_lines() if revision is not None else self.last_read.get(path)
+                 for path, revision in sides]
+        if None in lines:
+            return
+        for (path, revision), prepared in zip(sides, self._prepare_sides(*lines)):
+            get_line_index(self._side_key(path, revision), prepared)
+    
+    @staticmethod
+    def _source_line(lines: List[str], index: int) -> Optional[int]:
+        """The 1-based file line diffed item ``index`` is on, if it has one"""
+        if isinstance(lines, DocumentLines):
+            return None
+        if isinstance(lines, SegmentedLines):
+            return lines.line_numbers[index] + 1
+        return index + 1
+    
+    def search(self, query: str, offset: int = 0, limit: int = 100) -> Dict:
+        """Find the lines of either file containing ``query``, ignoring case.
+
+        Matches are ordered by the diff row they appear in, and every match
+        names the anchor element (``from-N``/``to-N``) that shows it. ``item``
+        is the index of the matched segment or document entry among the diffed
+        items, and ``line`` the 1-based line of the file it is on; entries of a
+        flattened document (structure mode) have no line of their own, so
+        theirs is None.
+        """
+        try:
+            file1_lines, file2_lines = self._read_sides()
+            model = self._row_model_for(file1_lines, file2_lines)
+            found = []
+            sides = (
+                ('from', self.file1_path, self.file1_revision, file1_lines),
+                ('to', self.file2_path, self.file2_revision, file2_lines),
+            )
+            for side, (name, path, revision, lines) in enumerate(sides):
+                index = get_line_index(self._side_key(path, revision), lines)
+                found.extend((model.line_rows[side][n], side, n) for n in index.search(query))
+            found.sort()
+            matches = []
+            for row, side, n in found[offset:offset + limit]:
+                kind, i, _ = model.rows[row]
+                # Lines of a moved-away block are all shown by the block's one row
+                line = i if side == 0 and kind == MOVED_FROM else n
+                matches.append({
+                    'row': row,
+                    'side': sides[side][0],
+                    'item': n,
+                    'line': self._source_line(sides[side][3], n),
+                    'anchor': f"{sides[side][0]}-{line + 1}"
+                })
+            return {
+                'query': query,
+                'total': len(found),
+                'offset': offset,
+                'limit': limit,
+                'rows': len(model.rows),
+                'matches': matches
+            }
+        except DifferError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Error searching diff:")
+            raise DifferError(f"Failed to search: {str(e)}")
+    
+    def _side_digest(self, file_path: str, revision: Optional[GitRevision]) -> str:
+        """SHA-256 of one side's raw bytes, as a checksum of the file gives.
+
+        Editors that rewrite a file in place keep its inode, and a same-size
+        write can land within the filesystem's mtime granularity, so only the
+        contents tell two versions apart.
+        """
+        return file_digest(revision.read_bytes() if revision is not None else file_path)
+    
+    def _compute_stats(self, hashes: Dict[str, str]) -> Dict:
+        file1_info = self._get_side_info(self.file1_path, self.file1_revision)
+        file2_info = self._get_side_info(self.file2_path, self.file2_revision)
+        if self.is_binary():
+            # Counted in bytes rather than lines
+            stats = byte_stats(self._byte_opcodes(), file1_info['size'], file2_info['size'])
+            stats['identical'] = not (stats['added'] or stats['removed'] or stats['changed'])
+            return {
+                **stats,
+                'binary': True,
+                'sizes': {'file1': file1_info['size'], 'file2': file2_info['size']},
+                'hashes': hashes
+            }
+        file1_lines, file2_lines = self._read_sides()
+        stats = {
+            'identical': True,
+            'added': 0, 'removed': 0, 'changed': 0, 'hunks': 0,
+            'similarity': 1.0
+        }
+        # Identical files need no opcodes; sizes rule most changes out before hashing
+        if file1_info['size'] != file2_info['size'] or hashes['file1'] != hashes['file2']:
+            cache_key = self._cache_key('stats', file1_lines, file2_lines)
+            cached = self.cache.get(cache_key) if self.cache is not None else None
+            if cached is not None:
+                stats = cached
+            else:
+                stats = diff_stats(
+                    file1_lines, file2_lines, self._opcodes_for(file1_lines, file2_lines),
+                    RENDER_OPTIONS['context'], self.normalize.ignore_blank_lines
+                )
+                # Differences the options ignore don't count
+                stats['identical'] = not (stats['added'] or stats['removed'] or stats['changed'])
+                if self.cache is not None:
+                    self.cache.put(cache_key, stats)
+        return {
+            **stats,
+            'lines': {'file1': line_count(file1_lines), 'file2': line_count(file2_lines)},
+            'sizes': {'file1': file1_info['size'], 'file2': file2_info['size']},
+            'hashes': hashes
+        }
+    
+    def get_stats(self) -> Dict:
+        """Count the differences between the two files without rendering them.
+
+        Results are kept per content of the pair, identified by the SHA-256
+        of each side's bytes (reported as ``hashes``), so polling an unchanged
+        pair only hashes the files rather than decoding and diffing them.
+        """
+        try:
+            hashes = {
+                'file1': self._side_digest(self.file1_path, self.file1_revision),
+                'file2': self._side_digest(self.file2_path, self.file2_revision),
+            }
+            key = make_key(
+                'stats-version',
+                paths=[self.file1_path, self.file2_path],
+                hashes=hashes,
+                options={**RENDER_OPTIONS, 'normalize': self.normalize.to_dict()}
+            )
+            return _stats.do(key, lambda: self._compute_stats(hashes))
+        except DifferError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Error computing stats:")
+            raise DifferError(f"Failed to compute stats: {str(e)}")
+    
+    def get_rows(self, start: int, stop: int, format: str = 'html') -> Dict:
+        """Render the diff rows ``start`` to ``stop`` as a table body, or as
+        JSON ``items`` with ``format='json'``"""
+        try:
+            file1_lines, file2_lines = self._read_sides()
+            model = self._row_model_for(file1_lines, file2_lines)
+            start = max(0, min(start, len(model.rows)))
+            stop = max(start, min(stop, len(model.rows)))
+            result = {'start': start, 'stop': stop, 'rows': len(model.rows)}
+            if format == 'json':
+                result['items'] = rows_to_json(
+                    model.rows, start, stop, file1_lines, file2_lines, model.moves
+                )
+                return result
+            result['html'] = render_rows(
+                model.rows, start, stop, file1_lines, file2_lines,
+                RENDER_OPTIONS['tabsize'],
+                *self._get_highlighters(file1_lines, file2_lines),
+                moves=model.moves
+            )
+            return result
+        except DifferError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Error rendering rows:")
+            raise DifferError(f"Failed to render rows: {str(e)}")
+    
+    def iter_unified(self, context: int = 3) -> Iterator[str]:
+        """Yield the diff in unified format, a hunk at a time"""
+        try:
+            file1_lines, file2_lines = self._read_sides()
+            model = self._row_model_for(file1_lines, file2_lines)
+        except DifferError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Error building unified diff:")
+            raise DifferError(f"Failed to build unified diff: {str(e)}")
+        names = [
+            revision.spec if revision is not None else path
+            for path, revision in ((self.file1_path, self.file1_revision),
+                                   (self.file2_path, self.file2_revision))
+        ]
+        return iter_unified(model.rows, file1_lines, file2_lines, *names, context, model.moves)
+    
+    def _binary_diff(self, file1_info: Dict, file2_info: Dict, started: float) -> Dict[str, Union[Dict, str]]:
+        """The diff of a binary pair: a hex view of the changed regions"""
+        # Binary sides have no lines to index or keep in the history
+        self.last_read = {}
+        names = [file1_info['name'], file2_info['name']]
+        diff_table = _tables.do(
+            self._byte_key('hex', names=names),
+            lambda: render_hex(*self._byte_sources(), self._byte_opcodes(), *names)
+        )
+        done = time.perf_counter()
+        log_timing(
+            'diff',
+            file1=self.file1_path, file2=self.file2_path,
+            bytes1=file1_info['size'], bytes2=file2_info['size'],
+            source='binary',
+            total_ms=round((done - started) * 1000, 3)
+        )
+        return {
+            'file1_info': file1_info,
+            'file2_info': file2_info,
+            'diff_html': diff_table,
+            'binary': True
+        }
+    
     def get_diff(self) -> Dict[str, Union[Dict, str]]:
         """Generate a diff between the two files"""
         if self.debug:
             self.logger.debug("Generating diff...")
+        started = time.perf_counter()
         try:
             # Get file info first
-            file1_info = self.get_file_info(self.file1_path)
-            file2_info = self.get_file_info(self.file2_path)
+            file1_info = self._get_side_info(self.file1_path, self.file1_revision)
+            file2_info = self._get_side_info(self.file2_path, self.file2_revision)
+            
+            if self.is_binary():
+                return self._binary_diff(file1_info, file2_info, started)
             
             # Read files
             if self.debug:
                 self.logger.debug("Reading files...")
-            file1_lines = self.read_file(self.file1_path)
-            file2_lines = self.read_file(self.file2_path)
+            file1_lines, file2_lines = self._read_sides()
+            read = time.perf_counter()
             
-            if self.debug:
-                self.logger.debug("Creating diff table...")
-            differ = difflib.HtmlDiff(tabsize=2, wrapcolumn=120)
-            
-            # Get the diff output first
-            diff_table = differ.make_file(
-                file1_lines, 
-                file2_lines,
-                fromdesc=os.path.basename(self.file1_path),
-                todesc=os.path.basename(self.file2_path),
-                context=True
+            # Keyed by content version and options; concurrent requests for
+            # the same version share one rendering
+            cache_key = self._cache_key(
+                'html', file1_lines, file2_lines,
+                names=[file1_info['name'], file2_info['name']]
             )
+            # Stays 'memory' when another caller's rendering is shared
+            source = 'memory'
             
-            # Clean up the HTML output
-            diff_table = diff_table.replace('&nbsp;', ' ')  # Replace &nbsp; with regular spaces
-            diff_table = diff_table.replace('<table class="diff"', '<table class="diff-table"')
-            
-            # Remove navigation cells and links
-            diff_table = re.sub(r'<td class="diff_next".*?</td>', '', diff_table)
-            diff_table = re.sub(r'<a href="#difflib_chg_.*?</a>', '', diff_table)
-            
-            # Fix the table structure to align file names correctly
-            # First, extract the file names
-            file1_name = os.path.basename(self.file1_path)
-            file2_name = os.path.basename(self.file2_path)
-            
-            # Create a new table header with proper structure
-            new_header = f'''
-            <table class="diff-table" cellspacing="0" cellpadding="0">
-            <colgroup>
-                <col class="diff_header" width="4%" />
-                <col width="46%" />
-                <col class="diff_header" width="4%" />
-                <col width="46%" />
-            </colgroup>
-            <thead>
-                <tr>
-                    <th colspan="2" class="diff_header">{file1_name}</th>
-                    <th colspan="2" class="diff_header">{file2_name}</th>
-                </tr>
-            </thead>
-            '''
+            def render():
+                nonlocal source
+                table, source = self._table_for(
+                    cache_key, file1_lines, file2_lines, file1_info['name'], file2_info['name']
+                )
+                return table
             
-            # Replace the original table header with our new one
-            diff_table = re.sub(
-                r'<table class="diff-table".*?<tr>.*?</tr>',
-                new_header,
-                diff_table,
-                flags=re.DOTALL
+            diff_table = _tables.do(cache_key, render)
+            done = time.perf_counter()
+            log_timing(
+                'diff',
+                file1=self.file1_path, file2=self.file2_path,
+                lines1=len(file1_lines), lines2=len(file2_lines),
+                source=source,
+                read_ms=round((read - started) * 1000, 3),
+                table_ms=round((done - read) * 1000, 3),
+                total_ms=round((done - started) * 1000, 3)
             )
             
             if self.debug:
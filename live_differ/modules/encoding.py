@@ -0,0 +1,97 @@
+"""
+Encoding detection for text files, and telling binary files apart.
+
+A file is binary if a NUL byte appears in its first ``SNIFF_BYTES`` bytes
+(git's heuristic), unless it starts with a UTF-16/32 byte order mark. Text
+is decoded by the first of these that applies: its byte order mark, strict
+UTF-8, the optional charset-normalizer detector, Windows-1252, and finally
+Latin-1, which accepts any bytes. Lines are split the way ``open(..., 'r')``
+splits them, so ``\\r\\n`` compares equal to ``\\n``.
+"""
+import codecs
+import io
+from typing import List, Tuple
+
+try:
+    from charset_normalizer import from_bytes
+    CHARSET_NORMALIZER_AVAILABLE = True
+except ImportError:  # pragma: no cover - exercised only with charset-normalizer
+    CHARSET_NORMALIZER_AVAILABLE = False
+
+# Bytes read to decide whether a file is binary
+SNIFF_BYTES = 8000
+
+# Longest marks first: the UTF-32 LE mark starts with the UTF-16 LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+class BinaryDataError(ValueError):
+    """Raised when bytes that look binary are decoded as text"""
+    pass
+
+
+def bom_encoding(data: bytes):
+    """The encoding named by a byte order mark at the start, if any"""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    return None
+
+
+def looks_binary(head: bytes) -> bool:
+    """Whether the first bytes of a file mark it as binary"""
+    return b'\0' in head[:SNIFF_BYTES] and bom_encoding(head) is None
+
+
+def is_binary_file(path: str) -> bool:
+    """Whether the file at ``path`` is binary, reading only its first bytes"""
+    with open(path, 'rb') as f:
+        return looks_binary(f.read(SNIFF_BYTES))
+
+
+def decode_text(data: bytes) -> Tuple[str, str]:
+    """Decode the bytes of a text file; return the text and the encoding used.
+
+    Raises BinaryDataError for bytes that look binary.
+    """
+    encoding = bom_encoding(data)
+    if encoding is not None:
+        return data.decode(encoding), encoding
+    if looks_binary(data):
+        raise BinaryDataError("binary data")
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if CHARSET_NORMALIZER_AVAILABLE:
+        match = from_bytes(data).best()
+        if match is not None:
+            return str(match), match.encoding
+    try:
+        return data.decode('cp1252'), 'cp1252'
+    except UnicodeDecodeError:
+        return data.decode('latin-1'), 'latin-1'
+
+
+def decode_lines(data: bytes) -> Tuple[List[str], str]:
+    """Decode the bytes of a text file into lines; return them and the encoding"""
+    text, encoding = decode_text(data)
+    return io.StringIO(text, newline=None).readlines(), encoding
+
+
+def read_lines(path: str) -> Tuple[List[str], str]:
+    """Read and decode the lines of a text file; return them and the encoding.
+
+    Raises BinaryDataError for a binary file, having read only its first bytes.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        if looks_binary(head):
+            raise BinaryDataError(path)
+        return decode_lines(head + f.read())
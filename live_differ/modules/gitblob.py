@@ -0,0 +1,267 @@
+"""
+Git revision support for the differ.
+
+A side of a comparison may be given as ``REV:PATH`` (for example
+``HEAD:config.yaml`` or ``v1.2.0:src/app.py``). Blobs are read from the object
+database through one long-lived ``git cat-file --batch`` process per
+repository, and the decoded lines are cached by blob id since a revision never
+changes while the working file is being edited.
+"""
+import atexit
+import logging
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from .encoding import BinaryDataError, decode_lines
+
+logger = logging.getLogger(__name__)
+
+_COMMITTER_RE = re.compile(rb'^committer .* (\d+) [+-]\d{4}$', re.MULTILINE)
+
+
+class GitError(Exception):
+    """Raised when a revision spec cannot be resolved or read"""
+    pass
+
+
+def parse_revision_spec(spec: str) -> Optional[Tuple[str, str]]:
+    """Split a ``REV:PATH`` spec into its parts.
+
+    Returns None when ``spec`` is a plain filesystem path: it exists on disk,
+    has no colon, or looks like a Windows drive path such as ``C:\\file``.
+    """
+    if not spec or os.path.exists(spec):
+        return None
+    rev, sep, path = spec.partition(':')
+    if not sep or not rev or not path:
+        return None
+    if len(rev) == 1 and rev.isalpha() and path[:1] in ('\\', '/'):
+        return None
+    return rev, path
+
+
+class GitCatFile:
+    """A persistent ``git cat-file --batch`` process for one repository."""
+
+    def __init__(self, repo_root: str):
+        self.repo_root = repo_root
+        self.lock = threading.Lock()
+        self.proc = None
+
+    def _ensure_started(self):
+        if self.proc is None or self.proc.poll() is not None:
+            logger.debug(f"Starting git cat-file --batch in {self.repo_root}")
+            self.proc = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=self.repo_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+
+    def read(self, object_name: str) -> Tuple[str, str, bytes]:
+        """Return ``(sha, type, content)`` for an object name."""
+        if '\n' in object_name:
+            raise GitError(f"Invalid object name: {object_name!r}")
+        with self.lock:
+            try:
+                self._ensure_started()
+                self.proc.stdin.write(object_name.encode('utf-8') + b'\n')
+                self.proc.stdin.flush()
+                header = self.proc.stdout.readline()
+                if not header:
+                    raise GitError("git cat-file exited unexpectedly")
+                parts = header.split()
+                if len(parts) != 3:
+                    raise GitError(f"Unknown revision or path: {object_name}")
+                sha, obj_type, size = parts
+                data = self.proc.stdout.read(int(size))
+                self.proc.stdout.read(1)  # trailing newline
+            except (OSError, ValueError) as e:
+                self.close()
+                raise GitError(f"Failed to read {object_name}: {str(e)}")
+        return sha.decode('ascii'), obj_type.decode('ascii'), data
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=1)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+
+
+class BlobLines:
+    """Decoded lines of a blob, or its bytes if it is binary."""
+    __slots__ = ('sha', 'lines', 'data', 'size')
+
+    def __init__(self, sha: str, data: bytes):
+        self.sha = sha
+        self.size = len(data)
+        self.data = None
+        try:
+            # Decoded the way working files are, so \r\n and encodings match
+            self.lines, _ = decode_lines(data)
+        except BinaryDataError:
+            # Compared by bytes instead
+            self.lines = None
+            self.data = data
+
+
+class BlobCache:
+    """A small LRU of decoded blobs keyed by blob id."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, sha: str) -> Optional[BlobLines]:
+        with self.lock:
+            blob = self.entries.get(sha)
+            if blob is not None:
+                self.entries.move_to_end(sha)
+            return blob
+
+    def put(self, blob: BlobLines):
+        with self.lock:
+            self.entries[blob.sha] = blob
+            self.entries.move_to_end(blob.sha)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+blob_cache = BlobCache()
+_repo_roots: Dict[str, str] = {}
+_cat_files: Dict[str, GitCatFile] = {}
+_registry_lock = threading.Lock()
+
+
+def find_repo_root(directory: str) -> str:
+    """Return the top level of the work tree containing ``directory``."""
+    with _registry_lock:
+        if directory in _repo_roots:
+            return _repo_roots[directory]
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--show-toplevel'],
+            cwd=directory,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        raise GitError(f"Not a git repository: {directory}")
+    root = os.path.realpath(result.stdout.decode('utf-8').strip())
+    with _registry_lock:
+        _repo_roots[directory] = root
+    return root
+
+
+def get_cat_file(repo_root: str) -> GitCatFile:
+    """Return the shared cat-file process for a repository."""
+    with _registry_lock:
+        cat_file = _cat_files.get(repo_root)
+        if cat_file is None:
+            cat_file = _cat_files[repo_root] = GitCatFile(repo_root)
+        return cat_file
+
+
+@atexit.register
+def close_all():
+    """Terminate every cat-file process started by this module."""
+    with _registry_lock:
+        for cat_file in _cat_files.values():
+            cat_file.close()
+        _cat_files.clear()
+
+
+class GitRevision:
+    """One side of a comparison read from a git revision.
+
+    The spec is resolved to a blob id once, at construction; the decoded
+    lines are then served from ``blob_cache``.
+    """
+
+    def __init__(self, spec: str):
+        parsed = parse_revision_spec(spec)
+        if parsed is None:
+            raise GitError(f"Not a revision spec: {spec}")
+        self.spec = spec
+        self.rev, rel_path = parsed
+        self.path = os.path.abspath(rel_path)
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            raise GitError(f"Directory not found: {directory}")
+        self.repo_root = find_repo_root(directory)
+        self.repo_path = os.path.relpath(
+            os.path.realpath(self.path), self.repo_root
+        ).replace(os.sep, '/')
+        self.cat_file = get_cat_file(self.repo_root)
+
+        sha, obj_type, data = self.cat_file.read(f"{self.rev}:{self.repo_path}")
+        if obj_type != 'blob':
+            raise GitError(f"{spec} is a {obj_type}, not a file")
+        self.sha = sha
+        self.size = len(data)
+        if blob_cache.get(sha) is None:
+            blob_cache.put(BlobLines(sha, data))
+        self._commit_time = None
+
+    def blob(self) -> BlobLines:
+        """Return the cached lines of the blob."""
+        blob = blob_cache.get(self.sha)
+        if blob is None:
+            _, _, data = self.cat_file.read(self.sha)
+            blob = BlobLines(self.sha, data)
+            blob_cache.put(blob)
+        return blob
+
+    def is_binary(self) -> bool:
+        return self.blob().lines is None
+
+    def read_lines(self) -> List[str]:
+        lines = self.blob().lines
+        if lines is None:
+            raise GitError(f"{self.spec} is a binary file")
+        return lines
+
+    def read_bytes(self) -> bytes:
+        """The contents of the blob, for comparing by bytes"""
+        data = self.blob().data
+        if data is None:
+            # Only binary blobs keep theirs; a text one next to a binary file doesn't
+            _, _, data = self.cat_file.read(self.sha)
+        return data
+
+    def commit_time(self) -> Optional[datetime]:
+        """Committer time of the revision, if it names a commit."""
+        if self._commit_time is None:
+            try:
+                _, _, data = self.cat_file.read(f"{self.rev}^{{commit}}")
+            except GitError:
+                return None
+            match = _COMMITTER_RE.search(data)
+            if match:
+                self._commit_time = datetime.fromtimestamp(int(match.group(1)))
+        return self._commit_time
+
+    def get_info(self) -> Dict[str, Union[str, int]]:
+        """File metadata in the same shape as ``FileDiffer.get_file_info``."""
+        committed = self.commit_time()
+        return {
+            'path': self.spec,
+            'name': f"{os.path.basename(self.path)} @ {self.rev}",
+            'modified_time': committed.strftime('%Y-%m-%d %H:%M:%S') if committed else self.rev,
+            'size': self.size
+        }
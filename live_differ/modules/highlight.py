@@ -0,0 +1,233 @@
+"""
+Optional syntax highlighting for the diff view.
+
+Lines are tokenized one at a time with Pygments. The lexer state (the
+RegexLexer state stack) is checkpointed at every line boundary and tokens are
+cached by ``(line, state)``, so after an edit only the lines from the change
+until the lexer state resynchronises are tokenized again. Highlighting is lazy:
+states are only computed up to the last line that is actually rendered.
+
+Pygments is an optional dependency; without it highlighting is a no-op.
+"""
+import html
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from pygments.lexer import RegexLexer
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.token import Error, Whitespace, STANDARD_TYPES, _TokenType
+    from pygments.util import ClassNotFound
+    PYGMENTS_AVAILABLE = True
+except ImportError:  # pragma: no cover - exercised only without pygments
+    PYGMENTS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ROOT_STATE = ('root',)
+CSS_PREFIX = 'hl-'
+
+
+class TokenCache:
+    """LRU of highlighted lines keyed by (lexer, line, entry state)."""
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+token_cache = TokenCache()
+
+
+def _css_class(token_type) -> str:
+    # Walk up to the nearest token type with a short standard name
+    while token_type not in STANDARD_TYPES:
+        token_type = token_type.parent
+    return STANDARD_TYPES[token_type]
+
+
+def _render_tokens(tokens) -> str:
+    parts = []
+    for token_type, value in tokens:
+        value = value.rstrip('\n') if value.endswith('\n') else value
+        if not value:
+            continue
+        css = _css_class(token_type)
+        escaped = html.escape(value, quote=False)
+        # Plain text and whitespace don't need a span
+        if css and css != 'w':
+            escaped = f'<span class="{CSS_PREFIX}{css}">{escaped}</span>'
+        parts.append(escaped)
+    return ''.join(parts)
+
+
+def _tokenize_line(lexer, line: str, stack: Tuple[str, ...]):
+    """Tokenize one line from ``stack`` and return ``(tokens, end_stack)``.
+
+    This mirrors ``RegexLexer.get_tokens_unprocessed`` but reports the state
+    stack at the end of the line so the next line can resume from it.
+    """
+    tokens = []
+    pos = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(line, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        tokens.append((action, m.group()))
+                    else:
+                        tokens.extend((t, v) for _, t, v in action(lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+        else:
+            if pos >= len(line):
+                break
+            if line[pos] == '\n':
+                statestack = ['root']
+                statetokens = tokendefs['root']
+                tokens.append((Whitespace, '\n'))
+                pos += 1
+                continue
+            tokens.append((Error, line[pos]))
+            pos += 1
+    return tokens, tuple(statestack)
+
+
+class FileHighlighter:
+    """Highlights the lines of one file, keeping per-line state checkpoints."""
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.lexer_name = lexer.name
+        # Lexers that override the RegexLexer loop can't be resumed mid-file
+        self.stateful = (
+            isinstance(lexer, RegexLexer)
+            and type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed
+        )
+        self.lines: List[str] = []
+        self.end_states: List[Tuple[str, ...]] = []
+        self.lock = threading.Lock()
+
+    def update(self, lines: Sequence[str]):
+        """Switch to a new version of the file, keeping checkpoints of the unchanged prefix"""
+        with self.lock:
+            prefix = 0
+            limit = min(len(lines), len(self.lines), len(self.end_states))
+            while prefix < limit and lines[prefix] == self.lines[prefix]:
+                prefix += 1
+            self.lines = list(lines)
+            del self.end_states[prefix:]
+
+    def _highlight_one(self, line: str, state: Tuple[str, ...]):
+        key = (self.lexer_name, line, state)
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        if self.stateful:
+            tokens, end_state = _tokenize_line(self.lexer, line, state)
+        else:
+            tokens, end_state = list(self.lexer.get_tokens(line)), ROOT_STATE
+        result = (_render_tokens(tokens), end_state)
+        token_cache.put(key, result)
+        return result
+
+    def highlight(self, line_numbers: Sequence[int]) -> Dict[int, str]:
+        """Return highlighted HTML for the given 1-based line numbers.
+
+        Only the lines up to the largest requested number are processed.
+        """
+        wanted = {n for n in line_numbers if 1 <= n <= len(self.lines)}
+        if not wanted:
+            return {}
+        last = max(wanted)
+        result = {}
+        with self.lock:
+            state = self.end_states[-1] if self.end_states else ROOT_STATE
+            # Resume threading the lexer state from the last checkpoint
+            for index in range(len(self.end_states), last - 1):
+                _, state = self._highlight_one(self.lines[index], state)
+                self.end_states.append(state)
+            for n in wanted:
+                entry = self.end_states[n - 2] if n > 1 else ROOT_STATE
+                result[n] = self._highlight_one(self.lines[n - 1], entry)[0]
+        return result
+
+
+_highlighters: Dict[str, FileHighlighter] = {}
+_highlighters_lock = threading.Lock()
+
+
+def get_highlighter(key: str, filename: str, lines: Sequence[str]) -> Optional[FileHighlighter]:
+    """Return the highlighter for one side of a diff, updated to ``lines``.
+
+    ``key`` identifies the side (a path or revision spec) and ``filename``
+    selects the lexer. Returns None when Pygments is missing or no lexer
+    matches the file name.
+    """
+    if not PYGMENTS_AVAILABLE:
+        return None
+    with _highlighters_lock:
+        highlighter = _highlighters.get(key)
+        if highlighter is None:
+            try:
+                lexer = get_lexer_for_filename(filename, stripnl=False, ensurenl=False)
+            except ClassNotFound:
+                return None
+            highlighter = _highlighters[key] = FileHighlighter(lexer)
+            logger.debug(f"Highlighting {key} with {lexer.name}")
+    highlighter.update(lines)
+    return highlighter
+
+
+def forget_highlighter(key: str):
+    """Drop the highlighter of a side no diff shows any more"""
+    with _highlighters_lock:
+        _highlighters.pop(key, None)
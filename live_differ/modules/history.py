@@ -0,0 +1,217 @@
+"""
+Version history for watched files.
+
+Each file keeps a bounded ring of its past versions. The newest version is held
+in full; every older version is stored as a reverse delta against the version
+after it, with a full keyframe every ``keyframe_interval`` versions so that
+reconstructing any version only replays a handful of deltas.
+"""
+import difflib
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-object costs used for the memory cap
+_POINTER_SIZE = 8
+_STR_OVERHEAD = sys.getsizeof('')
+_ENTRY_OVERHEAD = 250
+_EDIT_OVERHEAD = 120
+
+
+class HistoryError(Exception):
+    """Raised when a requested version is not available"""
+    pass
+
+
+def reverse_delta(older: Sequence[str], newer: Sequence[str]) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """Compute the edits that turn ``newer`` back into ``older``.
+
+    Each edit is ``(start, end, lines)``: replace ``newer[start:end]`` with
+    ``lines``. The common prefix and suffix are trimmed before matching so the
+    usual small edit costs almost nothing.
+    """
+    prefix = 0
+    limit = min(len(older), len(newer))
+    while prefix < limit and older[prefix] == newer[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and older[-1 - suffix] == newer[-1 - suffix]:
+        suffix += 1
+    old_mid = older[prefix:len(older) - suffix]
+    new_mid = newer[prefix:len(newer) - suffix]
+    if not old_mid and not new_mid:
+        return []
+    if not old_mid or not new_mid:
+        return [(prefix, prefix + len(new_mid), tuple(old_mid))]
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            edits.append((prefix + j1, prefix + j2, tuple(old_mid[i1:i2])))
+    return edits
+
+
+def apply_reverse_delta(newer: Sequence[str], delta: Sequence[Tuple[int, int, Tuple[str, ...]]]) -> List[str]:
+    """Rebuild the older version from ``newer`` and a delta"""
+    result = []
+    pos = 0
+    for start, end, lines in delta:
+        result.extend(newer[pos:start])
+        result.extend(lines)
+        pos = end
+    result.extend(newer[pos:])
+    return result
+
+
+def _lines_size(lines: Sequence[str]) -> int:
+    return sum(len(line) + _STR_OVERHEAD for line in lines) + _POINTER_SIZE * len(lines)
+
+
+class Version:
+    """One stored version of a file."""
+    __slots__ = ('id', 'timestamp', 'line_count', 'size', 'lines', 'delta', 'nbytes')
+
+    def __init__(self, version_id: int, timestamp: float, lines: Sequence[str]):
+        self.id = version_id
+        self.timestamp = timestamp
+        self.line_count = len(lines)
+        self.size = sum(len(line) for line in lines)
+        self.lines = tuple(lines)  # full copy; dropped once the version becomes a delta
+        self.delta = None
+        self.nbytes = _ENTRY_OVERHEAD + _lines_size(self.lines)
+
+    @property
+    def is_keyframe(self) -> bool:
+        return self.lines is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp,
+            'lines': self.line_count,
+            'size': self.size,
+        }
+
+
+class FileHistory:
+    """Bounded history of a single file.
+
+    Versions are evicted oldest-first once either ``max_versions`` or
+    ``max_bytes`` is exceeded; with reverse deltas the oldest version is never
+    needed to rebuild a newer one.
+    """
+
+    def __init__(self, max_versions: int = 1000, max_bytes: int = 32 * 1024 * 1024,
+                 keyframe_interval: int = 50):
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.versions = deque()
+        self.nbytes = 0
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def record(self, lines: Sequence[str], timestamp: Optional[float] = None) -> Optional[int]:
+        """Store a new version and return its id.
+
+        Returns None without storing anything if the content is unchanged.
+        """
+        with self.lock:
+            if self.versions and self.versions[-1].lines == tuple(lines):
+                return None
+            version = Version(self.next_id, timestamp or time.time(), lines)
+            self.next_id += 1
+            if self.versions:
+                self._demote(self.versions[-1], version.lines)
+            self.versions.append(version)
+            self.nbytes += version.nbytes
+            self._evict()
+            return version.id
+
+    def _demote(self, previous: Version, newer: Tuple[str, ...]):
+        """Turn the previous head into a delta unless it is due a keyframe"""
+        if previous.id % self.keyframe_interval == 0:
+            return
+        previous.delta = reverse_delta(previous.lines, newer)
+        previous.lines = None
+        self.nbytes -= previous.nbytes
+        previous.nbytes = _ENTRY_OVERHEAD + sum(
+            _lines_size(lines) + _EDIT_OVERHEAD for _, _, lines in previous.delta
+        )
+        self.nbytes += previous.nbytes
+
+    def _evict(self):
+        while len(self.versions) > 1 and (
+            len(self.versions) > self.max_versions or self.nbytes > self.max_bytes
+        ):
+            evicted = self.versions.popleft()
+            self.nbytes -= evicted.nbytes
+
+    def list_versions(self) -> List[Dict]:
+        with self.lock:
+            return [version.to_dict() for version in self.versions]
+
+    def get(self, version_id: int) -> List[str]:
+        """Reconstruct the lines of a version"""
+        with self.lock:
+            if not self.versions:
+                raise HistoryError("No versions recorded")
+            first_id = self.versions[0].id
+            index = version_id - first_id
+            if index < 0 or index >= len(self.versions):
+                raise HistoryError(f"Version {version_id} is not available")
+
+            # Walk forward to the nearest keyframe, then replay deltas backwards
+            keyframe = index
+            while not self.versions[keyframe].is_keyframe:
+                keyframe += 1
+            lines = self.versions[keyframe].lines
+            for position in range(keyframe - 1, index - 1, -1):
+                lines = apply_reverse_delta(lines, self.versions[position].delta)
+            return list(lines)
+
+
+class HistoryStore:
+    """Histories of every watched file, keyed by absolute path."""
+
+    def __init__(self, max_versions: int = 1000, max_bytes: int = 32 * 1024 * 1024,
+                 keyframe_interval: int = 50):
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.files: Dict[str, FileHistory] = {}
+        self.lock = threading.Lock()
+
+    def get_history(self, path: str) -> FileHistory:
+        with self.lock:
+            history = self.files.get(path)
+            if history is None:
+                history = self.files[path] = FileHistory(
+                    self.max_versions, self.max_bytes, self.keyframe_interval
+                )
+            return history
+
+    def record(self, path: str, lines: Sequence[str]) -> Optional[int]:
+        version_id = self.get_history(path).record(lines)
+        if version_id is not None:
+            logger.debug(f"Recorded version {version_id} of {path}")
+        return version_id
+
+    def get(self, path: str, version_id: int) -> List[str]:
+        with self.lock:
+            history = self.files.get(path)
+        if history is None:
+            raise HistoryError(f"No history for {path}")
+        return history.get(version_id)
+
+    def to_dict(self) -> Dict[str, List[Dict]]:
+        with self.lock:
+            files = dict(self.files)
+        return {path: history.list_versions() for path, history in files.items()}
@@ -0,0 +1,89 @@
+"""
+Moved-block detection.
+
+A block of lines that moved shows up in the matcher's opcodes as a delete in
+one place and an insert in another. This post-pass pairs them up: every run
+of ``min_lines`` line IDs inside a deleted range is indexed by its contents
+(the anchor), then inserted ranges are scanned for anchors found in the index
+and each hit is extended forward as far as the lines keep matching. Every line
+is indexed and looked up once, so the pass stays linear in the number of
+changed lines instead of comparing blocks pairwise.
+"""
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from .normalize import is_blank
+
+# Shorter runs are too likely to match by accident (braces, blank lines)
+MIN_MOVE_LINES = 3
+
+
+class Move(NamedTuple):
+    """``length`` lines at ``from_start`` in file 1 moved to ``to_start`` in file 2."""
+    from_start: int
+    to_start: int
+    length: int
+
+
+def _changed_ranges(opcodes, side: int) -> List[Tuple[int, int]]:
+    # Lines that only exist on one side: deletes/replaces for file 1,
+    # inserts/replaces for file 2
+    ranges = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            continue
+        start, stop = (i1, i2) if side == 0 else (j1, j2)
+        if stop > start:
+            ranges.append((start, stop))
+    return ranges
+
+
+def find_moves(file1_lines: Sequence[str], file2_lines: Sequence[str],
+               file1_ids: Sequence[int], file2_ids: Sequence[int],
+               opcodes, min_lines: int = MIN_MOVE_LINES) -> List[Move]:
+    """Find blocks of at least ``min_lines`` lines that were deleted from one
+    place and inserted at another.
+
+    ``file1_ids`` and ``file2_ids`` are the normalized line IDs the opcodes
+    were computed from, so a moved block matches under the same options as
+    the rest of the diff.
+    """
+    if min_lines < 1:
+        return []
+    deleted = _changed_ranges(opcodes, 0)
+    inserted = _changed_ranges(opcodes, 1)
+    if not deleted or not inserted:
+        return []
+
+    # Anchor -> first deleted position; blocks never extend past their range
+    index: Dict[Tuple[int, ...], int] = {}
+    range_end: Dict[int, int] = {}
+    for start, stop in deleted:
+        for i in range(start, stop - min_lines + 1):
+            if is_blank(file1_lines[i]):
+                continue
+            index.setdefault(tuple(file1_ids[i:i + min_lines]), i)
+            range_end[i] = stop
+
+    used = set()
+    moves = []
+    for start, stop in inserted:
+        j = start
+        while j <= stop - min_lines:
+            i = index.get(tuple(file2_ids[j:j + min_lines]))
+            if i is None or i in used:
+                j += 1
+                continue
+            end = range_end[i]
+            length = 0
+            while (i + length < end and j + length < stop
+                   and file1_ids[i + length] == file2_ids[j + length]
+                   and i + length not in used):
+                length += 1
+            if length < min_lines:
+                j += 1
+                continue
+            used.update(range(i, i + length))
+            moves.append(Move(i, j, length))
+            j += length
+    moves.sort()
+    return moves
@@ -0,0 +1,176 @@
+"""
+Line normalization for noise-tolerant comparisons.
+
+Each line is reduced once to a comparison key (whitespace removed, case folded,
+masked by user regexes) and the key is interned to an integer ID. The matcher
+compares IDs while the renderer keeps showing the original text. Keys and IDs
+are cached per set of options, so after a watcher update only lines that
+actually changed are normalized again.
+
+The cache is bounded by starting over, which renumbers lines. Each start is a
+new generation, and only IDs of the same generation can be compared: the
+sides of one diff get theirs in one call, and IDs kept across calls are kept
+with their generation.
+"""
+import difflib
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+# Replaces every regex match so masked fields compare equal
+MASK_TOKEN = '\ufffc'
+
+
+class NormalizeError(Exception):
+    """Raised for invalid normalization options"""
+    pass
+
+
+class NormalizeOptions(NamedTuple):
+    """How lines are compared."""
+    ignore_whitespace: bool = False
+    ignore_case: bool = False
+    ignore_blank_lines: bool = False
+    mask_patterns: Tuple[str, ...] = ()
+    # Compare JSON/YAML documents by key path: 'auto' (by extension), 'json' or 'yaml'
+    structure: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return any(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'ignore_whitespace': self.ignore_whitespace,
+            'ignore_case': self.ignore_case,
+            'ignore_blank_lines': self.ignore_blank_lines,
+            'mask_patterns': list(self.mask_patterns),
+            'structure': self.structure,
+        }
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Pattern:
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise NormalizeError(f"Invalid mask pattern {pattern!r}: {str(e)}")
+
+
+def is_blank(line: str) -> bool:
+    return not line.strip()
+
+
+def match_ignoring_blanks(file1_lines: Sequence[str], file2_lines: Sequence[str],
+                          file1_ids: Sequence[int], file2_ids: Sequence[int]) -> List[Tuple[str, int, int, int, int]]:
+    """Match two sides on their non-blank lines only.
+
+    Matching blank lines too lets them anchor the matcher, so moving one turns
+    the lines around it into an insert and a delete. Here only non-blank lines
+    are matched; the blank lines between them then get opcodes of their own,
+    equal as far as both sides have them and deleted or inserted beyond that,
+    which the rows and statistics ignore.
+    """
+    kept1 = [i for i, line in enumerate(file1_lines) if not is_blank(line)]
+    kept2 = [j for j, line in enumerate(file2_lines) if not is_blank(line)]
+    matcher = difflib.SequenceMatcher(None, [file1_ids[i] for i in kept1], [file2_ids[j] for j in kept2])
+    opcodes = []
+    i = j = 0
+
+    def add(tag, i1, i2, j1, j2):
+        if i1 == i2 and j1 == j2:
+            return
+        if tag == 'equal' and opcodes and opcodes[-1][0] == 'equal':
+            _, p1, _, q1, _ = opcodes.pop()
+            i1, j1 = p1, q1
+        opcodes.append((tag, i1, i2, j1, j2))
+
+    def blanks(stop1, stop2):
+        nonlocal i, j
+        both = min(stop1 - i, stop2 - j)
+        add('equal', i, i + both, j, j + both)
+        add('delete', i + both, stop1, j + both, j + both)
+        add('insert', stop1, stop1, j + both, stop2)
+        i, j = stop1, stop2
+
+    for tag, a1, a2, b1, b2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for k in range(a2 - a1):
+                blanks(kept1[a1 + k], kept2[b1 + k])
+                add('equal', i, i + 1, j, j + 1)
+                i, j = i + 1, j + 1
+            continue
+        blanks(kept1[a1] if a1 < a2 else i, kept2[b1] if b1 < b2 else j)
+        stop1 = kept1[a2 - 1] + 1 if a1 < a2 else i
+        stop2 = kept2[b2 - 1] + 1 if b1 < b2 else j
+        add(tag, i, stop1, j, stop2)
+        i, j = stop1, stop2
+    blanks(len(file1_lines), len(file2_lines))
+    return opcodes
+
+
+class LineNormalizer:
+    """Maps lines to integer IDs that are equal when the lines compare equal."""
+
+    def __init__(self, options: NormalizeOptions, max_entries: int = 1_000_000):
+        self.options = options
+        self.max_entries = max_entries
+        self.patterns = [compile_pattern(p) for p in options.mask_patterns]
+        self.line_ids: Dict[str, int] = {}
+        self.key_ids: Dict[str, int] = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def key(self, line: str) -> str:
+        """The comparison key of a single line"""
+        text = line
+        for pattern in self.patterns:
+            text = pattern.sub(MASK_TOKEN, text)
+        if self.options.ignore_whitespace:
+            text = ''.join(text.split())
+        elif not self.options.active:
+            return text
+        if self.options.ignore_case:
+            text = text.casefold()
+        return text
+
+    def ids(self, *sides: Sequence[str]) -> List[List[int]]:
+        """Return the IDs of the lines of each side, normalizing only lines
+        not seen before. IDs from different calls may not be comparable."""
+        return self.tagged_ids(*sides)[1]
+
+    def tagged_ids(self, *sides: Sequence[str]) -> Tuple[int, List[List[int]]]:
+        """Like ``ids``, but also return the generation the IDs belong to"""
+        with self.lock:
+            if len(self.line_ids) > self.max_entries:
+                self.line_ids.clear()
+                self.key_ids.clear()
+                self.generation += 1
+            line_ids = self.line_ids
+            result = []
+            for lines in sides:
+                side_ids = []
+                for line in lines:
+                    line_id = line_ids.get(line)
+                    if line_id is None:
+                        key = self.key(line)
+                        line_id = self.key_ids.setdefault(key, len(self.key_ids))
+                        line_ids[line] = line_id
+                    side_ids.append(line_id)
+                result.append(side_ids)
+            return self.generation, result
+
+
+_normalizers: Dict[NormalizeOptions, LineNormalizer] = {}
+_normalizers_lock = threading.Lock()
+
+
+def get_normalizer(options: Optional[NormalizeOptions]) -> LineNormalizer:
+    """Return the shared normalizer for a set of options"""
+    options = options or NormalizeOptions()
+    with _normalizers_lock:
+        normalizer = _normalizers.get(options)
+        if normalizer is None:
+            normalizer = _normalizers[options] = LineNormalizer(options)
+        return normalizer
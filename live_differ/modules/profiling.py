@@ -0,0 +1,129 @@
+"""
+Opt-in profiling of diff computations and requests.
+
+With ``--profile``, every diff update computed by a watcher and every HTTP
+request is run under cProfile and saved as a ``.prof`` file (the pstats
+format read by ``python -m pstats``, snakeviz, gprof2dot, ...) in a directory
+that keeps only the newest files. Without it, ``profiled`` hands out a no-op
+context manager, so the hooks cost one global lookup.
+
+``sample_stacks`` takes a wall-clock sampling profile of every thread of the
+running server, in the folded-stack format read by speedscope and
+flamegraph.pl.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of .prof files kept in the profile directory
+PROFILE_KEEP = 200
+# Longest sampling profile /debug/profile takes
+MAX_SAMPLE_SECONDS = 60
+
+
+class Profiler:
+    """Records cProfile data into a rotating directory."""
+
+    def __init__(self, directory: str, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current thread; None if another profiler is active"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per interpreter
+            return None
+        return profile
+
+    def stop(self, profile: Optional[cProfile.Profile], name: str) -> Optional[str]:
+        """Stop ``profile`` and save it under ``name``"""
+        if profile is None:
+            return None
+        profile.disable()
+        return self.save(profile, name)
+
+    @contextmanager
+    def profile(self, name: str):
+        profile = self.start()
+        try:
+            yield
+        finally:
+            self.stop(profile, name)
+
+    def save(self, profile: cProfile.Profile, name: str) -> str:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+        path = os.path.join(self.directory, f"{stamp}-{safe_name}.prof")
+        profile.dump_stats(path)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        with self.lock:
+            try:
+                files = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+            except OSError:
+                return
+            for name in files[:max(len(files) - self.keep, 0)]:
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+_profiler: Optional[Profiler] = None
+
+
+def set_profiler(profiler: Optional[Profiler]):
+    global _profiler
+    _profiler = profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def profiled(name: str):
+    """Profile a block if profiling is enabled"""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.profile(name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Sample the stacks of all other threads for ``seconds``, as folded stacks"""
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
@@ -0,0 +1,138 @@
+"""
+One reference file compared against many variants.
+
+Diffing a golden file against N variants with N independent ``FileDiffer``
+pairs would read, hash and normalize the reference N times per change.
+``Reference`` reads it once per version (a new version is noticed by its
+inode, size and modification time), interns its lines in the shared
+normalizer and builds ``difflib``'s index of it once. Each variant is diffed
+by a ``ReferenceDiffer``, which takes the reference side from there, so an
+edit to the reference costs one read and one index, and then one matcher run
+per variant.
+"""
+import copy
+import difflib
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from .cache import DiffCache, content_hash
+from .differ import BinaryFileError, DifferError, FileDiffer
+from .encoding import BinaryDataError, read_lines
+from .normalize import NormalizeOptions, get_normalizer
+from .trim import common_affixes
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceVersion:
+    """The lines of one version of the reference, indexed on first use."""
+
+    def __init__(self, lines: List[str], signature: Tuple[int, int, int], normalize: NormalizeOptions):
+        self.lines = lines
+        self.signature = signature
+        self.normalize = normalize
+        self.hash = content_hash(lines)
+        self._matcher = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def matcher(self) -> Tuple[int, difflib.SequenceMatcher]:
+        """A matcher with the reference as its indexed second sequence, and the
+        normalizer generation of the IDs it was built from"""
+        normalizer = get_normalizer(self.normalize)
+        with self._lock:
+            if self._matcher is None or self._generation != normalizer.generation:
+                # The normalizer started over since: the old IDs no longer match
+                self._generation, (ids,) = normalizer.tagged_ids(self.lines)
+                self._matcher = difflib.SequenceMatcher(None, [], ids)
+            return self._generation, self._matcher
+
+    def match(self, variant_lines: List[str]) -> List[Tuple[str, int, int, int, int]]:
+        """Opcodes turning the reference into ``variant_lines``"""
+        prefix, suffix = common_affixes(self.lines, variant_lines)
+        if prefix + suffix >= len(self.lines) // 2 or self.normalize.ignore_blank_lines:
+            # Mostly shared ends: matching just the middle beats any index.
+            # The index can't leave blank lines out of matching either
+            return FileDiffer.match_lines(self.lines, variant_lines, self.normalize)
+        normalizer = get_normalizer(self.normalize)
+        while True:
+            generation, indexed = self.matcher()
+            variant_generation, (variant_ids,) = normalizer.tagged_ids(variant_lines)
+            if variant_generation == generation:
+                break
+        # A shallow copy shares the index, which matching only reads
+        matcher = copy.copy(indexed)
+        matcher.set_seq1(variant_ids)
+        # The variant is the matcher's first sequence; swap the sides back
+        swapped = {'insert': 'delete', 'delete': 'insert'}
+        return [
+            (swapped.get(tag, tag), j1, j2, i1, i2)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        ]
+
+
+class Reference:
+    """The reference file of a comparison, shared by the differs of its variants."""
+
+    def __init__(self, path: str, normalize: Optional[NormalizeOptions] = None):
+        self.path = os.path.abspath(path)
+        self.normalize = normalize or NormalizeOptions()
+        self._version: Optional[ReferenceVersion] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ReferenceVersion:
+        """The current version, read from disk only if the file changed.
+
+        Raises BinaryFileError if the reference is binary.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            raise DifferError(f"Failed to get file info: {str(e)}")
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if self._version is None or self._version.signature != signature:
+                try:
+                    # Decoded as FileDiffer.read_file decodes the variants
+                    lines, _ = read_lines(self.path)
+                except BinaryDataError:
+                    # Binary pairs are diffed by bytes, from the paths
+                    raise BinaryFileError(f"File {self.path} is a binary file")
+                except IOError as e:
+                    raise DifferError(f"Failed to read file: {str(e)}")
+                self._version = ReferenceVersion(lines, signature, self.normalize)
+                logger.debug(f"Read reference {self.path} ({len(lines)} lines)")
+            return self._version
+
+
+class ReferenceDiffer(FileDiffer):
+    """A ``FileDiffer`` whose first file is a shared ``Reference``."""
+
+    def __init__(self, reference: Reference, variant_path: str, debug: bool = False,
+                 cache: Optional[DiffCache] = None, highlight: bool = False):
+        self.reference = reference
+        super().__init__(
+            reference.path, variant_path,
+            debug=debug, cache=cache, highlight=highlight, normalize=reference.normalize
+        )
+
+    def _read_side(self, file_path, revision):
+        if revision is None and file_path == self.reference.path:
+            lines = self.reference.current().lines
+            self.last_read[file_path] = lines
+            return lines
+        return super()._read_side(file_path, revision)
+
+    def _side_hash(self, lines, revision):
+        version = self.reference.current()
+        if revision is None and lines is version.lines:
+            return version.hash
+        return super()._side_hash(lines, revision)
+
+    def _match(self, file1_lines, file2_lines):
+        version = self.reference.current()
+        if file1_lines is version.lines:
+            return version.match(file2_lines)
+        return super()._match(file1_lines, file2_lines)
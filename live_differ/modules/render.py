@@ -0,0 +1,509 @@
+"""
+The row model of a diff and its renderings.
+
+Rows are built from matcher opcodes rather than by ``difflib.HtmlDiff``, so
+the matcher can run on normalized comparison keys while the rows still show
+the original text of each line. A row is only a kind and a line index per
+side, stored in parallel arrays; the text stays in the files' line lists.
+The side-by-side HTML table, JSON rows and unified diffs are all rendered
+from the same rows, a hunk or a row range at a time.
+"""
+import difflib
+import html
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .highlight import FileHighlighter
+from .moves import Move
+from .normalize import is_blank
+from .segments import continues, line_number
+
+# Row kinds
+EQUAL = 'equal'        # same line on both sides
+IGNORED = 'ignored'    # differs only in ways the options ignore (blank lines)
+CHANGE = 'change'      # similar lines, rendered with intraline markup
+REPLACE = 'replace'    # dissimilar lines side by side
+DELETE = 'delete'      # line only in the first file
+INSERT = 'insert'      # line only in the second file
+MOVED_FROM = 'moved_from'  # one row standing for a whole block that moved away
+MOVED_TO = 'moved_to'      # line of a block that moved here
+
+UNCHANGED = (EQUAL, IGNORED)
+
+# Kinds are stored as their index in KINDS
+KINDS = (EQUAL, IGNORED, CHANGE, REPLACE, DELETE, INSERT, MOVED_FROM, MOVED_TO)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+_UNCHANGED_CODES = frozenset(KIND_CODES[kind] for kind in UNCHANGED)
+_MOVED_FROM_CODE = KIND_CODES[MOVED_FROM]
+# Stored for a side a row has no line on
+NO_LINE = -1
+
+# Same similarity cutoff difflib.ndiff uses to pair up replaced lines
+SIMILARITY_CUTOFF = 0.75
+
+Row = Tuple[str, Optional[int], Optional[int]]
+
+
+class RowTable:
+    """Rows of a diff as parallel arrays of kind codes and line indexes.
+
+    A row takes 9 bytes (a kind byte and a 32-bit line index per side)
+    however long its lines are. Indexing and iteration give ``(kind, i, j)``
+    tuples, with None for a side the row has no line on.
+    """
+
+    __slots__ = ('kinds', 'old', 'new')
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.old = array('i')
+        self.new = array('i')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Row]) -> 'RowTable':
+        if isinstance(rows, cls):
+            return rows
+        table = cls()
+        table.extend(rows)
+        return table
+
+    def append(self, row: Row):
+        kind, i, j = row
+        self.kinds.append(KIND_CODES[kind])
+        self.old.append(NO_LINE if i is None else i)
+        self.new.append(NO_LINE if j is None else j)
+
+    def extend(self, rows: Iterable[Row]):
+        for row in rows:
+            self.append(row)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the rows, excluding array over-allocation"""
+        return sum(len(column) * column.itemsize for column in (self.kinds, self.old, self.new))
+
+    def _row(self, index: int) -> Row:
+        i, j = self.old[index], self.new[index]
+        return (KINDS[self.kinds[index]], None if i == NO_LINE else i, None if j == NO_LINE else j)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(k) for k in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[Row]:
+        for code, i, j in zip(self.kinds, self.old, self.new):
+            yield (KINDS[code], None if i == NO_LINE else i, None if j == NO_LINE else j)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (RowTable, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"RowTable({len(self)} rows)"
+
+
+class Hunk:
+    """A range of rows shown together: changes and the context around them."""
+
+    __slots__ = ('start', 'stop')
+
+    def __init__(self, start: int, stop: int):
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self) -> Iterator[int]:
+        yield self.start
+        yield self.stop
+
+    def __eq__(self, other) -> bool:
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Hunk({self.start}, {self.stop})"
+
+
+class RowModel(NamedTuple):
+    """The rows of a diff plus, for each side, the row every line is shown in."""
+    rows: RowTable
+    moves: List[Move]
+    line_rows: Tuple[array, array]
+
+
+def _similar(a: str, b: str) -> bool:
+    matcher = difflib.SequenceMatcher(difflib.IS_CHARACTER_JUNK, a, b)
+    return (
+        matcher.real_quick_ratio() >= SIMILARITY_CUTOFF
+        and matcher.quick_ratio() >= SIMILARITY_CUTOFF
+        and matcher.ratio() >= SIMILARITY_CUTOFF
+    )
+
+
+def _pair(file1_lines: Sequence[str], file2_lines: Sequence[str],
+          i: Optional[int], j: Optional[int]) -> Row:
+    if j is None:
+        return (DELETE, i, None)
+    if i is None:
+        return (INSERT, None, j)
+    if _similar(file1_lines[i], file2_lines[j]):
+        return (CHANGE, i, j)
+    return (REPLACE, i, j)
+
+
+def build_rows(file1_lines: Sequence[str], file2_lines: Sequence[str],
+               opcodes: Iterable[Tuple[str, int, int, int, int]],
+               ignore_blank_lines: bool = False,
+               moves: Sequence[Move] = ()) -> RowTable:
+    """Turn opcodes into rows of ``(kind, file1_index, file2_index)``.
+
+    A moved block becomes a single ``MOVED_FROM`` row at its old position,
+    whose second index is where the block starts in file 2, and one
+    ``MOVED_TO`` row per line at its new position.
+    """
+    move_sources = {move.from_start: move for move in moves}
+    moved_to = {j for move in moves for j in range(move.to_start, move.to_start + move.length)}
+    rows = RowTable()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            # The common case, appended to the columns directly
+            rows.kinds.extend(array('B', [KIND_CODES[EQUAL]]) * (i2 - i1))
+            rows.old.extend(range(i1, i2))
+            rows.new.extend(range(j1, j2))
+            continue
+        if ignore_blank_lines and all(is_blank(line) for line in file1_lines[i1:i2]) \
+                and all(is_blank(line) for line in file2_lines[j1:j2]):
+            rows.extend(
+                (IGNORED, i1 + k if i1 + k < i2 else None, j1 + k if j1 + k < j2 else None)
+                for k in range(max(i2 - i1, j2 - j1))
+            )
+            continue
+        if not moves:
+            rows.extend(
+                _pair(file1_lines, file2_lines,
+                      i1 + k if i1 + k < i2 else None, j1 + k if j1 + k < j2 else None)
+                for k in range(max(i2 - i1, j2 - j1))
+            )
+            continue
+        # Walk both sides, taking moved lines out of the positional pairing
+        i, j = i1, j1
+        while i < i2 or j < j2:
+            if i < i2 and i in move_sources:
+                move = move_sources[i]
+                rows.append((MOVED_FROM, i, move.to_start))
+                i += move.length
+            elif j < j2 and j in moved_to:
+                rows.append((MOVED_TO, None, j))
+                j += 1
+            else:
+                row = _pair(file1_lines, file2_lines,
+                            i if i < i2 else None, j if j < j2 else None)
+                rows.append(row)
+                i += row[1] is not None
+                j += row[2] is not None
+    return rows
+
+
+def line_rows(rows: Sequence[Row], moves: Sequence[Move],
+              file1_count: int, file2_count: int) -> Tuple[array, array]:
+    """Map every line of each file to the index of the row that shows it"""
+    rows = RowTable.from_rows(rows)
+    lengths = {move.from_start: move.length for move in moves}
+    file1_rows, file2_rows = array('i', [0]) * file1_count, array('i', [0]) * file2_count
+    for index, (code, i, j) in enumerate(zip(rows.kinds, rows.old, rows.new)):
+        if code == _MOVED_FROM_CODE:
+            # The whole moved block collapses into this one row
+            file1_rows[i:i + lengths[i]] = array('i', [index]) * lengths[i]
+            continue
+        if i != NO_LINE:
+            file1_rows[i] = index
+        if j != NO_LINE:
+            file2_rows[j] = index
+    return file1_rows, file2_rows
+
+
+def group_rows(rows: Sequence[Row], context: int) -> List[Hunk]:
+    """Return the hunks of changed rows with ``context`` rows around them"""
+    rows = RowTable.from_rows(rows)
+    total = len(rows)
+    hunks = []
+    for index, code in enumerate(rows.kinds):
+        if code in _UNCHANGED_CODES:
+            continue
+        start = max(0, index - context)
+        stop = min(total, index + context + 1)
+        if hunks and start <= hunks[-1].stop:
+            hunks[-1].stop = max(hunks[-1].stop, stop)
+        else:
+            hunks.append(Hunk(start, stop))
+    return hunks
+
+
+def _display(line: str, tabsize: int) -> str:
+    return line.rstrip('\r\n').expandtabs(tabsize)
+
+
+def _span(css: str, text: str) -> str:
+    return f'<span class="{css}">{html.escape(text, quote=False)}</span>' if text else ''
+
+
+def _intraline(a: str, b: str) -> Tuple[str, str]:
+    """Mark the changed characters of two similar lines"""
+    left, right = [], []
+    matcher = difflib.SequenceMatcher(difflib.IS_CHARACTER_JUNK, a, b)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            left.append(html.escape(a[i1:i2], quote=False))
+            right.append(html.escape(b[j1:j2], quote=False))
+        elif tag == 'replace':
+            left.append(_span('diff_chg', a[i1:i2]))
+            right.append(_span('diff_chg', b[j1:j2]))
+        elif tag == 'delete':
+            left.append(_span('diff_sub', a[i1:i2]))
+        else:
+            right.append(_span('diff_add', b[j1:j2]))
+    return ''.join(left), ''.join(right)
+
+
+def _cells(side: str, lines: Sequence[str], index: Optional[int], content: str) -> str:
+    if index is None:
+        return '<td class="diff_header"></td><td nowrap="nowrap"></td>'
+    # Anchors count items; the shown number has the column of a segment
+    return (
+        f'<td class="diff_header" id="{side}-{index + 1}">{line_number(lines, index)}</td>'
+        f'<td nowrap="nowrap">{content}</td>'
+    )
+
+
+def _move_cell(href: str, text: str) -> str:
+    return f'<td class="diff_move"><a class="diff_move_link" href="#{href}">{text}</a></td>'
+
+
+def render_rows(rows: Sequence[Row], start: int, stop: int,
+                file1_lines: Sequence[str], file2_lines: Sequence[str], tabsize: int = 2,
+                file1_highlighter: Optional[FileHighlighter] = None,
+                file2_highlighter: Optional[FileHighlighter] = None,
+                moves: Sequence[Move] = ()) -> str:
+    """Render ``rows[start:stop]`` as one ``<tbody>`` of the diff table.
+
+    The tbody carries its row range in ``data-rows`` so the client can slot
+    in ranges fetched later in the right place.
+    """
+    moves_by_source = {move.from_start: move for move in moves}
+    moves_by_dest = {move.to_start: move for move in moves}
+
+    highlighted = ({}, {})
+    for side, highlighter in enumerate((file1_highlighter, file2_highlighter)):
+        if highlighter is None:
+            continue
+        numbers = [
+            rows[r][side + 1] + 1 for r in range(start, stop)
+            if rows[r][0] in UNCHANGED and rows[r][side + 1] is not None
+        ]
+        highlighted[side].update(highlighter.highlight(numbers))
+
+    def plain(side: int, lines: Sequence[str], index: Optional[int]) -> str:
+        if index is None:
+            return ''
+        if index + 1 in highlighted[side]:
+            return highlighted[side][index + 1]
+        return html.escape(_display(lines[index], tabsize), quote=False)
+
+    parts = [f'        <tbody data-rows="{start}-{stop}">\n']
+    for kind, i, j in rows[start:stop]:
+        if kind == MOVED_FROM:
+            move = moves_by_source[i]
+            noun = 'line' if move.length == 1 else 'lines'
+            parts.append(
+                f'            <tr class="diff_moved">'
+                f'<td class="diff_header" id="from-{i + 1}">{line_number(file1_lines, i)}</td>'
+                f'{_move_cell(f"to-{j + 1}", f"{move.length} {noun} moved to line {line_number(file2_lines, j)}")}'
+                f'<td class="diff_header"></td><td nowrap="nowrap"></td></tr>\n'
+            )
+            continue
+        if kind == MOVED_TO:
+            line = _span('diff_move', _display(file2_lines[j], tabsize))
+            move = moves_by_dest.get(j)
+            if move is not None:
+                left = ('<td class="diff_header"></td>'
+                        + _move_cell(f"from-{move.from_start + 1}",
+                                     f"moved from line {line_number(file1_lines, move.from_start)}"))
+            else:
+                left = _cells("from", file1_lines, None, '')
+            parts.append(f'            <tr class="diff_moved">{left}{_cells("to", file2_lines, j, line)}</tr>\n')
+            continue
+        if kind in UNCHANGED:
+            left, right = plain(0, file1_lines, i), plain(1, file2_lines, j)
+        elif kind == CHANGE:
+            left, right = _intraline(_display(file1_lines[i], tabsize),
+                                     _display(file2_lines[j], tabsize))
+        else:
+            left = _span('diff_sub', _display(file1_lines[i], tabsize)) if i is not None else ''
+            right = _span('diff_add', _display(file2_lines[j], tabsize)) if j is not None else ''
+        parts.append(
+            f'            <tr>{_cells("from", file1_lines, i, left)}{_cells("to", file2_lines, j, right)}</tr>\n'
+        )
+    parts.append('        </tbody>\n')
+    return ''.join(parts)
+
+
+def iter_table(rows: Sequence[Row], file1_lines: Sequence[str], file2_lines: Sequence[str],
+               file1_name: str, file2_name: str, context: int = 5, tabsize: int = 2,
+               file1_highlighter: Optional[FileHighlighter] = None,
+               file2_highlighter: Optional[FileHighlighter] = None,
+               moves: Sequence[Move] = ()) -> Iterator[str]:
+    """Yield the side-by-side diff table a hunk (one ``<tbody>``) at a time.
+
+    Only the changed rows and ``context`` rows around them are rendered, and
+    only those rows are syntax highlighted. Moved blocks link their old and
+    new positions to each other.
+    """
+    rows = RowTable.from_rows(rows)
+    hunks = group_rows(rows, context)
+    yield f'''
+        <table class="diff-table" cellspacing="0" cellpadding="0">
+        <colgroup>
+            <col class="diff_header" width="4%" />
+            <col width="46%" />
+            <col class="diff_header" width="4%" />
+            <col width="46%" />
+        </colgroup>
+        <thead>
+            <tr>
+                <th colspan="2" class="diff_header">{html.escape(file1_name)}</th>
+                <th colspan="2" class="diff_header">{html.escape(file2_name)}</th>
+            </tr>
+        </thead>
+'''
+    if not hunks:
+        yield (
+            '        <tbody>\n'
+            '            <tr><td colspan="4" class="diff_none">No differences found</td></tr>\n'
+            '        </tbody>\n'
+        )
+    for hunk in hunks:
+        yield render_rows(
+            rows, hunk.start, hunk.stop, file1_lines, file2_lines, tabsize,
+            file1_highlighter, file2_highlighter, moves
+        )
+    yield '        </table>\n'
+
+
+def render_table(rows: Sequence[Row], file1_lines: Sequence[str], file2_lines: Sequence[str],
+                 file1_name: str, file2_name: str, context: int = 5, tabsize: int = 2,
+                 file1_highlighter: Optional[FileHighlighter] = None,
+                 file2_highlighter: Optional[FileHighlighter] = None,
+                 moves: Sequence[Move] = ()) -> str:
+    """Render rows as the side-by-side diff table"""
+    return ''.join(iter_table(
+        rows, file1_lines, file2_lines, file1_name, file2_name, context, tabsize,
+        file1_highlighter, file2_highlighter, moves
+    ))
+
+
+def rows_to_json(rows: Sequence[Row], start: int, stop: int,
+                 file1_lines: Sequence[str], file2_lines: Sequence[str],
+                 moves: Sequence[Move] = ()) -> List[Dict]:
+    """Describe ``rows[start:stop]`` as JSON-ready dicts with 1-based line numbers"""
+    lengths = {move.from_start: move.length for move in moves}
+    items = []
+    for index, (kind, i, j) in enumerate(rows[start:stop], start):
+        item = {'row': index, 'kind': kind}
+        if kind == MOVED_FROM:
+            # One row for the whole block; j is where it moved to
+            item.update(old=i + 1, new=None, length=lengths[i], moved_to=j + 1)
+            j = None
+        else:
+            item.update(old=i + 1 if i is not None else None, new=j + 1 if j is not None else None)
+        item['old_text'] = file1_lines[i].rstrip('\r\n') if i is not None else None
+        item['new_text'] = file2_lines[j].rstrip('\r\n') if j is not None else None
+        items.append(item)
+    return items
+
+
+def _unified_range(start: int, count: int) -> str:
+    # Same convention as difflib.unified_diff
+    if count == 1:
+        return f"{start + 1}"
+    if not count:
+        return f"{start},0"
+    return f"{start + 1},{count}"
+
+
+def _unified_line(prefix: str, line: str, partial: bool = False) -> str:
+    # A segment of a long line ends where the next segment picks up
+    if line.endswith('\n') or partial:
+        return prefix + line + ('' if line.endswith('\n') else '\n')
+    return f"{prefix}{line}\n\\ No newline at end of file\n"
+
+
+def _first_line(column: array, kinds: array, start: int, skip_code: Optional[int], default: int) -> int:
+    """The first line index at or after row ``start``; indexes only grow down the rows"""
+    for index in range(start, len(column)):
+        if column[index] != NO_LINE and kinds[index] != skip_code:
+            return column[index]
+    return default
+
+
+def iter_unified(rows: Sequence[Row], file1_lines: Sequence[str], file2_lines: Sequence[str],
+                 file1_name: str, file2_name: str, context: int = 3,
+                 moves: Sequence[Move] = ()) -> Iterator[str]:
+    """Yield the diff in unified format, a hunk at a time.
+
+    Lines the options only ignore (blank-line changes) are shown as changes
+    but don't start hunks of their own; moved blocks appear as a removal and
+    an addition.
+    """
+    rows = RowTable.from_rows(rows)
+    hunks = group_rows(rows, context)
+    if not hunks:
+        return
+    lengths = {move.from_start: move.length for move in moves}
+    yield f"--- {file1_name}\n+++ {file2_name}\n"
+    for hunk in hunks:
+        old_start = _first_line(rows.old, rows.kinds, hunk.start, None, len(file1_lines))
+        # The second index of a moved-away block is its destination, not a line it shows
+        new_start = _first_line(rows.new, rows.kinds, hunk.start, _MOVED_FROM_CODE, len(file2_lines))
+        body, removed, added = [], [], []
+        old_count = new_count = 0
+        for kind, i, j in rows[hunk.start:hunk.stop]:
+            if kind == EQUAL:
+                body.extend(removed)
+                body.extend(added)
+                removed, added = [], []
+                body.append(_unified_line(' ', file1_lines[i], continues(file1_lines, i)))
+                old_count += 1
+                new_count += 1
+                continue
+            if kind == MOVED_FROM:
+                block = range(i, i + lengths[i])
+                removed.extend(_unified_line('-', file1_lines[k], continues(file1_lines, k)) for k in block)
+                old_count += len(block)
+                continue
+            if i is not None:
+                removed.append(_unified_line('-', file1_lines[i], continues(file1_lines, i)))
+                old_count += 1
+            if j is not None:
+                added.append(_unified_line('+', file2_lines[j], continues(file2_lines, j)))
+                new_count += 1
+        body.extend(removed)
+        body.extend(added)
+        yield (
+            f"@@ -{_unified_range(old_start, old_count)} "
+            f"+{_unified_range(new_start, new_count)} @@\n"
+            + ''.join(body)
+        )
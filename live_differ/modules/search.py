@@ -0,0 +1,100 @@
+"""
+Search index over the lines of the diffed files.
+
+Each distinct line is broken into case-folded trigrams and posted under each
+of them, so a query only has to verify the lines that contain all of its
+trigrams instead of scanning the whole file. Postings are keyed by line text
+rather than line number: when a file changes, only texts that appeared or
+disappeared touch the postings, and line numbers are re-derived in a single
+pass over the new version.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, List, Sequence, Set
+
+GRAM = 3
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[k:k + GRAM] for k in range(len(text) - GRAM + 1)}
+
+
+class LineIndex:
+    """Trigram index of one file, updated in place as the file changes."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.line_numbers: Dict[str, List[int]] = {}
+        self.postings: Dict[str, Set[str]] = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def update(self, lines: Sequence[str]) -> bool:
+        """Switch to a new version of the file; returns False if unchanged"""
+        with self.lock:
+            if lines == self.lines:
+                return False
+            line_numbers: Dict[str, List[int]] = {}
+            for number, line in enumerate(lines):
+                line_numbers.setdefault(line, []).append(number)
+            old = self.line_numbers
+            for text in old.keys() - line_numbers.keys():
+                for gram in _grams(text.casefold()):
+                    texts = self.postings.get(gram)
+                    if texts is not None:
+                        texts.discard(text)
+                        if not texts:
+                            del self.postings[gram]
+            for text in line_numbers.keys() - old.keys():
+                for gram in _grams(text.casefold()):
+                    self.postings[gram].add(text)
+            self.lines = list(lines)
+            self.line_numbers = line_numbers
+            return True
+
+    def search(self, query: str) -> List[int]:
+        """Return the 0-based numbers of lines containing ``query``, ignoring case"""
+        needle = query.casefold()
+        if not needle:
+            return []
+        with self.lock:
+            grams = _grams(needle)
+            if grams:
+                # Start from the rarest trigram and intersect the rest
+                postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(postings[0])
+                for texts in postings[1:]:
+                    candidates &= texts
+                    if not candidates:
+                        break
+            else:
+                # Queries shorter than a trigram have to check every distinct line
+                candidates = self.line_numbers.keys()
+            numbers = []
+            for text in candidates:
+                if needle in text.casefold():
+                    numbers.extend(self.line_numbers[text])
+        numbers.sort()
+        return numbers
+
+
+_indexes: Dict[str, LineIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(key: str, lines: Sequence[str]) -> LineIndex:
+    """Return the shared index for one side of a diff, updated to ``lines``.
+
+    ``key`` identifies the side (a path or revision spec).
+    """
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LineIndex()
+    index.update(lines)
+    return index
+
+
+def forget_line_index(key: str):
+    """Drop the index of a side no diff shows any more"""
+    with _indexes_lock:
+        _indexes.pop(key, None)
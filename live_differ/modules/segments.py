@@ -0,0 +1,168 @@
+"""
+Overlong lines cut into content-defined segments.
+
+A minified 20 MB JavaScript or JSON file is a single line, which a line diff
+can only report as one replaced line, and whose intraline markup would run a
+character-level match across the whole file. ``segment_lines`` cuts every
+line longer than ``LONG_LINE`` characters into segments of a few hundred
+characters, which then take the place of lines in matching and rendering.
+The table numbers a segment by its line and column (``1:40213``).
+
+Cut points are content-defined, as in rsync and backup chunkers: a cut falls
+after a delimiter (punctuation or whitespace) whose preceding characters
+hash to a multiple of ``SEGMENT_DIVISOR``, at least ``MIN_SEGMENT``
+characters after the previous cut. Which positions qualify depends only on
+the text around them, so an insertion changes the segments around it and
+the cuts after it fall where they did before. Candidates are found with a
+regular expression and only those past the minimum length are hashed, so
+segmenting takes time linear in the length of the line.
+"""
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Iterator, List, Sequence
+
+# Lines longer than this many characters are segmented
+LONG_LINE = 4096
+MIN_SEGMENT = 128
+MAX_SEGMENT = 2048
+# About one delimiter in SEGMENT_DIVISOR past the minimum ends a segment
+SEGMENT_DIVISOR = 8
+# Text without delimiters (base64, hex) may be cut after any character
+RAW_DIVISOR = 256
+# Characters hashed to decide whether a candidate cut qualifies
+WINDOW = 8
+
+_DELIMITER = re.compile(r'[\s,;:{}()\[\]<>]')
+_ANY = re.compile(r'.', re.DOTALL)
+
+# Stored as the column of a line that wasn't segmented
+WHOLE_LINE = -1
+
+
+class SegmentedLines(list):
+    """The lines of a file with overlong lines replaced by their segments.
+
+    Items are plain strings and can be diffed like lines; ``line_numbers``
+    and ``columns`` give the 0-based line and column each one starts at,
+    with ``WHOLE_LINE`` as the column of a line that wasn't cut.
+    """
+
+    __slots__ = ('line_numbers', 'columns')
+
+    def __init__(self):
+        super().__init__()
+        self.line_numbers = array('i')
+        self.columns = array('i')
+
+    def label(self, index: int) -> str:
+        """How the item is numbered in the table: ``line`` or ``line:column``"""
+        line, column = self.line_numbers[index] + 1, self.columns[index]
+        return str(line) if column == WHOLE_LINE else f"{line}:{column + 1}"
+
+    def continues(self, index: int) -> bool:
+        """Whether the next item holds more of the same line"""
+        return index + 1 < len(self) and self.columns[index + 1] > 0
+
+
+def _cut(line: str, start: int, candidates: re.Pattern, divisor: int) -> int:
+    """The first qualifying cut between the minimum and maximum segment length"""
+    stop = min(start + MAX_SEGMENT, len(line))
+    for match in candidates.finditer(line, start + MIN_SEGMENT, stop):
+        end = match.end()
+        window = line[end - WINDOW:end].encode('utf-8', 'surrogatepass')
+        if zlib.crc32(window) % divisor == 0:
+            return end
+    return -1
+
+
+def iter_cuts(line: str) -> Iterator[int]:
+    """Yield the positions ``line`` is cut at, in order"""
+    start = 0
+    while len(line) - start > MIN_SEGMENT:
+        end = _cut(line, start, _DELIMITER, SEGMENT_DIVISOR)
+        if end < 0:
+            end = _cut(line, start, _ANY, RAW_DIVISOR)
+        if end < 0:
+            if len(line) - start <= MAX_SEGMENT:
+                return
+            # Nothing qualified; only now does the cut depend on the position
+            end = start + MAX_SEGMENT
+        yield end
+        start = end
+
+
+def segment_line(line: str) -> List[str]:
+    """Cut one line into its segments; only the last keeps the line ending"""
+    segments, start = [], 0
+    for end in iter_cuts(line):
+        segments.append(line[start:end])
+        start = end
+    segments.append(line[start:])
+    return segments
+
+
+# Segments of the last few long lines seen; a file re-read without changes
+# to a long line finds it here at the cost of hashing and comparing the line
+_RECENT_MAX = 8
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def _cached_segments(line: str) -> List[str]:
+    with _recent_lock:
+        segments = _recent.get(line)
+        if segments is not None:
+            _recent.move_to_end(line)
+            return segments
+    segments = segment_line(line)
+    with _recent_lock:
+        _recent[line] = segments
+        while len(_recent) > _RECENT_MAX:
+            _recent.popitem(last=False)
+    return segments
+
+
+def segment_lines(lines: Sequence[str]) -> Sequence[str]:
+    """Return ``lines`` with overlong lines segmented.
+
+    Files without overlong lines, and lines that are already segmented, are
+    returned as they are.
+    """
+    if isinstance(lines, SegmentedLines) or max(map(len, lines), default=0) <= LONG_LINE:
+        return lines
+    result = SegmentedLines()
+    for number, line in enumerate(lines):
+        if len(line) <= LONG_LINE:
+            result.append(line)
+            result.line_numbers.append(number)
+            result.columns.append(WHOLE_LINE)
+            continue
+        column = 0
+        for segment in _cached_segments(line):
+            result.append(segment)
+            result.line_numbers.append(number)
+            result.columns.append(column)
+            column += len(segment)
+    return result
+
+
+def line_number(lines: Sequence[str], index: int) -> str:
+    """The number shown for item ``index`` of a file's lines"""
+    if isinstance(lines, SegmentedLines):
+        return lines.label(index)
+    return str(index + 1)
+
+
+def line_count(lines: Sequence[str]) -> int:
+    """Number of lines in a file, counting a segmented line once"""
+    if isinstance(lines, SegmentedLines) and lines:
+        return lines.line_numbers[-1] + 1
+    return len(lines)
+
+
+def continues(lines: Sequence[str], index: int) -> bool:
+    """Whether item ``index`` is a segment the next item continues"""
+    return isinstance(lines, SegmentedLines) and lines.continues(index)
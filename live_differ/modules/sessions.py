@@ -0,0 +1,419 @@
+"""
+Diff sessions for daemon mode.
+
+A daemon serves any number of diff pairs from one process. Each pair is a
+session with its own id, URL prefix (``/s/<id>``) and socket.io room, while
+the file observer, the worker pool that recomputes diffs and the persistent
+cache are shared. Sessions nobody has looked at for a while are evicted.
+
+A compare set diffs one reference file against many variants: each variant
+is a session of its own (its drill-down page), and the sessions share one
+``Reference``, so the reference is read and indexed once per version. An
+edit to the reference re-diffs every variant on the pool; an edit to a
+variant re-diffs only that one.
+
+Sessions read whatever files they are given, so a daemon only accepts files
+under its allowed roots.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from .cache import DiffCache
+from .differ import BinaryFileError, DifferError, FileDiffer
+from .gitblob import parse_revision_spec
+from .highlight import forget_highlighter
+from .history import HistoryStore
+from .normalize import NormalizeOptions
+from .reference import Reference, ReferenceDiffer
+from .search import forget_line_index
+from .watcher import FileChangeHandler
+
+logger = logging.getLogger(__name__)
+
+
+class SessionError(Exception):
+    """Raised for unknown sessions or sessions that can't be created"""
+    pass
+
+
+class Session:
+    """One registered diff pair."""
+
+    def __init__(self, session_id: str, differ: FileDiffer, handler: FileChangeHandler,
+                 history: Optional[HistoryStore] = None):
+        self.id = session_id
+        self.differ = differ
+        self.handler = handler
+        self.history = history
+        self.created = time.time()
+        self.last_active = self.created
+        self.clients = 0
+
+    @property
+    def room(self) -> str:
+        return room_for(self.id)
+
+    @property
+    def url(self) -> str:
+        return f"/s/{self.id}"
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'url': self.url,
+            'room': self.room,
+            'file1': self.differ.file1_revision.spec if self.differ.file1_revision else self.differ.file1_path,
+            'file2': self.differ.file2_revision.spec if self.differ.file2_revision else self.differ.file2_path,
+            'normalize': self.differ.normalize.to_dict(),
+            'highlight': self.differ.highlight,
+            'created': self.created,
+            'last_active': self.last_active,
+            'clients': self.clients,
+        }
+
+
+class CompareSet:
+    """One reference file compared against many variants, a session each."""
+
+    def __init__(self, set_id: str, reference: Reference, sessions: List[Session]):
+        self.id = set_id
+        self.reference = reference
+        self.sessions = sessions
+        self.created = time.time()
+        self.last_active = self.created
+
+    @property
+    def url(self) -> str:
+        return f"/compare/{self.id}"
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def is_idle(self, now: float, timeout: float) -> bool:
+        """No viewers and no use of the set or any of its variants for ``timeout``"""
+        last_active = max([self.last_active] + [session.last_active for session in self.sessions])
+        return all(session.clients == 0 for session in self.sessions) and now - last_active > timeout
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'url': self.url,
+            'reference': self.reference.path,
+            'normalize': self.reference.normalize.to_dict(),
+            'variants': [
+                {'session': session.id, 'url': session.url, 'file': session.to_dict()['file2']}
+                for session in self.sessions
+            ],
+            'created': self.created,
+            'last_active': self.last_active,
+        }
+
+
+def room_for(session_id: str) -> str:
+    return f"session-{session_id}"
+
+
+class _DispatchHandler(FileSystemEventHandler):
+    """Routes events from the shared observer to the sessions watching the file."""
+
+    def __init__(self, manager: 'SessionManager'):
+        self.manager = manager
+
+    def on_modified(self, event):
+        if event.is_directory:
+            return
+        for session in self.manager.sessions_for_path(os.path.abspath(event.src_path)):
+            # Diffs are recomputed on the pool so a slow pair doesn't hold up the observer
+            self.manager.pool.submit(session.handler.on_modified, event)
+
+
+class SessionManager:
+    """Creates, tracks and evicts the sessions of a daemon."""
+
+    def __init__(self, socket, cache: Optional[DiffCache] = None, highlight: bool = False,
+                 normalize: Optional[NormalizeOptions] = None, history_size: int = 1000,
+                 idle_timeout: float = 600, max_workers: int = 4, debug: bool = False,
+                 roots: Optional[Sequence[str]] = None):
+        self.socket = socket
+        # Directories sessions may read files from; None allows any
+        self.roots = None if roots is None else [os.path.realpath(root) for root in roots]
+        self.cache = cache
+        self.highlight = highlight
+        self.normalize = normalize or NormalizeOptions()
+        self.history_size = history_size
+        self.idle_timeout = idle_timeout
+        self.debug = debug
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='live-differ')
+        self.observer = Observer()
+        self.handler = _DispatchHandler(self)
+        self.sessions: Dict[str, Session] = {}
+        self.compare_sets: Dict[str, CompareSet] = {}
+        # Watched directory -> (watch, number of sessions using it)
+        self.watches: Dict[str, list] = {}
+        self.clients: Dict[str, str] = {}
+        self.lock = threading.RLock()
+        self._stop = threading.Event()
+        self._reaper = None
+
+    def start(self):
+        """Start the shared observer and the idle session reaper"""
+        self.observer.start()
+        if self.idle_timeout > 0:
+            self._reaper = threading.Thread(target=self._reap, name='live-differ-reaper', daemon=True)
+            self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            self.compare_sets.clear()
+            for session_id in list(self.sessions):
+                self.delete(session_id, notify=False)
+        if self.observer.is_alive():
+            self.observer.stop()
+            self.observer.join()
+        self.pool.shutdown(wait=True)
+
+    def _reap(self):
+        interval = max(min(self.idle_timeout / 4, 60), 1)
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def check_path(self, spec: str):
+        """Raise SessionError unless a file (or REV:PATH spec) is under an allowed root"""
+        if self.roots is None:
+            return
+        parsed = parse_revision_spec(spec)
+        path = os.path.realpath(parsed[1] if parsed is not None else spec)
+        if not any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots):
+            raise SessionError(f"{spec} is outside the allowed roots")
+
+    def create(self, file1: str, file2: str, highlight: Optional[bool] = None,
+               normalize: Optional[NormalizeOptions] = None) -> Session:
+        """Register a new diff pair and start watching its files"""
+        self.check_path(file1)
+        self.check_path(file2)
+        try:
+            differ = FileDiffer(
+                file1, file2,
+                debug=self.debug,
+                cache=self.cache,
+                highlight=self.highlight if highlight is None else highlight,
+                normalize=self.normalize if normalize is None else normalize
+            )
+        except DifferError as e:
+            raise SessionError(str(e))
+        session = self._add(differ, self._new_history(differ))
+        # Warm the diff in the background so the session's first view is fast
+        self.pool.submit(self._warm, session)
+        logger.info(f"Created session {session.id} for {file1} and {file2}")
+        return session
+
+    def create_set(self, reference: str, variants: Sequence[str], highlight: Optional[bool] = None,
+                   normalize: Optional[NormalizeOptions] = None) -> CompareSet:
+        """Compare one reference file against every variant, a session each"""
+        if not variants:
+            raise SessionError("At least one variant is required")
+        for path in (reference, *variants):
+            self.check_path(path)
+        shared = Reference(reference, self.normalize if normalize is None else normalize)
+        if shared.path in {os.path.abspath(variant) for variant in variants}:
+            raise SessionError("The reference can't also be a variant")
+        differs = []
+        try:
+            try:
+                shared.current()
+            except BinaryFileError:
+                # Each variant is compared with it by bytes
+                pass
+            for variant in variants:
+                differs.append(ReferenceDiffer(
+                    shared, variant,
+                    debug=self.debug,
+                    cache=self.cache,
+                    highlight=self.highlight if highlight is None else highlight
+                ))
+        except DifferError as e:
+            raise SessionError(str(e))
+        # One timeline for the set, so the reference is recorded once per version
+        history = self._new_history(*differs)
+        sessions = [self._add(differ, history) for differ in differs]
+        compare_set = CompareSet(uuid.uuid4().hex[:12], shared, sessions)
+        with self.lock:
+            self.compare_sets[compare_set.id] = compare_set
+        # Variants are diffed in parallel; the first one reads and indexes the reference
+        for session in sessions:
+            self.pool.submit(self._warm, session)
+        logger.info(f"Created compare set {compare_set.id}: {reference} against {len(variants)} variants")
+        return compare_set
+
+    def _new_history(self, *differs: FileDiffer) -> Optional[HistoryStore]:
+        if self.history_size <= 0:
+            return None
+        history = HistoryStore(max_versions=self.history_size)
+        for differ in differs:
+            for path in differ.watch_paths():
+                try:
+                    history.record(path, differ.read_file(path))
+                except BinaryFileError:
+                    # Binary files have no line history
+                    pass
+        return history
+
+    def _add(self, differ: FileDiffer, history: Optional[HistoryStore]) -> Session:
+        session_id = uuid.uuid4().hex[:12]
+        handler = FileChangeHandler(differ, self.socket, history, room=room_for(session_id))
+        session = Session(session_id, differ, handler, history)
+        with self.lock:
+            self.sessions[session_id] = session
+            for watch_dir in {os.path.dirname(path) for path in differ.watch_paths()}:
+                entry = self.watches.get(watch_dir)
+                if entry is None:
+                    watch = self.observer.schedule(self.handler, path=watch_dir, recursive=False)
+                    self.watches[watch_dir] = [watch, 1]
+                else:
+                    entry[1] += 1
+        return session
+
+    def _warm(self, session: Session):
+        try:
+            session.differ.get_diff()
+        except DifferError as e:
+            logger.warning(f"Could not warm session {session.id}: {str(e)}")
+
+    def get(self, session_id: str) -> Session:
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionError(f"Unknown session: {session_id}")
+        return session
+
+    def list(self) -> List[Session]:
+        with self.lock:
+            return list(self.sessions.values())
+
+    def get_set(self, set_id: str) -> CompareSet:
+        with self.lock:
+            compare_set = self.compare_sets.get(set_id)
+        if compare_set is None:
+            raise SessionError(f"Unknown compare set: {set_id}")
+        return compare_set
+
+    def list_sets(self) -> List[CompareSet]:
+        with self.lock:
+            return list(self.compare_sets.values())
+
+    def delete_set(self, set_id: str, notify: bool = True):
+        """Delete a compare set and the sessions of all its variants"""
+        with self.lock:
+            compare_set = self.compare_sets.pop(set_id, None)
+            if compare_set is None:
+                raise SessionError(f"Unknown compare set: {set_id}")
+            for session in list(compare_set.sessions):
+                if session.id in self.sessions:
+                    self.delete(session.id, notify=notify)
+        logger.info(f"Deleted compare set {set_id}")
+
+    def summary(self, set_id: str) -> Dict:
+        """The set with the diff statistics of every variant, computed on the pool"""
+        compare_set = self.get_set(set_id)
+        compare_set.touch()
+        result = compare_set.to_dict()
+        futures = [self.pool.submit(session.differ.get_stats) for session in compare_set.sessions]
+        for variant, future in zip(result['variants'], futures):
+            try:
+                variant['stats'] = future.result()
+            except DifferError as e:
+                variant['error'] = str(e)
+        return result
+
+    def delete(self, session_id: str, notify: bool = True):
+        """Stop watching a session's files and forget it"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                raise SessionError(f"Unknown session: {session_id}")
+            for compare_set in self.compare_sets.values():
+                if session in compare_set.sessions:
+                    compare_set.sessions.remove(session)
+            for watch_dir in {os.path.dirname(path) for path in session.differ.watch_paths()}:
+                entry = self.watches.get(watch_dir)
+                if entry is None:
+                    continue
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self.observer.unschedule(entry[0])
+                    del self.watches[watch_dir]
+            for sid in [sid for sid, owner in self.clients.items() if owner == session_id]:
+                del self.clients[sid]
+            session.handler.stop()
+            # The highlighters and search indexes hold whole files; keep only
+            # those another session still shows
+            in_use = {key for other in self.sessions.values() for key in other.differ.side_keys()}
+            for key in set(session.differ.side_keys()) - in_use:
+                forget_line_index(key)
+                forget_highlighter(key)
+        if notify:
+            self.socket.emit('session_closed', {'id': session_id}, namespace='/', to=session.room)
+        logger.info(f"Deleted session {session_id}")
+
+    def sessions_for_path(self, path: str) -> List[Session]:
+        with self.lock:
+            return [
+                session for session in self.sessions.values()
+                if path in session.differ.watch_paths()
+            ]
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Delete sessions with no viewers that haven't been used for ``idle_timeout``.
+
+        Variants of a compare set go together, once the whole set is idle.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            idle_sets = [
+                compare_set for compare_set in self.compare_sets.values()
+                if compare_set.is_idle(now, self.idle_timeout)
+            ]
+            members = {session.id for compare_set in self.compare_sets.values() for session in compare_set.sessions}
+            idle = [
+                session.id for session in self.sessions.values()
+                if session.id not in members
+                and session.clients == 0 and now - session.last_active > self.idle_timeout
+            ]
+            for session_id in idle:
+                self.delete(session_id)
+            for compare_set in idle_sets:
+                idle.extend(session.id for session in compare_set.sessions)
+                self.delete_set(compare_set.id)
+        if idle:
+            logger.info(f"Evicted idle sessions: {', '.join(idle)}")
+        return idle
+
+    def join(self, sid: str, session_id: str) -> Session:
+        """Track a socket.io client viewing a session"""
+        with self.lock:
+            session = self.get(session_id)
+            self.leave(sid)
+            self.clients[sid] = session_id
+            session.clients += 1
+            session.touch()
+            return session
+
+    def leave(self, sid: str):
+        with self.lock:
+            session_id = self.clients.pop(sid, None)
+            session = self.sessions.get(session_id) if session_id else None
+            if session is not None:
+                session.clients = max(session.clients - 1, 0)
+                session.touch()
@@ -0,0 +1,166 @@
+"""
+Diff state shared between a producer process and stateless web nodes.
+
+The producer owns the file observer. After every change it publishes a
+snapshot of both sides (file info and lines) to the persistent diff cache
+under a key derived from the file pair and options. Web nodes started with the
+same arguments read the snapshot back and diff it with ``SnapshotDiffer``, so
+they can serve ``/``, rows and search without access to the files themselves;
+the rendered table is normally already in the shared cache as well.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from .cache import DiffCache, content_hash, make_key
+from .differ import DifferError, FileDiffer
+from .normalize import NormalizeOptions
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotRevision:
+    """Stands in for a ``GitRevision`` side of a published snapshot."""
+
+    def __init__(self, spec: str, sha: str, info: Dict, lines: List[str], digest: str):
+        self.spec = spec
+        self.sha = sha
+        self.path = info['path']
+        self.info = info
+        self.lines = lines
+        self.digest = digest
+
+    def is_binary(self) -> bool:
+        # Only text pairs are published
+        return False
+
+    def read_lines(self) -> List[str]:
+        return self.lines
+
+    def get_info(self) -> Dict:
+        return self.info
+
+
+class SnapshotDiffer(FileDiffer):
+    """A ``FileDiffer`` over a published snapshot instead of files on disk."""
+
+    def __init__(self, snapshot: Dict, debug: bool = False, cache: Optional[DiffCache] = None,
+                 highlight: bool = False, normalize: Optional[NormalizeOptions] = None):
+        self.logger = logging.getLogger(__name__)
+        self.debug = debug
+        self.cache = cache
+        self.highlight = highlight
+        self.normalize = normalize or NormalizeOptions()
+        self.last_read = {}
+        self.snapshot_lines = {}
+        self.snapshot_info = {}
+        self.snapshot_digests = {}
+        sides = []
+        for side in snapshot['sides']:
+            revision = side.get('revision')
+            if revision is not None:
+                sides.append(SnapshotRevision(
+                    revision['spec'], revision['sha'], side['info'], side['lines'], side['digest']
+                ))
+            else:
+                self.snapshot_lines[side['info']['path']] = side['lines']
+                self.snapshot_info[side['info']['path']] = side['info']
+                self.snapshot_digests[side['info']['path']] = side['digest']
+                sides.append(None)
+        self.file1_revision, self.file2_revision = sides
+        self.file1_path, self.file2_path = (side['info']['path'] for side in snapshot['sides'])
+
+    def watch_paths(self) -> List[str]:
+        return []
+
+    def is_binary(self) -> bool:
+        # Only text pairs are published, and the files on this node (if any)
+        # aren't the ones the snapshot holds
+        return False
+
+    def _get_side_info(self, file_path, revision):
+        if revision is not None:
+            return revision.get_info()
+        return self.snapshot_info[file_path]
+
+    def _read_side(self, file_path, revision):
+        if revision is not None:
+            return revision.read_lines()
+        return self.snapshot_lines[file_path]
+
+    def _side_digest(self, file_path, revision):
+        # The file on this node, if any, isn't what the snapshot holds
+        if revision is not None:
+            return revision.digest
+        return self.snapshot_digests[file_path]
+
+
+class SharedState:
+    """Publishes and loads the latest snapshot of one diff pair."""
+
+    def __init__(self, cache: DiffCache, file1: str, file2: str,
+                 normalize: Optional[NormalizeOptions] = None):
+        self.cache = cache
+        self.normalize = normalize or NormalizeOptions()
+        pair = {'file1': file1, 'file2': file2, 'normalize': self.normalize.to_dict()}
+        # A small pointer to the current snapshot, so readers only fetch the
+        # (large) snapshot itself when it actually changed
+        self.pointer_key = make_key('state-pointer', **pair)
+        self.pair = pair
+        self.loaded = None
+        self.lock = threading.Lock()
+
+    def publish(self, differ: FileDiffer, diff_data: Dict):
+        """Store the sides ``differ`` last diffed and point readers at them"""
+        if diff_data.get('binary'):
+            # Snapshots hold lines; web nodes keep serving the last text version
+            logger.warning("Binary files are not published to web nodes")
+            return None
+        sides = []
+        for path, revision, info in (
+            (differ.file1_path, differ.file1_revision, diff_data['file1_info']),
+            (differ.file2_path, differ.file2_revision, diff_data['file2_info']),
+        ):
+            if revision is not None:
+                lines = revision.read_lines()
+                side = {'revision': {'spec': revision.spec, 'sha': revision.sha}}
+            else:
+                lines = differ.last_read.get(path)
+                if lines is None:
+                    lines = differ.read_file(path)
+                side = {'revision': None}
+            # The checksum of the raw bytes, which web nodes can't read themselves
+            side.update(info=info, lines=lines, digest=differ._side_digest(path, revision))
+            sides.append(side)
+        version = make_key(
+            'state-version',
+            hashes=[content_hash(side['lines']) for side in sides],
+            **self.pair
+        )
+        self.cache.put(make_key('state', version=version), {'sides': sides})
+        self.cache.put(self.pointer_key, {'version': version})
+        logger.debug(f"Published diff state {version[:12]}")
+        return version
+
+    def load(self) -> Optional[Dict]:
+        """The latest published snapshot, or None if nothing was published"""
+        pointer = self.cache.get(self.pointer_key)
+        if pointer is None:
+            return None
+        with self.lock:
+            if self.loaded is not None and self.loaded[0] == pointer['version']:
+                return self.loaded[1]
+        snapshot = self.cache.get(make_key('state', version=pointer['version']))
+        if snapshot is None:
+            return None
+        with self.lock:
+            self.loaded = (pointer['version'], snapshot)
+        return snapshot
+
+    def differ(self, debug: bool = False, highlight: bool = False) -> SnapshotDiffer:
+        snapshot = self.load()
+        if snapshot is None:
+            raise DifferError("No diff has been published yet")
+        return SnapshotDiffer(
+            snapshot, debug=debug, cache=self.cache, highlight=highlight, normalize=self.normalize
+        )
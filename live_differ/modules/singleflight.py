@@ -0,0 +1,77 @@
+"""
+Single-flight computation of diffs.
+
+When many viewers open the same diff at once, every request would compute
+the same table. A ``SingleFlight`` lets the first caller for a key compute it
+while concurrent callers for that key wait and share its result (or its
+exception). Keys identify the file pair's content version and options, so a
+new version is never served from an older computation. The last few results
+are kept, so callers arriving just after a computation finished don't start
+another.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """One in-flight computation."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent computations of the same key."""
+
+    def __init__(self, keep: int = 0):
+        # Number of completed results kept for later callers
+        self.keep = keep
+        self.results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.lock = threading.Lock()
+        self.computed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the value for ``key``, computing it at most once at a time"""
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.shared += 1
+                return self.results[key]
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.computed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                if call.error is None and self.keep:
+                    self.results[key] = call.result
+                    while len(self.results) > self.keep:
+                        self.results.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def forget(self):
+        """Drop the kept results"""
+        with self.lock:
+            self.results.clear()
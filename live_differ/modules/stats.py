@@ -0,0 +1,54 @@
+"""
+Summary statistics of a diff, computed from opcodes alone.
+
+Monitoring mostly wants to know whether two files still match and how far
+apart they are. These numbers come straight from the line opcodes, without
+building rows or rendering the table. Moved blocks count as removed and
+added lines, since detecting them needs the row model.
+"""
+from typing import Dict, Iterable, Sequence, Tuple, Union
+
+from .normalize import is_blank
+
+
+def diff_stats(file1_lines: Sequence[str], file2_lines: Sequence[str],
+               opcodes: Iterable[Tuple[str, int, int, int, int]],
+               context: int, ignore_blank_lines: bool = False) -> Dict[str, Union[int, float]]:
+    """Count the added, removed and changed lines and the hunks of a diff.
+
+    A ``replace`` opcode pairs up lines as changed, and whatever is left over
+    on either side as removed or added. Hunks are counted the way the table
+    groups changes, so ``hunks`` matches what the page shows (moves aside).
+    """
+    added = removed = changed = matched = hunks = 0
+    row = 0
+    last_stop = None
+    for tag, i1, i2, j1, j2 in opcodes:
+        old, new = i2 - i1, j2 - j1
+        if tag == 'equal':
+            matched += old
+            row += old
+            continue
+        rows = max(old, new)
+        if ignore_blank_lines and all(is_blank(line) for line in file1_lines[i1:i2]) \
+                and all(is_blank(line) for line in file2_lines[j1:j2]):
+            row += rows
+            continue
+        paired = min(old, new)
+        changed += paired
+        removed += old - paired
+        added += new - paired
+        start, stop = row - context, row + rows + context
+        if last_stop is None or start > last_stop:
+            hunks += 1
+        last_stop = stop
+        row += rows
+    total = len(file1_lines) + len(file2_lines)
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'hunks': hunks,
+        # Same measure as SequenceMatcher.ratio(), over lines
+        'similarity': round(2.0 * matched / total, 6) if total else 1.0,
+    }
@@ -0,0 +1,230 @@
+"""
+Structural comparison of JSON and YAML documents.
+
+Configs re-serialized with their keys in another order come out of a line
+diff as changed throughout. In structural mode both sides are parsed and
+flattened into one line per leaf value, ``key.path[0].leaf: value``, with
+mapping keys in sorted order, so key order no longer matters and every
+shown line names the path it is at.
+
+Every node of the parsed tree carries a hash of its subtree (independent of
+key order) and the range of flattened lines it covers. Matching walks both
+trees from the root and emits a whole subtree as one equal opcode as soon as
+its hashes agree, so unchanged subtrees cost O(1) however large they are;
+only the paths that differ are descended into. Sequence items are aligned
+on their hashes, so inserting an item doesn't report every later item as
+changed. The rows, table, statistics and search then work on the flattened
+lines as they would on any other.
+
+Parsed documents are kept per content hash, so after a watcher update the
+side that didn't change is neither parsed nor hashed again.
+
+YAML needs the optional PyYAML dependency; without it YAML sides fall back to
+the line diff, as do documents that fail to parse (e.g. half-written files).
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+from json.encoder import encode_basestring
+from typing import Any, List, Optional, Sequence, Tuple
+
+from .cache import content_hash
+from .singleflight import SingleFlight
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:  # pragma: no cover - exercised only without pyyaml
+    YAML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Values of the structure option: detect by extension, or force a format
+STRUCTURE_MODES = ('auto', 'json', 'yaml')
+EXTENSIONS = {'.json': 'json', '.yaml': 'yaml', '.yml': 'yaml'}
+
+# Parsed documents of the most recent versions, keyed by format and content
+_DOCUMENTS_MAX = 8
+_documents = SingleFlight(keep=_DOCUMENTS_MAX)
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_-]*\Z')
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+class StructureError(Exception):
+    """Raised when a side can't be parsed in the requested format"""
+    pass
+
+
+class Node:
+    """A parsed value with its subtree hash and the flattened lines it covers.
+
+    ``children`` is a dict of key to Node for a mapping, a list of Nodes for
+    a sequence, and None for a leaf (a scalar or an empty container).
+    """
+
+    __slots__ = ('hash', 'start', 'stop', 'children')
+
+    def __init__(self, hash: bytes, start: int, stop: int, children=None):
+        self.hash = hash
+        self.start = start
+        self.stop = stop
+        self.children = children
+
+
+class DocumentLines(list):
+    """The flattened lines of a parsed document, plus its tree in ``root``."""
+
+    __slots__ = ('root',)
+
+    def __init__(self):
+        super().__init__()
+        self.root = None
+
+
+def document_format(path: str, mode: Optional[str]) -> Optional[str]:
+    """The format a side is parsed as, or None to diff it by lines"""
+    if not mode:
+        return None
+    if mode == 'auto':
+        return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    return mode
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _key_path(path: str, key: str) -> str:
+    if _IDENTIFIER.match(key):
+        return f"{path}.{key}" if path else key
+    return f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+
+# JSON text of the common scalar types, without json.dumps' per-call setup
+_SCALARS = {
+    str: encode_basestring,
+    int: int.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+}
+
+
+def _scalar(value: Any) -> str:
+    encode = _SCALARS.get(type(value))
+    if encode is not None:
+        return encode(value)
+    # Floats (NaN and infinities), and the dates and other scalars of YAML
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _index(value: Any, path: str, lines: DocumentLines) -> Node:
+    start = len(lines)
+    if isinstance(value, dict) and value:
+        children = {}
+        parts = [b'{']
+        for key in sorted(value, key=str):
+            child = _index(value[key], _key_path(path, str(key)), lines)
+            children[str(key)] = child
+            parts.extend((str(key).encode('utf-8', 'surrogatepass'), b'\0', child.hash))
+        return Node(_digest(b''.join(parts)), start, len(lines), children)
+    if isinstance(value, list) and value:
+        children = [_index(item, f"{path}[{n}]", lines) for n, item in enumerate(value)]
+        return Node(_digest(b'[' + b''.join(child.hash for child in children)), start, len(lines), children)
+    text = _scalar(value)
+    lines.append(f"{path or '$'}: {text}\n")
+    return Node(_digest(b'=' + text.encode('utf-8', 'surrogatepass')), start, len(lines))
+
+
+def _load(text: str, format: str) -> Any:
+    if format == 'json':
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise StructureError(f"Invalid JSON: {str(e)}")
+    if not YAML_AVAILABLE:
+        raise StructureError("YAML support needs pyyaml (pip install \"live-differ[yaml]\")")
+    try:
+        documents = list(yaml.safe_load_all(text))
+    except yaml.YAMLError as e:
+        raise StructureError(f"Invalid YAML: {str(e)}")
+    # A stream of several documents compares as a sequence of them
+    return documents[0] if len(documents) == 1 else documents
+
+
+def parse_document(lines: Sequence[str], format: str) -> DocumentLines:
+    """Parse a side and flatten it into one line per leaf value.
+
+    Raises StructureError if the side isn't valid in ``format``.
+    """
+    def parse():
+        document = DocumentLines()
+        document.root = _index(_load(''.join(lines), format), '', document)
+        return document
+    return _documents.do((format, content_hash(lines)), parse)
+
+
+def _emit(opcodes: List[Opcode], tag: str, i1: int, i2: int, j1: int, j2: int):
+    if i1 == i2 and j1 == j2:
+        return
+    if opcodes:
+        last = opcodes[-1]
+        # Runs of one kind, and a delete next to an insert, make one opcode
+        if last[2] == i1 and last[4] == j1 and (
+                last[0] == tag or (tag != 'equal' and last[0] != 'equal')):
+            merged = tag if last[0] == tag else 'replace'
+            opcodes[-1] = (merged, last[1], i2, last[3], j2)
+            return
+    if tag != 'equal' and i1 < i2 and j1 < j2:
+        tag = 'replace'
+    opcodes.append((tag, i1, i2, j1, j2))
+
+
+def _match(opcodes: List[Opcode], node1: Node, node2: Node):
+    if node1.hash == node2.hash:
+        _emit(opcodes, 'equal', node1.start, node1.stop, node2.start, node2.stop)
+        return
+    children1, children2 = node1.children, node2.children
+    if isinstance(children1, dict) and isinstance(children2, dict):
+        i, j = node1.start, node2.start
+        for key in sorted(children1.keys() | children2.keys()):
+            child1, child2 = children1.get(key), children2.get(key)
+            if child2 is None:
+                _emit(opcodes, 'delete', child1.start, child1.stop, j, j)
+                i = child1.stop
+            elif child1 is None:
+                _emit(opcodes, 'insert', i, i, child2.start, child2.stop)
+                j = child2.stop
+            else:
+                _match(opcodes, child1, child2)
+                i, j = child1.stop, child2.stop
+        return
+    if isinstance(children1, list) and isinstance(children2, list):
+        matcher = difflib.SequenceMatcher(
+            None, [child.hash for child in children1], [child.hash for child in children2]
+        )
+        for tag, a1, a2, b1, b2 in matcher.get_opcodes():
+            if tag == 'replace' and a2 - a1 == b2 - b1:
+                # Items changed in place: descend to the paths that differ
+                for child1, child2 in zip(children1[a1:a2], children2[b1:b2]):
+                    _match(opcodes, child1, child2)
+                continue
+            start1 = children1[a1].start if a1 < a2 else (children1[a1 - 1].stop if a1 else node1.start)
+            start2 = children2[b1].start if b1 < b2 else (children2[b1 - 1].stop if b1 else node2.start)
+            stop1 = children1[a2 - 1].stop if a1 < a2 else start1
+            stop2 = children2[b2 - 1].stop if b1 < b2 else start2
+            _emit(opcodes, tag, start1, stop1, start2, stop2)
+        return
+    # Different scalars, or a value that changed type
+    _emit(opcodes, 'replace', node1.start, node1.stop, node2.start, node2.stop)
+
+
+def match_documents(document1: DocumentLines, document2: DocumentLines) -> List[Opcode]:
+    """Opcodes between the flattened lines of two documents, from their trees"""
+    opcodes: List[Opcode] = []
+    _match(opcodes, document1.root, document2.root)
+    return opcodes
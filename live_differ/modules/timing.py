@@ -0,0 +1,40 @@
+"""
+Structured timing records of diff computations.
+
+Each ``get_diff`` logs one record on the ``live_differ.timing`` logger. The
+record carries its measurements in a ``timing`` attribute, and
+``TimingFormatter`` writes them as one JSON object per line. This logger is
+enabled at INFO regardless of the application log level. ``setup_logging``
+sends its records only to the timing log, through the same background writer
+as every other record.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any
+
+TIMING_LOGGER = 'live_differ.timing'
+
+timing_logger = logging.getLogger(TIMING_LOGGER)
+timing_logger.setLevel(logging.INFO)
+
+
+def log_timing(event: str, **fields: Any):
+    """Log one timing record; durations are given in milliseconds"""
+    if timing_logger.isEnabledFor(logging.INFO):
+        timing_logger.info(
+            "%s %s", event,
+            ' '.join(f"{key}={value}" for key, value in fields.items()),
+            extra={'timing': {'event': event, **fields}}
+        )
+
+
+class TimingFormatter(logging.Formatter):
+    """Formats timing records as JSON lines."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            **getattr(record, 'timing', {'event': record.getMessage()})
+        }
+        return json.dumps(payload, default=str)
@@ -0,0 +1,88 @@
+"""
+Common prefix and suffix trimming before line matching.
+
+Most pairs of versions share long identical runs at both ends, and handing
+those to ``difflib`` costs a normalization lookup and a matcher step per
+line. ``common_affixes`` finds how many leading and trailing lines two files
+share, so only the middle region is normalized and matched.
+
+The scan compares blocks of lines as list slices, which runs in C (an
+identity check, then a length check and ``memcmp`` per line), and only walks
+line by line inside the first block that differs. Trimming uses exact line
+equality, so it is valid under any normalization: lines equal as read are
+equal after normalizing too.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Lines compared per slice comparison
+BLOCK_LINES = 1024
+
+
+def common_prefix(file1_lines: Sequence[str], file2_lines: Sequence[str],
+                  limit: Optional[int] = None) -> int:
+    """Number of leading lines the two files share, at most ``limit``"""
+    if limit is None:
+        limit = min(len(file1_lines), len(file2_lines))
+    start = 0
+    while start < limit:
+        stop = min(start + BLOCK_LINES, limit)
+        if file1_lines[start:stop] != file2_lines[start:stop]:
+            while file1_lines[start] == file2_lines[start]:
+                start += 1
+            return start
+        start = stop
+    return limit
+
+
+def common_suffix(file1_lines: Sequence[str], file2_lines: Sequence[str],
+                  limit: Optional[int] = None) -> int:
+    """Number of trailing lines the two files share, at most ``limit``"""
+    n1, n2 = len(file1_lines), len(file2_lines)
+    if limit is None:
+        limit = min(n1, n2)
+    count = 0
+    while count < limit:
+        step = min(BLOCK_LINES, limit - count)
+        if file1_lines[n1 - count - step:n1 - count] != file2_lines[n2 - count - step:n2 - count]:
+            while file1_lines[n1 - count - 1] == file2_lines[n2 - count - 1]:
+                count += 1
+            return count
+        count += step
+    return limit
+
+
+def common_affixes(file1_lines: Sequence[str], file2_lines: Sequence[str]) -> Tuple[int, int]:
+    """Return how many leading and trailing lines the two files share.
+
+    The prefix and suffix never overlap, so both can be cut off together.
+    """
+    prefix = common_prefix(file1_lines, file2_lines)
+    limit = min(len(file1_lines), len(file2_lines)) - prefix
+    return prefix, common_suffix(file1_lines, file2_lines, limit)
+
+
+def untrim_opcodes(opcodes: Iterable[Tuple[str, int, int, int, int]], prefix: int,
+                   file1_len: int, file2_len: int) -> List[Tuple[str, int, int, int, int]]:
+    """Turn the opcodes of the middle regions into opcodes of the whole files.
+
+    The trimmed prefix and suffix become ``equal`` opcodes, merged with any
+    ``equal`` opcode they touch (lines that only match after normalizing).
+    """
+    result = []
+
+    def add(tag, i1, i2, j1, j2):
+        if tag == 'equal' and result and result[-1][0] == 'equal':
+            _, p1, _, q1, _ = result.pop()
+            i1, j1 = p1, q1
+        result.append((tag, i1, i2, j1, j2))
+
+    if prefix:
+        add('equal', 0, prefix, 0, prefix)
+    end1 = end2 = prefix
+    for tag, i1, i2, j1, j2 in opcodes:
+        add(tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix)
+        end1, end2 = i2 + prefix, j2 + prefix
+    if end1 < file1_len:
+        # Only the shared suffix is left once the middle regions are done
+        add('equal', end1, file1_len, end2, file2_len)
+    return result
@@ -1,24 +1,97 @@
+import logging
+import threading
 import time
 import os
 from watchdog.events import FileSystemEventHandler
+from .profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+# Changes closer together than this are diffed once at the start of the burst
+# and once more at its end
+DEBOUNCE = 0.3
 
 class FileChangeHandler(FileSystemEventHandler):
-    def __init__(self, differ, socket):
+    def __init__(self, differ, socket, history=None, room=None, shared_state=None):
         self.differ = differ
         self.socket = socket
+        self.history = history
+        # A producer publishes each version for the web nodes to serve
+        self.shared_state = shared_state
+        # Daemon sessions only update the clients in their own room
+        self.room = room
         self.last_modified = 0
+        # Diffs the last change of a burst, which the debounce would skip
+        self.catch_up = None
+        self.lock = threading.Lock()
+        # One update at a time, so an older diff is never emitted after a newer one
+        self.update_lock = threading.Lock()
+        # What the catch-up compares against, so it doesn't resend an unchanged diff
+        self.last_diff = None
+    
+    def emit(self, event, data):
+        if self.room is None:
+            self.socket.emit(event, data, namespace='/')
+        else:
+            self.socket.emit(event, data, namespace='/', to=self.room)
         
     def on_modified(self, event):
         if not event.is_directory:  # Only handle file modifications
-            current_time = time.time()
-            # Increase debounce time to 300ms
-            if current_time - self.last_modified > 0.3:
-                self.last_modified = current_time
-                # Get absolute paths for comparison
-                event_path = os.path.abspath(event.src_path)
-                file1_path = os.path.abspath(self.differ.file1_path)
-                file2_path = os.path.abspath(self.differ.file2_path)
-                
-                if event_path in [file1_path, file2_path]:
-                    diff_data = self.differ.get_diff()
-                    self.socket.emit('update_diff', diff_data, namespace='/')
+            # Get absolute paths for comparison; git revision sides are
+            # never re-read, so only the working files are watched
+            event_path = os.path.abspath(event.src_path)
+            watched_paths = [os.path.abspath(path) for path in self.differ.watch_paths()]
+            if event_path not in watched_paths:
+                return
+            with self.lock:
+                wait = self.last_modified + DEBOUNCE - time.time()
+                if wait > 0:
+                    # Within the window: diff again when it ends, so the
+                    # final write of a burst is always shown
+                    if self.catch_up is None:
+                        self.catch_up = threading.Timer(wait, self._catch_up)
+                        self.catch_up.daemon = True
+                        self.catch_up.start()
+                    return
+                self.last_modified = time.time()
+            self._profiled_update()
+    
+    def _catch_up(self):
+        with self.lock:
+            self.catch_up = None
+            self.last_modified = time.time()
+        try:
+            self._profiled_update(skip_unchanged=True)
+        except Exception:
+            # Nothing else would report it on the timer's thread
+            logger.exception("Error updating the diff:")
+    
+    def stop(self):
+        """Drop a pending catch-up, for a session that is going away"""
+        with self.lock:
+            if self.catch_up is not None:
+                self.catch_up.cancel()
+                self.catch_up = None
+    
+    def _profiled_update(self, skip_unchanged=False):
+        with self.update_lock, profiled('diff-update'):
+            self.update(skip_unchanged)
+    
+    def update(self, skip_unchanged=False):
+        """Recompute the diff and notify the clients, unless ``skip_unchanged``
+        and it is the same as the last one sent"""
+        diff_data = self.differ.get_diff()
+        if skip_unchanged and diff_data == self.last_diff:
+            return
+        self.last_diff = diff_data
+        # Only lines that changed are re-indexed
+        self.differ.update_search_index()
+        if self.shared_state is not None:
+            # Publish before notifying, so web nodes can serve what clients fetch next
+            self.shared_state.publish(self.differ, diff_data)
+        if self.history is not None:
+            # Keep the new version so the timeline can scrub back to it
+            for path, lines in self.differ.last_read.items():
+                if self.history.record(path, lines) is not None:
+                    self.emit('history_updated', {'path': path})
+        self.emit('update_diff', diff_data)
@@ -0,0 +1,28 @@
+// Splits a rendered diff table into its parts, off the main thread.
+//
+// The page hands over every diff_html it receives. Back come the table's
+// head (everything before the first tbody), its tail, and each tbody as its
+// opening tag plus one HTML string per row, so the page can compare them with
+// what it shows and patch only what changed, a few rows per animation frame.
+// HTML that isn't a diff table (e.g. "files are identical") comes back whole.
+
+const TBODY = /(<tbody[^>]*>)([\s\S]*?)<\/tbody>/g;
+const ROW = /<tr[\s\S]*?<\/tr>/g;
+
+function splitTable(html) {
+    const first = html.indexOf('<tbody');
+    if (first < 0) {
+        return { whole: html };
+    }
+    const last = html.lastIndexOf('</tbody>') + '</tbody>'.length;
+    const bodies = [];
+    for (const [, open, content] of html.slice(first, last).matchAll(TBODY)) {
+        bodies.push({ open, rows: content.match(ROW) || [] });
+    }
+    return { head: html.slice(0, first), tail: html.slice(last), bodies };
+}
+
+self.onmessage = (event) => {
+    const { id, html } = event.data;
+    self.postMessage({ id, ...splitTable(html) });
+};
@@ -7,6 +7,10 @@ function formatBytes(bytes) {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 }
 
+// In daemon mode each diff session has its own URL prefix and socket.io room
+const pageConfig = window.LIVE_DIFFER || { base: '', session: '' };
+const apiBase = pageConfig.base;
+
 // Socket.io connection and event handling
 const socket = io();
 const statusIndicator = document.querySelector('.status-indicator');
@@ -17,6 +21,24 @@ socket.on('connect', () => {
     statusIndicator.classList.remove('disconnected');
     statusIndicator.classList.add('connected');
     statusText.textContent = 'Connected';
+    if (pageConfig.session) {
+        socket.emit('join', { session: pageConfig.session });
+    }
+    if (document.hidden) {
+        socket.emit('pause_updates');
+    }
+});
+
+// The server holds only the latest update for a hidden tab and sends it
+// once the tab is visible again
+document.addEventListener('visibilitychange', () => {
+    socket.emit(document.hidden ? 'pause_updates' : 'resume_updates');
+});
+
+socket.on('session_closed', () => {
+    statusIndicator.classList.remove('connected');
+    statusIndicator.classList.add('disconnected');
+    statusText.textContent = 'Session closed';
 });
 
 socket.on('disconnect', () => {
@@ -26,7 +48,7 @@ socket.on('disconnect', () => {
     statusText.textContent = 'Disconnected';
 });
 
-socket.on('update_diff', (data) => {
+socket.on('update_diff', (data, ack) => {
     console.log('Received diff update');  // Debug log
     
     // Update file 1 info
@@ -41,10 +63,535 @@ socket.on('update_diff', (data) => {
     document.getElementById('file2-modified').textContent = data.file2_info.modified_time;
     document.getElementById('file2-size').textContent = formatBytes(data.file2_info.size);
     
-    // Update diff content
-    document.getElementById('diff-view').innerHTML = data.diff_html;
+    // Update diff content, unless the user is looking at a past version
+    latestDiffHtml = data.diff_html;
+    const shown = historyState.scrubbing ? Promise.resolve() : renderDiff(data.diff_html);
+    shown.then(() => {
+        // Row numbers of earlier matches no longer apply
+        if (searchState.query) {
+            runSearch();
+        }
+        // The server sends the next update only once this one is on screen
+        if (typeof ack === 'function') {
+            ack(data.seq);
+        }
+    });
+});
+
+// Diff rendering. A worker splits every diff table into rows; the page then
+// patches only the rows that changed, or builds changed row groups off-screen
+// and swaps them in, a frame's budget of work at a time. Large updates so
+// never block scrolling, input or the socket.io heartbeat.
+const FRAME_BUDGET_MS = 8;
+const ROWS_PER_STEP = 200;
+const workerUrl = document.currentScript
+    ? document.currentScript.src.replace(/main\.js(\?.*)?$/, 'diff-worker.js')
+    : null;
+
+const diffRenderer = {
+    worker: null,
+    nextId: 0,
+    requests: new Map(),
+    // What the page shows: { head, tail, table, bodies: [{ open, rows, element }] }
+    shown: null,
+    generation: 0,
+    queue: [],
+    frame: null,
+    scroll: null,
+    selection: null,
+    waiting: []
+};
+
+function splitDiff(html) {
+    if (diffRenderer.worker === null) {
+        try {
+            diffRenderer.worker = new Worker(workerUrl);
+            diffRenderer.worker.onmessage = (event) => {
+                const request = diffRenderer.requests.get(event.data.id);
+                diffRenderer.requests.delete(event.data.id);
+                if (request) request.resolve(event.data);
+            };
+            diffRenderer.worker.onerror = (error) => {
+                // Fall back to rendering on the main thread
+                console.error('Diff worker failed', error);
+                diffRenderer.worker = false;
+                diffRenderer.requests.forEach((request) => request.resolve({ whole: request.html }));
+                diffRenderer.requests.clear();
+            };
+        } catch (error) {
+            diffRenderer.worker = false;
+        }
+    }
+    if (!diffRenderer.worker) {
+        return Promise.resolve({ whole: html });
+    }
+    return new Promise((resolve) => {
+        const id = ++diffRenderer.nextId;
+        diffRenderer.requests.set(id, { resolve, html });
+        diffRenderer.worker.postMessage({ id, html });
+    });
+}
+
+function renderDiff(html) {
+    const generation = ++diffRenderer.generation;
+    return splitDiff(html).then((parts) => {
+        // A newer render has started since; it will show the newer version
+        if (generation !== diffRenderer.generation) return;
+        return new Promise((resolve) => {
+            planRender(parts);
+            diffRenderer.waiting.push(resolve);
+            if (diffRenderer.frame === null) {
+                diffRenderer.frame = requestAnimationFrame(pumpRender);
+            }
+        });
+    });
+}
+
+function parseFragment(html, selector) {
+    const template = document.createElement('template');
+    template.innerHTML = html;
+    return template.content.querySelector(selector);
+}
+
+function parseRows(rows) {
+    return Array.from(parseFragment(`<table><tbody>${rows.join('')}</tbody></table>`, 'tbody').rows);
+}
+
+function adoptShownDiff(view, parts) {
+    // The page as served: rows are unknown, so every group is rebuilt once
+    const table = view.querySelector('.diff-table');
+    const head = parseFragment(parts.head + parts.tail, 'table');
+    if (!table || !head || !table.tHead || !head.tHead
+            || table.tHead.textContent !== head.tHead.textContent) {
+        return null;
+    }
+    const bodies = Array.from(table.tBodies)
+        .filter((tbody) => !tbody.classList.contains('fetched-rows'))
+        .map((element) => ({ open: null, rows: [], element }));
+    return { head: parts.head, tail: parts.tail, table, bodies };
+}
+
+function planBody(steps, body, build) {
+    // Rows go into a detached group, which replaces the shown one when complete
+    const group = { element: null };
+    steps.push(() => {
+        group.element = parseFragment(`<table>${body.open}</tbody></table>`, 'tbody');
+    });
+    for (let start = 0; start < body.rows.length; start += ROWS_PER_STEP) {
+        const rows = body.rows.slice(start, start + ROWS_PER_STEP);
+        steps.push(() => group.element.append(...parseRows(rows)));
+    }
+    steps.push(() => build(group.element));
+}
+
+function planRender(parts) {
+    const view = document.getElementById('diff-view');
+    const steps = [];
+    diffRenderer.scroll = { top: view.scrollTop, left: view.scrollLeft };
+    diffRenderer.selection = diffRenderer.selection || saveSelection(view);
+    if (parts.whole !== undefined) {
+        steps.push(() => {
+            view.innerHTML = parts.whole;
+            diffRenderer.shown = null;
+        });
+        diffRenderer.queue = steps;
+        return;
+    }
+    // Rows fetched around search matches belong to the previous version
+    steps.push(() => view.querySelectorAll('tbody.fetched-rows').forEach((tbody) => tbody.remove()));
+    let shown = diffRenderer.shown;
+    if (shown === null || !view.contains(shown.table)) {
+        shown = diffRenderer.shown = adoptShownDiff(view, parts);
+    }
+    if (shown === null || shown.head !== parts.head || shown.tail !== parts.tail) {
+        // A different table: build all of it off-screen, then swap it in
+        const next = { head: parts.head, tail: parts.tail, table: null, bodies: [] };
+        steps.push(() => {
+            next.table = parseFragment(parts.head + parts.tail, 'table');
+        });
+        parts.bodies.forEach((body) => {
+            planBody(steps, body, (element) => {
+                next.table.appendChild(element);
+                next.bodies.push({ open: body.open, rows: body.rows, element });
+            });
+        });
+        steps.push(() => {
+            view.replaceChildren(next.table);
+            diffRenderer.shown = next;
+        });
+        diffRenderer.queue = steps;
+        return;
+    }
+    parts.bodies.forEach((body, b) => {
+        const old = shown.bodies[b];
+        if (old && old.open === body.open && old.rows.length === body.rows.length) {
+            body.rows.forEach((row, r) => {
+                if (row === old.rows[r]) return;
+                steps.push(() => {
+                    const [element] = parseRows([row]);
+                    shown.bodies[b].element.rows[r].replaceWith(element);
+                    shown.bodies[b].rows[r] = row;
+                });
+            });
+            return;
+        }
+        planBody(steps, body, (element) => {
+            if (shown.bodies[b]) {
+                shown.bodies[b].element.replaceWith(element);
+            } else {
+                shown.table.appendChild(element);
+            }
+            shown.bodies[b] = { open: body.open, rows: body.rows, element };
+        });
+    });
+    if (shown.bodies.length > parts.bodies.length) {
+        steps.push(() => {
+            shown.bodies.splice(parts.bodies.length).forEach((body) => body.element.remove());
+        });
+    }
+    diffRenderer.queue = steps;
+}
+
+function pumpRender() {
+    const view = document.getElementById('diff-view');
+    const scroll = diffRenderer.scroll;
+    // A user who scrolled during the render keeps their new position
+    if (scroll && scroll.applied && (view.scrollTop !== scroll.applied.top
+            || view.scrollLeft !== scroll.applied.left)) {
+        scroll.top = view.scrollTop;
+        scroll.left = view.scrollLeft;
+    }
+    const deadline = performance.now() + FRAME_BUDGET_MS;
+    while (diffRenderer.queue.length && performance.now() < deadline) {
+        diffRenderer.queue.shift()();
+    }
+    if (scroll) {
+        view.scrollTop = scroll.top;
+        view.scrollLeft = scroll.left;
+        scroll.applied = { top: view.scrollTop, left: view.scrollLeft };
+    }
+    if (diffRenderer.queue.length) {
+        diffRenderer.frame = requestAnimationFrame(pumpRender);
+        return;
+    }
+    diffRenderer.frame = null;
+    restoreSelection(view, diffRenderer.selection);
+    diffRenderer.selection = null;
+    diffRenderer.scroll = null;
+    const waiting = diffRenderer.waiting;
+    diffRenderer.waiting = [];
+    waiting.forEach((resolve) => resolve());
+}
+
+// Selections are kept as (row, cell, character offset), which survive the
+// rows around them being replaced
+function selectionPoint(node, offset) {
+    const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+    const cell = element && element.closest('td, th');
+    const row = cell && cell.parentElement;
+    const key = row && row.querySelector('[id]');
+    if (!key) return null;
+    const range = document.createRange();
+    range.selectNodeContents(cell);
+    range.setEnd(node, offset);
+    return { key: key.id, cell: cell.cellIndex, chars: range.toString().length };
+}
+
+function saveSelection(view) {
+    const selection = window.getSelection();
+    if (!selection.rangeCount || selection.isCollapsed) return null;
+    const range = selection.getRangeAt(0);
+    if (!view.contains(range.commonAncestorContainer)) return null;
+    const start = selectionPoint(range.startContainer, range.startOffset);
+    const end = selectionPoint(range.endContainer, range.endOffset);
+    return start && end ? { start, end } : null;
+}
+
+function locatePoint(point) {
+    const key = document.getElementById(point.key);
+    const cell = key && key.parentElement.cells[point.cell];
+    if (!cell) return null;
+    const walker = document.createTreeWalker(cell, NodeFilter.SHOW_TEXT);
+    let remaining = point.chars;
+    for (let text = walker.nextNode(); text; text = walker.nextNode()) {
+        if (remaining <= text.length) return [text, remaining];
+        remaining -= text.length;
+    }
+    return [cell, cell.childNodes.length];
+}
+
+function restoreSelection(view, saved) {
+    if (!saved) return;
+    const selection = window.getSelection();
+    // Still there if none of its rows were replaced
+    if (selection.rangeCount && !selection.isCollapsed
+            && view.contains(selection.getRangeAt(0).commonAncestorContainer)) {
+        return;
+    }
+    const start = locatePoint(saved.start);
+    const end = locatePoint(saved.end);
+    if (!start || !end) return;
+    const range = document.createRange();
+    range.setStart(...start);
+    range.setEnd(...end);
+    selection.removeAllRanges();
+    selection.addRange(range);
+}
+
+// Version history timeline
+let latestDiffHtml = null;
+const historyState = {
+    scrubbing: false,
+    files: {},
+    timer: null
+};
+
+function selectedHistoryVersions() {
+    const path = document.getElementById('history-file').value;
+    const versions = historyState.files[path] || [];
+    const from = versions[document.getElementById('history-from').value];
+    const to = versions[document.getElementById('history-to').value];
+    return { path, from, to };
+}
+
+function updateHistoryLabels() {
+    const { from, to } = selectedHistoryVersions();
+    const describe = (version) => version
+        ? `v${version.id} (${new Date(version.timestamp * 1000).toLocaleTimeString()})`
+        : '-';
+    document.getElementById('history-from-label').textContent = describe(from);
+    document.getElementById('history-to-label').textContent = describe(to);
+}
+
+function refreshHistorySliders() {
+    const path = document.getElementById('history-file').value;
+    const versions = historyState.files[path] || [];
+    const max = Math.max(versions.length - 1, 0);
+    ['history-from', 'history-to'].forEach((id) => {
+        const slider = document.getElementById(id);
+        const atEnd = Number(slider.value) >= Number(slider.max);
+        slider.max = max;
+        // Sliders parked on the newest version follow new versions as they arrive
+        if (!historyState.scrubbing || atEnd) {
+            slider.value = id === 'history-from' ? Math.max(max - 1, 0) : max;
+        }
+    });
+    updateHistoryLabels();
+}
+
+function loadHistory() {
+    return fetch(`${apiBase}/api/history`)
+        .then((response) => response.ok ? response.json() : { files: {} })
+        .then((data) => {
+            historyState.files = data.files || {};
+            const select = document.getElementById('history-file');
+            const current = select.value;
+            select.innerHTML = '';
+            Object.keys(historyState.files).forEach((path) => {
+                const option = document.createElement('option');
+                option.value = path;
+                option.textContent = path.split(/[\\/]/).pop();
+                select.appendChild(option);
+            });
+            if (current && historyState.files[current]) {
+                select.value = current;
+            }
+            document.getElementById('history-card').style.display =
+                Object.keys(historyState.files).length ? '' : 'none';
+            refreshHistorySliders();
+        })
+        .catch((error) => console.error('Failed to load history', error));
+}
+
+function showHistoryDiff() {
+    const { path, from, to } = selectedHistoryVersions();
+    if (!from || !to) return;
+    const params = new URLSearchParams({ path, from: from.id, to: to.id });
+    fetch(`${apiBase}/api/history/diff?${params}`)
+        .then((response) => response.json())
+        .then((data) => {
+            if (historyState.scrubbing && data.diff_html) {
+                renderDiff(data.diff_html);
+            }
+        })
+        .catch((error) => console.error('Failed to load history diff', error));
+}
+
+function setScrubbing(scrubbing) {
+    historyState.scrubbing = scrubbing;
+    document.getElementById('history-live').classList.toggle('active', !scrubbing);
+    if (!scrubbing && latestDiffHtml !== null) {
+        renderDiff(latestDiffHtml);
+    }
+}
+
+function initializeHistory() {
+    const onSliderInput = () => {
+        setScrubbing(true);
+        updateHistoryLabels();
+        // Only fetch once the slider settles
+        clearTimeout(historyState.timer);
+        historyState.timer = setTimeout(showHistoryDiff, 150);
+    };
+    document.getElementById('history-from').addEventListener('input', onSliderInput);
+    document.getElementById('history-to').addEventListener('input', onSliderInput);
+    document.getElementById('history-file').addEventListener('change', () => {
+        refreshHistorySliders();
+        if (historyState.scrubbing) showHistoryDiff();
+    });
+    document.getElementById('history-live').addEventListener('click', () => {
+        setScrubbing(false);
+        refreshHistorySliders();
+    });
+    latestDiffHtml = document.getElementById('diff-view').innerHTML;
+    loadHistory();
+}
+
+socket.on('history_updated', () => {
+    loadHistory();
 });
 
+// Indexed search; matches outside the rendered hunks are fetched on demand
+const searchState = {
+    query: '',
+    total: 0,
+    matches: [],
+    current: -1,
+    pageSize: 100,
+    timer: null
+};
+
+function updateSearchCount() {
+    const count = document.getElementById('search-count');
+    if (!searchState.query) {
+        count.textContent = '';
+    } else if (!searchState.total) {
+        count.textContent = 'No matches';
+    } else {
+        const current = searchState.current >= 0 ? searchState.current + 1 : '-';
+        count.textContent = `${current} / ${searchState.total}`;
+    }
+}
+
+function fetchSearchPage(offset) {
+    const query = searchState.query;
+    const params = new URLSearchParams({ q: query, offset, limit: searchState.pageSize });
+    return fetch(`${apiBase}/api/search?${params}`)
+        .then((response) => response.ok ? response.json() : { total: 0, matches: [] })
+        .then((data) => {
+            if (query !== searchState.query) return;
+            searchState.total = data.total;
+            data.matches.forEach((match, k) => {
+                searchState.matches[offset + k] = match;
+            });
+        });
+}
+
+function runSearch() {
+    searchState.query = document.getElementById('search-input').value;
+    searchState.total = 0;
+    searchState.matches = [];
+    searchState.current = -1;
+    if (!searchState.query) {
+        updateSearchCount();
+        return Promise.resolve();
+    }
+    return fetchSearchPage(0)
+        .then(updateSearchCount)
+        .catch((error) => console.error('Search failed', error));
+}
+
+function rowRange(tbody) {
+    const range = tbody.dataset.rows;
+    return range ? range.split('-').map(Number) : null;
+}
+
+function fetchRowsAround(row) {
+    const table = document.querySelector('#diff-view .diff-table');
+    if (!table) return Promise.resolve();
+    // Stop at row ranges that are already rendered so anchors stay unique
+    let start = Math.max(row - 5, 0);
+    let stop = row + 6;
+    const tbodies = Array.from(table.tBodies);
+    tbodies.forEach((tbody) => {
+        const range = rowRange(tbody);
+        if (!range) return;
+        if (range[1] <= row) start = Math.max(start, range[1]);
+        if (range[0] > row) stop = Math.min(stop, range[0]);
+    });
+    return fetch(`${apiBase}/api/rows?start=${start}&stop=${stop}`)
+        .then((response) => response.json())
+        .then((data) => {
+            if (!data.html) return;
+            const template = document.createElement('template');
+            template.innerHTML = `<table>${data.html}</table>`;
+            const tbody = template.content.querySelector('tbody');
+            tbody.classList.add('fetched-rows');
+            const next = tbodies.find((other) => {
+                const range = rowRange(other);
+                return range && range[0] >= data.stop;
+            });
+            table.insertBefore(tbody, next || null);
+        });
+}
+
+function showMatch(index) {
+    if (!searchState.total) return;
+    index = (index + searchState.total) % searchState.total;
+    if (historyState.scrubbing) {
+        setScrubbing(false);
+    }
+    const pageStart = index - (index % searchState.pageSize);
+    const loaded = searchState.matches[index]
+        ? Promise.resolve()
+        : fetchSearchPage(pageStart);
+    loaded
+        .then(() => {
+            const match = searchState.matches[index];
+            if (!match) return;
+            searchState.current = index;
+            updateSearchCount();
+            const rendered = document.getElementById(match.anchor);
+            return (rendered ? Promise.resolve() : fetchRowsAround(match.row)).then(() => {
+                document.querySelectorAll('.search-hit').forEach((cell) => cell.classList.remove('search-hit'));
+                const anchor = document.getElementById(match.anchor);
+                if (!anchor) return;
+                const cell = anchor.nextElementSibling || anchor;
+                cell.classList.add('search-hit');
+                cell.scrollIntoView({ block: 'center' });
+            });
+        })
+        .catch((error) => console.error('Failed to show match', error));
+}
+
+function stepMatch(step) {
+    // From no selection, step to the first or last match
+    if (searchState.current < 0) {
+        showMatch(step > 0 ? 0 : -1);
+    } else {
+        showMatch(searchState.current + step);
+    }
+}
+
+function initializeSearch() {
+    const input = document.getElementById('search-input');
+    input.addEventListener('input', () => {
+        clearTimeout(searchState.timer);
+        searchState.timer = setTimeout(runSearch, 200);
+    });
+    input.addEventListener('keydown', (event) => {
+        if (event.key !== 'Enter') return;
+        event.preventDefault();
+        clearTimeout(searchState.timer);
+        const step = event.shiftKey ? -1 : 1;
+        // Search first if the query changed since the last run
+        const ready = input.value === searchState.query ? Promise.resolve() : runSearch();
+        ready.then(() => stepMatch(step));
+    });
+    document.getElementById('search-next').addEventListener('click', () => stepMatch(1));
+    document.getElementById('search-prev').addEventListener('click', () => stepMatch(-1));
+}
+
 // Theme switching functionality
 function initializeTheme() {
     const themeSwitch = document.getElementById('theme-switch');
@@ -65,5 +612,7 @@ function initializeTheme() {
     });
 }
 
-// Initialize theme switcher
+// Initialize theme switcher, history timeline and search
 document.addEventListener('DOMContentLoaded', initializeTheme);
+document.addEventListener('DOMContentLoaded', initializeHistory);
+document.addEventListener('DOMContentLoaded', initializeSearch);
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Benchmark prefix/suffix trimming on large files with a small edit.
+
+Builds two versions of an N-line file that differ by a few lines in the
+middle, then times:
+
+- the affix scan on its own (``common_affixes``), and, when NumPy is
+  installed, the same answer from bulk uint64 line hashes compared as
+  vectors, for reference;
+- line matching with trimming (``FileDiffer.match_lines``) against the
+  untrimmed matcher;
+- the whole row model.
+
+    python scripts/bench_trim.py --lines 1000000 --repeat 3
+"""
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from live_differ.modules.differ import FileDiffer  # noqa: E402
+from live_differ.modules.normalize import get_normalizer  # noqa: E402
+from live_differ.modules.trim import common_affixes  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def make_files(count: int, edits: int, seed: int):
+    rng = random.Random(seed)
+    file1 = [f"{i:08d} {rng.getrandbits(64):016x} some typical log text\n" for i in range(count)]
+    # Built separately so equal lines are distinct objects, as after re-reading
+    file2 = [line[:-1] + "\n" for line in file1]
+    middle = count // 2
+    for k in range(edits):
+        file2[middle + k * 7] = f"edited line {k}\n"
+    file2.insert(middle - 100, "inserted line\n")
+    return file1, file2
+
+
+def numpy_affixes(file1, file2):
+    """Affixes from bulk-hashed lines (str hashes gathered into uint64 arrays)"""
+    h1 = np.fromiter(map(hash, file1), dtype=np.int64, count=len(file1)).view(np.uint64)
+    h2 = np.fromiter(map(hash, file2), dtype=np.int64, count=len(file2)).view(np.uint64)
+    limit = min(len(h1), len(h2))
+    differ = np.flatnonzero(h1[:limit] != h2[:limit])
+    prefix = int(differ[0]) if len(differ) else limit
+    limit -= prefix
+    differ = np.flatnonzero(h1[len(h1) - limit:][::-1] != h2[len(h2) - limit:][::-1])
+    suffix = int(differ[0]) if len(differ) else limit
+    # Equal hashes still need confirming, as the kernel would have to
+    assert file1[:prefix] == file2[:prefix]
+    return prefix, suffix
+
+
+def untrimmed_opcodes(file1, file2):
+    normalizer = get_normalizer(None)
+    return difflib.SequenceMatcher(None, normalizer.ids(file1), normalizer.ids(file2)).get_opcodes()
+
+
+def best_of(repeat: int, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        # Fresh ID cache each run, as for files that just changed
+        get_normalizer(None).line_ids.clear()
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--edits', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    file1, file2 = make_files(args.lines, args.edits, args.seed)
+    print(f"{args.lines:,} lines, {args.edits} edits and 1 insertion in the middle")
+
+    elapsed, affixes = best_of(args.repeat, common_affixes, file1, file2)
+    print(f"  affix scan (block compare)  {elapsed * 1000:9.1f} ms  prefix/suffix={affixes}")
+    if np is not None:
+        elapsed, vector = best_of(args.repeat, numpy_affixes, file1, file2)
+        assert vector == affixes
+        print(f"  affix scan (numpy hashes)   {elapsed * 1000:9.1f} ms")
+    else:
+        print("  affix scan (numpy hashes)   skipped, numpy is not installed")
+
+    untrimmed, expected = best_of(args.repeat, untrimmed_opcodes, file1, file2)
+    trimmed, opcodes = best_of(args.repeat, FileDiffer.match_lines, file1, file2)
+    print(f"  match_lines untrimmed       {untrimmed * 1000:9.1f} ms  ({len(expected)} opcodes)")
+    print(f"  match_lines trimmed         {trimmed * 1000:9.1f} ms  ({len(opcodes)} opcodes)"
+          f"  {untrimmed / trimmed:.0f}x")
+
+    elapsed, model = best_of(args.repeat, FileDiffer.build_row_model, file1, file2, None, opcodes)
+    print(f"  build_row_model             {elapsed * 1000:9.1f} ms  ({len(model.rows):,} rows)")
+
+
+if __name__ == '__main__':
+    main()
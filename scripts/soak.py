@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""End-to-end latency soak test: from a file write to the update on screen.
+
+Starts a real live-differ server on two generated files, connects N
+socket.io clients over engine.io long-polling (acknowledging each update
+like the browser does), and rewrites the second file at a fixed rate. Every
+write stamps a sequence number into the file, so each ``update_diff`` a
+client receives can be matched to the write it shows.
+
+Reported, as one JSON object (appended as a line to ``--output``):
+
+- latency from the start of a write to receipt of the update showing it,
+  p50/p95/p99/max over all clients;
+- per-client update accounting: ``received``, ``duplicates`` (the same
+  write shown twice), ``out_of_order`` (an older write after a newer one),
+  ``superseded`` (writes never shown because a newer one arrived first; the
+  server coalesces by design) and ``missed_final`` (clients that never saw
+  the last write, which is a real loss);
+- server RSS and CPU, sampled from /proc every second.
+
+    python scripts/soak.py --clients 20 --rate 2 --lines 20000 --duration 600 \\
+        --output soak.jsonl -- --highlight
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+LINE_WIDTH = 60
+# Every write replaces the first line, which is always in the first hunk
+TOKEN = re.compile(r'soak (\d{8})')
+TAG = re.compile(r'<[^>]+>')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def base_line(i: int) -> str:
+    return f"line {i:08d} ".ljust(LINE_WIDTH - 1, 'x') + "\n"
+
+
+def version_text(lines: int, seq: int, edits: int, rng: random.Random) -> str:
+    """The second file for write ``seq``: same size every time, so writing in
+    place never needs a truncate (a second, separately debounced change)"""
+    content = [base_line(i) for i in range(lines)]
+    content[0] = f"soak {seq:08d} ".ljust(LINE_WIDTH - 1, '-') + "\n"
+    for k in range(edits):
+        i = rng.randrange(1, lines)
+        content[i] = f"soak {seq:08d} edit {k:06d} ".ljust(LINE_WIDTH - 1, '-') + "\n"
+    return ''.join(content)
+
+
+class SoakClient:
+    """A socket.io client over engine.io long-polling that records updates."""
+
+    def __init__(self, port: int):
+        self.base = f"http://127.0.0.1:{port}/socket.io/?EIO=4&transport=polling"
+        handshake = self._request(self.base)
+        self.sid = json.loads(handshake[1:])['sid']
+        self.url = f"{self.base}&sid={self.sid}"
+        self._request(self.url, b'40')
+        # (receipt time, write sequence shown, delivery seq)
+        self.updates = []
+        self.errors = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def _request(self, url: str, data: Optional[bytes] = None) -> str:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=60) as response:
+            return response.read().decode('utf-8')
+
+    def _poll(self):
+        while not self.closed:
+            try:
+                payload = self._request(self.url)
+            except OSError:
+                if self.closed:
+                    return
+                self.errors += 1
+                time.sleep(0.5)
+                continue
+            received = time.monotonic()
+            for packet in payload.split('\x1e'):
+                if packet == '2':
+                    self._request(self.url, b'3')
+                elif packet.startswith('42'):
+                    body = packet[2:]
+                    ack_id = body[:len(body) - len(body.lstrip('0123456789'))]
+                    name, data = json.loads(body[len(ack_id):])
+                    if name != 'update_diff':
+                        continue
+                    shown = TOKEN.findall(TAG.sub('', data.get('diff_html', '')))
+                    self.updates.append((received, max(map(int, shown)) if shown else None, data.get('seq')))
+                    if ack_id:
+                        # Acknowledge, or the server holds back every later update
+                        self._request(self.url, f"43{ack_id}[]".encode())
+
+    def close(self):
+        self.closed = True
+        try:
+            self._request(self.url, b'41')
+        except OSError:
+            pass
+
+
+class ProcessSampler:
+    """Samples a process's RSS and CPU from /proc (Linux only)."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # Fields after the command name, which may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f"/proc/{self.pid}/statm") as f:
+                resident = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.ticks
+        return cpu_seconds, resident * self.page_size
+
+    def _run(self):
+        previous = None
+        while not self._stop.is_set():
+            now = time.monotonic()
+            reading = self._read()
+            if reading is None:
+                return
+            cpu_seconds, rss = reading
+            cpu_percent = None
+            if previous is not None:
+                cpu_percent = 100 * (cpu_seconds - previous[1]) / max(now - previous[0], 1e-9)
+            self.samples.append({'t': round(now, 3), 'rss_mb': round(rss / 2**20, 2),
+                                 'cpu_percent': None if cpu_percent is None else round(cpu_percent, 1)})
+            previous = (now, cpu_seconds)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
+
+    def summary(self, keep_samples: bool) -> Dict:
+        rss = [s['rss_mb'] for s in self.samples]
+        cpu = [s['cpu_percent'] for s in self.samples if s['cpu_percent'] is not None]
+        result = {
+            'rss_mb': {'start': rss[0], 'max': max(rss), 'end': rss[-1]} if rss else None,
+            'cpu_percent': {'mean': round(sum(cpu) / len(cpu), 1), 'max': max(cpu)} if cpu else None,
+        }
+        if keep_samples:
+            result['samples'] = self.samples
+        return result
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def account(client: SoakClient, writes: Dict[int, float], last_seq: int):
+    """Latencies and update accounting of one client"""
+    latencies = []
+    seen = set()
+    newest = 0
+    counts = {'received': 0, 'duplicates': 0, 'out_of_order': 0, 'superseded': 0, 'missed_final': 0}
+    for received, seq, _ in client.updates:
+        counts['received'] += 1
+        if seq is None or seq not in writes:
+            continue
+        if seq in seen:
+            counts['duplicates'] += 1
+            continue
+        if seq < newest:
+            counts['out_of_order'] += 1
+        seen.add(seq)
+        newest = max(newest, seq)
+        latencies.append((received - writes[seq]) * 1000)
+    counts['superseded'] = len([seq for seq in writes if seq <= newest and seq not in seen])
+    counts['missed_final'] = int(last_seq not in seen)
+    return latencies, counts
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def run(args) -> Dict:
+    workdir = Path(tempfile.mkdtemp(prefix='live-differ-soak-'))
+    file1, file2 = workdir / 'reference.txt', workdir / 'watched.txt'
+    file1.write_text(''.join(base_line(i) for i in range(args.lines)))
+    rng = random.Random(args.seed)
+    file2.write_text(version_text(args.lines, 0, args.edits, rng))
+    port = args.port or free_port()
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+    server_log = open(workdir / 'server.log', 'w')
+    # Started in the work directory, so the server's logs/ lands there too
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'live_differ', str(file1), str(file2),
+         '--port', str(port), '--history', '0', *args.server_args],
+        stdout=server_log, stderr=subprocess.STDOUT, env=env, cwd=workdir
+    )
+    sampler = ProcessSampler(server.pid)
+    clients = []
+    writes: Dict[int, float] = {}
+    try:
+        def serving():
+            try:
+                return urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=2).status == 200
+            except OSError:
+                return False
+
+        if not wait_for(serving, 30):
+            raise RuntimeError(f"Server did not start; see {workdir / 'server.log'}")
+        sampler.start()
+        clients = [SoakClient(port) for _ in range(args.clients)]
+        # Let every connection register with the dispatcher before writing
+        time.sleep(args.warmup)
+
+        interval = 1.0 / args.rate
+        started = time.monotonic()
+        seq = 0
+        while time.monotonic() - started < args.duration:
+            seq += 1
+            text = version_text(args.lines, seq, args.edits, rng)
+            due = started + (seq - 1) * interval
+            time.sleep(max(due - time.monotonic(), 0))
+            writes[seq] = time.monotonic()
+            # Overwrite in place: same size, so no truncate event
+            with open(file2, 'r+') as f:
+                f.write(text)
+        # Give the last write time to reach everyone
+        wait_for(lambda: all(any(s == seq for _, s, _ in c.updates) for c in clients), args.grace)
+        elapsed = time.monotonic() - started
+    finally:
+        for client in clients:
+            client.close()
+        sampler.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        server_log.close()
+
+    def rounded(value):
+        return None if value is None else round(value, 2)
+
+    latencies = []
+    totals = {'received': 0, 'duplicates': 0, 'out_of_order': 0, 'superseded': 0, 'missed_final': 0}
+    per_client = []
+    for client in clients:
+        client_latencies, counts = account(client, writes, seq)
+        latencies.extend(client_latencies)
+        for key, value in counts.items():
+            totals[key] += value
+        per_client.append({**counts, 'poll_errors': client.errors,
+                           'p50_ms': rounded(percentile(client_latencies, 0.50))})
+
+    return {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'clients': args.clients, 'rate': args.rate, 'lines': args.lines, 'edits': args.edits,
+            'duration': args.duration, 'seed': args.seed, 'server_args': args.server_args,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'writes': len(writes),
+        'latency_ms': {
+            'count': len(latencies),
+            'p50': rounded(percentile(latencies, 0.50)),
+            'p95': rounded(percentile(latencies, 0.95)),
+            'p99': rounded(percentile(latencies, 0.99)),
+            'max': rounded(max(latencies)) if latencies else None,
+            'mean': rounded(sum(latencies) / len(latencies)) if latencies else None,
+        },
+        'updates': totals,
+        'clients': per_client if args.per_client else None,
+        'server': sampler.summary(args.samples),
+        'workdir': str(workdir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog="Arguments after -- are passed to the live-differ server."
+    )
+    parser.add_argument('--clients', type=int, default=10, help="socket.io clients to connect")
+    parser.add_argument('--rate', type=float, default=1.0, help="writes per second")
+    parser.add_argument('--lines', type=int, default=1000, help="lines in each file")
+    parser.add_argument('--edits', type=int, default=5, help="lines changed per write, besides the first")
+    parser.add_argument('--duration', type=float, default=60, help="seconds of writing")
+    parser.add_argument('--warmup', type=float, default=1.0, help="seconds between connecting and writing")
+    parser.add_argument('--grace', type=float, default=10.0, help="seconds to wait for the last update")
+    parser.add_argument('--port', type=int, default=0, help="server port (default: a free one)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="append the result as a JSON line to this file")
+    parser.add_argument('--per-client', action='store_true', help="include per-client counts")
+    parser.add_argument('--samples', action='store_true', help="include every RSS/CPU sample")
+    parser.add_argument('server_args', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    result = run(args)
+    line = json.dumps(result)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(line + "\n")
+    print(line)
+    latency, updates = result['latency_ms'], result['updates']
+    print(
+        f"{result['writes']} writes, {updates['received']} updates to {args.clients} clients: "
+        f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms; "
+        f"{updates['duplicates']} duplicate, {updates['superseded']} superseded, "
+        f"{updates['missed_final']} clients missed the last write",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,36 @@
 import os
+import shutil
+import sys
+import tempfile
 import pytest
 from pathlib import Path
 
+# live_differ.core sets up logging when imported, so the log directory has to
+# be chosen before anything imports it: keep the test runs' logs out of the repo
+_log_dir = tempfile.mkdtemp(prefix='live-differ-logs-')
+os.environ['LIVE_DIFFER_LOG_DIR'] = _log_dir
+
+# Imported so their caches exist before the first test
+from live_differ.modules import differ, structure  # noqa: F401
+from live_differ.modules.singleflight import SingleFlight
+
+@pytest.fixture(scope='session', autouse=True)
+def log_dir():
+    """The directory the test session logs to, removed when it ends."""
+    yield _log_dir
+    shutil.rmtree(_log_dir, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def forget_recent_diffs():
+    """Start each test without the results kept by earlier ones: tables, row
+    models, stats, byte diffs, parsed documents and any other module-level
+    SingleFlight."""
+    for name, module in list(sys.modules.items()):
+        if name.startswith('live_differ.') and module is not None:
+            for value in vars(module).values():
+                if isinstance(value, SingleFlight):
+                    value.forget()
+
 @pytest.fixture
 def sample_files(tmp_path):
     """Create sample files for testing."""
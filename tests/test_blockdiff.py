@@ -0,0 +1,109 @@
+import random
+import zlib
+
+from live_differ.modules.blockdiff import (
+    BLOCK_SIZE, MAX_REGIONS, byte_stats, diff_files, render_hex, roll_adler32
+)
+from live_differ.modules.differ import FileDiffer
+
+
+def random_bytes(size, seed=1):
+    return random.Random(seed).getrandbits(8 * size).to_bytes(size, 'little')
+
+
+def write_pair(tmp_path, data1, data2):
+    file1 = tmp_path / 'a.bin'
+    file2 = tmp_path / 'b.bin'
+    file1.write_bytes(data1)
+    file2.write_bytes(data2)
+    return str(file1), str(file2)
+
+
+def rebuild(data1, data2, opcodes):
+    out = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        out.append(data1[i1:i2] if tag == 'equal' else data2[j1:j2])
+    return b''.join(out)
+
+
+def changed(opcodes):
+    return [opcode for opcode in opcodes if opcode[0] != 'equal']
+
+
+def test_rolled_checksum_matches_zlib():
+    data = random_bytes(300)
+    length = 64
+    checksum = zlib.adler32(data[:length])
+    for start in range(1, len(data) - length):
+        checksum = roll_adler32(checksum, data[start - 1], data[start + length - 1], length)
+        assert checksum == zlib.adler32(data[start:start + length])
+
+
+def test_identical_files(tmp_path):
+    data = random_bytes(10 * BLOCK_SIZE)
+    assert changed(diff_files(*write_pair(tmp_path, data, data))) == []
+
+
+def test_insertions_are_found_exactly(tmp_path):
+    data1 = random_bytes(64 * BLOCK_SIZE)
+    data2 = data1[:5000] + b'inserted' + data1[5000:200_000] + b'X' * 100 + data1[200_000:]
+    opcodes = diff_files(*write_pair(tmp_path, data1, data2))
+    assert rebuild(data1, data2, opcodes) == data2
+    assert changed(opcodes) == [
+        ('insert', 5000, 5000, 5000, 5008),
+        ('insert', 200_000, 200_000, 200_008, 200_108),
+    ]
+
+
+def test_moved_and_rewritten_content(tmp_path):
+    data1 = random_bytes(40 * BLOCK_SIZE, seed=2)
+    blocks = [data1[n:n + BLOCK_SIZE] for n in range(0, len(data1), BLOCK_SIZE)]
+    data2 = b''.join(blocks[20:] + [random_bytes(3000, seed=3)] + blocks[:20])
+    opcodes = diff_files(*write_pair(tmp_path, data1, data2))
+    assert rebuild(data1, data2, opcodes) == data2
+    stats = byte_stats(opcodes, len(data1), len(data2))
+    # The moved half is reused rather than reported as changed
+    assert stats['added'] + stats['changed'] <= len(data1) // 2 + 3000
+    assert 0 < stats['similarity'] < 1
+
+
+def test_hex_view_shows_changed_regions(tmp_path):
+    data1 = bytes(range(256)) * 4
+    data2 = data1[:100] + b'\xff' + data1[101:]
+    path1, path2 = write_pair(tmp_path, data1, data2)
+    opcodes = diff_files(path1, path2)
+    assert changed(opcodes) == [('replace', 100, 101, 100, 101)]
+    html = render_hex(path1, path2, opcodes, 'a.bin', 'b.bin')
+    assert 'diff-binary' in html
+    assert '<span class="diff_chg">ff</span>' in html
+    assert '00000060' in html
+    # Far-away unchanged rows aren't shown
+    assert '00000300' not in html
+
+
+def test_many_regions_are_capped(tmp_path):
+    count = MAX_REGIONS + 20
+    data1 = bytearray(random_bytes(3 * count * BLOCK_SIZE, seed=4))
+    data2 = bytearray(data1)
+    # Edits in separate blocks, so each is narrowed to its own region
+    for n in range(count):
+        data2[(3 * n + 1) * BLOCK_SIZE + 7] ^= 0xff
+    path1, path2 = write_pair(tmp_path, bytes(data1), bytes(data2))
+    opcodes = diff_files(path1, path2)
+    assert len(changed(opcodes)) == count
+    html = render_hex(path1, path2, opcodes, 'a.bin', 'b.bin')
+    assert html.count('<tbody') == MAX_REGIONS + 1
+
+
+def test_binary_pair_in_file_differ(tmp_path):
+    data1 = random_bytes(20 * BLOCK_SIZE, seed=5)
+    data2 = data1[:30_000] + b'\x00patch\x00' + data1[30_000:]
+    differ = FileDiffer(*write_pair(tmp_path, b'\x00' + data1, b'\x00' + data2))
+    diff = differ.get_diff()
+    assert diff['binary'] and 'diff-binary' in diff['diff_html']
+    stats = differ.get_stats()
+    assert stats['binary']
+    assert (stats['added'], stats['removed'], stats['changed']) == (7, 0, 0)
+    assert stats['hashes']['file1'] != stats['hashes']['file2']
+    assert not stats['identical']
+
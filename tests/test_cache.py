@@ -0,0 +1,122 @@
+"""
+Tests for the cache module.
+"""
+import multiprocessing
+import os
+import pytest
+from unittest.mock import patch
+from live_differ.core import app
+from live_differ.modules.cache import DiffCache, content_hash, make_key
+from live_differ.modules import differ
+from live_differ.modules.differ import FileDiffer
+
+@pytest.fixture
+def temp_files(tmp_path):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    file1.write_text("Line 1\nLine 2\nLine 3\n")
+    file2.write_text("Line 1\nLine 2 modified\nLine 3\nLine 4\n")
+    return str(file1), str(file2)
+
+def restart():
+    """Drop what a process keeps in memory, leaving only the persistent cache"""
+    differ._tables.forget()
+    differ._row_models.forget()
+
+def test_make_key_depends_on_every_part():
+    key = make_key('html', file1='a', file2='b', options={'tabsize': 2})
+    assert key == make_key('html', file2='b', file1='a', options={'tabsize': 2})
+    assert key != make_key('opcodes', file1='a', file2='b', options={'tabsize': 2})
+    assert key != make_key('html', file1='a', file2='c', options={'tabsize': 2})
+    assert key != make_key('html', file1='a', file2='b', options={'tabsize': 4})
+
+def test_content_hash():
+    assert content_hash(["a\n", "b\n"]) == content_hash(["a\n", "b\n"])
+    assert content_hash(["a\n"]) != content_hash(["b\n"])
+    # Items without newlines (segments, document entries) can't run together
+    assert content_hash(["ab", "c"]) != content_hash(["a", "bc"])
+    assert content_hash(["a\n", "b\n"]) != content_hash(["a\nb\n"])
+
+def test_cache_roundtrip(tmp_path):
+    cache = DiffCache(str(tmp_path / "cache"))
+    assert cache.get("missing") is None
+    cache.put("key", {"diff_html": "<table></table>", "opcodes": [["equal", 0, 1, 0, 1]]})
+    assert cache.get("key") == {"diff_html": "<table></table>", "opcodes": [["equal", 0, 1, 0, 1]]}
+
+    # A second instance on the same directory sees the entry, as after a restart
+    assert DiffCache(str(tmp_path / "cache")).get("key")["diff_html"] == "<table></table>"
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DiffCache(str(tmp_path / "cache"), max_bytes=20_000)
+    # Random content so compression can't shrink entries below the limit
+    payloads = [{"diff_html": os.urandom(2500).hex()} for _ in range(10)]
+    for n, payload in enumerate(payloads):
+        cache.put(f"key{n}", payload)
+    assert cache.size() <= 20_000
+    assert cache.get("key0") is None
+    assert cache.get("key9") == payloads[9]
+
+def _write_entries(cache_dir, worker):
+    cache = DiffCache(cache_dir)
+    for n in range(50):
+        cache.put(f"w{worker}-{n}", {"value": n})
+        assert cache.get(f"w{worker}-{n}") == {"value": n}
+
+def test_cache_shared_between_processes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    DiffCache(cache_dir)
+    ctx = multiprocessing.get_context('spawn')
+    workers = [ctx.Process(target=_write_entries, args=(cache_dir, w)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    cache = DiffCache(cache_dir)
+    assert all(cache.get(f"w{w}-49") == {"value": 49} for w in range(3))
+
+def test_differ_uses_cache_after_restart(temp_files, tmp_path):
+    file1, file2 = temp_files
+    cache_dir = str(tmp_path / "cache")
+    first = FileDiffer(file1, file2, cache=DiffCache(cache_dir)).get_diff()
+    restart()
+
+    with patch.object(FileDiffer, 'make_diff_table') as mock_render:
+        warm = FileDiffer(file1, file2, cache=DiffCache(cache_dir)).get_diff()
+        mock_render.assert_not_called()
+    assert warm['diff_html'] == first['diff_html']
+
+def test_differ_cache_misses_on_change(temp_files, tmp_path):
+    file1, file2 = temp_files
+    cache = DiffCache(str(tmp_path / "cache"))
+    FileDiffer(file1, file2, cache=cache).get_diff()
+    with open(file2, 'w') as f:
+        f.write("Completely different\n")
+    diff = FileDiffer(file1, file2, cache=cache).get_diff()
+    assert "Completely" in diff['diff_html']
+
+def test_differ_caches_opcodes(temp_files, tmp_path):
+    file1, file2 = temp_files
+    cache = DiffCache(str(tmp_path / "cache"))
+    opcodes = FileDiffer(file1, file2, cache=cache).get_opcodes()
+    assert opcodes[0] == ('equal', 0, 1, 0, 1)
+    with patch('difflib.SequenceMatcher') as mock_matcher:
+        assert FileDiffer(file1, file2, cache=cache).get_opcodes() == opcodes
+        mock_matcher.assert_not_called()
+
+def test_index_served_from_warm_cache(temp_files, tmp_path):
+    file1, file2 = temp_files
+    cache_dir = str(tmp_path / "cache")
+    FileDiffer(file1, file2, cache=DiffCache(cache_dir)).get_diff()
+    restart()
+
+    app.config.update(FILE1=file1, FILE2=file2, DIFF_CACHE=DiffCache(cache_dir))
+    try:
+        with app.test_client() as client, \
+             patch.object(FileDiffer, 'make_diff_table') as mock_render:
+            response = client.get('/')
+            assert response.status_code == 200
+            assert b"modified" in response.data
+            mock_render.assert_not_called()
+    finally:
+        app.config['DIFF_CACHE'] = None
@@ -0,0 +1,164 @@
+"""
+Tests for the delivery module.
+"""
+import time
+import tracemalloc
+import pytest
+from live_differ.core import app, socketio
+from live_differ.modules.delivery import UpdateDispatcher
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, namespace='/', to=None, callback=None, ignore_queue=False):
+        self.sent.append({'event': event, 'data': data, 'to': to, 'callback': callback,
+                          'ignore_queue': ignore_queue})
+
+    def ack_last(self):
+        message = self.sent[-1]
+        message['callback'](message['data']['seq'])
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = UpdateDispatcher(FakeSocket())
+    dispatcher.connect("a")
+    return dispatcher
+
+def test_one_update_in_flight_and_latest_wins(dispatcher):
+    for version in range(5):
+        dispatcher.emit('update_diff', {'version': version}, namespace='/')
+    socket = dispatcher.socket
+    assert [m['data']['version'] for m in socket.sent] == [0]
+    socket.ack_last()
+    # Versions 1-3 were replaced before they could be sent
+    assert [m['data']['version'] for m in socket.sent] == [0, 4]
+    socket.ack_last()
+    assert len(socket.sent) == 2
+    assert dispatcher.stats()['a']['dropped'] == 3
+
+def test_stale_acks_are_ignored(dispatcher):
+    socket = dispatcher.socket
+    dispatcher.emit('update_diff', {'version': 1})
+    first = socket.sent[0]
+    dispatcher.emit('update_diff', {'version': 2})
+    dispatcher.acknowledge("a", first['data']['seq'] + 100)
+    assert len(socket.sent) == 1
+    first['callback']()
+    assert len(socket.sent) == 2
+
+def test_unacknowledged_update_times_out():
+    dispatcher = UpdateDispatcher(FakeSocket(), ack_timeout=0)
+    dispatcher.connect("a")
+    dispatcher.emit('update_diff', {'version': 1})
+    dispatcher.emit('update_diff', {'version': 2})
+    assert [m['data']['version'] for m in dispatcher.socket.sent] == [1, 2]
+
+def test_lost_ack_expires_without_another_emit():
+    dispatcher = UpdateDispatcher(FakeSocket(), ack_timeout=0.05)
+    dispatcher.connect("a")
+    dispatcher.emit('update_diff', {'version': 1})
+    dispatcher.emit('update_diff', {'version': 2})
+    assert [m['data']['version'] for m in dispatcher.socket.sent] == [1]
+    # The first ack never comes, and nothing else is emitted
+    deadline = time.monotonic() + 5
+    while len(dispatcher.socket.sent) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [m['data']['version'] for m in dispatcher.socket.sent] == [1, 2]
+    dispatcher.socket.ack_last()
+    assert dispatcher.clients["a"].timer is None
+
+def test_relayed_updates_keep_only_the_latest(dispatcher):
+    class Manager:
+        host_id = 'web'
+
+        def __init__(self):
+            self.broadcast = []
+
+        def _handle_emit(self, message):
+            self.broadcast.append(message['event'])
+
+    manager = Manager()
+    dispatcher.relay_through(manager)
+    for version in range(3):
+        manager._handle_emit({'method': 'emit', 'event': 'update_diff', 'data': [{'version': version}],
+                              'namespace': '/', 'room': None, 'host_id': 'producer'})
+    manager._handle_emit({'method': 'emit', 'event': 'history_updated', 'data': [{}], 'namespace': '/'})
+    # This node's own sends go out as they are
+    manager._handle_emit({'method': 'emit', 'event': 'update_diff', 'data': [{}], 'host_id': 'web'})
+    socket = dispatcher.socket
+    assert [m['data']['version'] for m in socket.sent] == [0]
+    socket.ack_last()
+    assert [m['data']['version'] for m in socket.sent] == [0, 2]
+    assert manager.broadcast == ['history_updated', 'update_diff']
+
+def test_clients_are_independent(dispatcher):
+    dispatcher.connect("b")
+    socket = dispatcher.socket
+    dispatcher.emit('update_diff', {'version': 1})
+    assert sorted(m['to'] for m in socket.sent) == ["a", "b"]
+    # Per-client payloads are never published to the other nodes
+    assert all(m['ignore_queue'] for m in socket.sent)
+    next(m for m in socket.sent if m['to'] == "b")['callback']()
+    dispatcher.emit('update_diff', {'version': 2})
+    # "a" is still busy with version 1, "b" gets version 2 right away
+    assert [(m['to'], m['data']['version']) for m in socket.sent[2:]] == [("b", 2)]
+
+def test_rooms(dispatcher):
+    dispatcher.connect("b")
+    dispatcher.set_room("a", "session-1")
+    dispatcher.set_room("b", "session-2")
+    dispatcher.emit('update_diff', {'version': 1}, to="session-2")
+    assert [m['to'] for m in dispatcher.socket.sent] == ["b"]
+
+def test_pause_keeps_only_the_latest(dispatcher):
+    socket = dispatcher.socket
+    dispatcher.pause("a")
+    for version in range(10):
+        dispatcher.emit('update_diff', {'version': version})
+    assert socket.sent == []
+    dispatcher.resume("a")
+    assert [m['data']['version'] for m in socket.sent] == [9]
+
+def test_other_events_pass_through(dispatcher):
+    dispatcher.pause("a")
+    dispatcher.emit('history_updated', {'path': 'x'}, namespace='/')
+    dispatcher.emit('session_closed', {'id': 'x'}, namespace='/', to='session-x')
+    dispatcher.emit('session_error', {'message': 'x'}, namespace='/', to='a')
+    # Only sends to a connection of this node stay off the message queue
+    assert [(m['event'], m['to'], m['callback'], m['ignore_queue']) for m in dispatcher.socket.sent] == [
+        ('history_updated', None, None, False), ('session_closed', 'session-x', None, False),
+        ('session_error', 'a', None, True)
+    ]
+
+def test_memory_stays_bounded_under_rapid_writes(dispatcher):
+    for sid in ("b", "c", "d"):
+        dispatcher.connect(sid)
+    dispatcher.pause("d")
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for version in range(200):
+            # A fresh ~1MB payload per write, as after each file change
+            dispatcher.emit('update_diff', {'diff_html': str(version) * 1_000_000})
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    # Per client: one update in flight and one pending, however many writes
+    assert growth < 6 * 1_000_000
+    assert all(stats['dropped'] >= 198 for stats in dispatcher.stats().values())
+
+def test_socket_handlers_track_clients():
+    dispatcher = UpdateDispatcher(socketio)
+    app.config['DISPATCHER'] = dispatcher
+    try:
+        client = socketio.test_client(app)
+        sid = next(iter(dispatcher.clients))
+        client.emit('pause_updates')
+        assert dispatcher.clients[sid].paused
+        client.emit('resume_updates')
+        assert not dispatcher.clients[sid].paused
+        client.disconnect()
+        assert dispatcher.clients == {}
+    finally:
+        app.config['DISPATCHER'] = None
@@ -6,7 +6,7 @@ import pytest
 import re
 from datetime import datetime
 from unittest.mock import patch, MagicMock, mock_open
-from live_differ.modules.differ import FileDiffer, DifferError
+from live_differ.modules.differ import BinaryFileError, FileDiffer, DifferError
 
 @pytest.fixture
 def temp_files(tmp_path):
@@ -88,14 +88,15 @@ def test_read_file(temp_files):
     lines = differ.read_file(file1)
     assert lines == ["Line 1\n", "Line 2\n", "Line 3\n"]
 
-def test_read_file_errors(temp_files):
+def test_read_file_errors(temp_files, tmp_path):
     file1, file2 = temp_files
     differ = FileDiffer(file1, file2)
     
-    # Test UnicodeDecodeError
-    with patch("builtins.open", side_effect=UnicodeDecodeError("utf-8", b"", 0, 1, "Test error")):
-        with pytest.raises(DifferError, match="must be UTF-8 encoded"):
-            differ.read_file(file1)
+    # Test binary file
+    binary = tmp_path / "file.bin"
+    binary.write_bytes(b"\x7fELF\x00\x01")
+    with pytest.raises(BinaryFileError, match="is a binary file"):
+        differ.read_file(str(binary))
     
     # Test IOError
     with patch("builtins.open", side_effect=IOError("Test error")):
@@ -0,0 +1,53 @@
+import codecs
+
+import pytest
+
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.encoding import (
+    BinaryDataError, decode_lines, decode_text, is_binary_file, looks_binary
+)
+
+
+def test_utf8_is_tried_first():
+    assert decode_text('naïve ✓'.encode('utf-8')) == ('naïve ✓', 'utf-8')
+
+
+def test_byte_order_marks_name_the_encoding():
+    assert decode_text(codecs.BOM_UTF8 + b'abc') == ('abc', 'utf-8-sig')
+    text, encoding = decode_text('line\r\nzwei\n'.encode('utf-16'))
+    assert (text, encoding) == ('line\r\nzwei\n', 'utf-16')
+    # NUL bytes of UTF-16 text don't make it binary
+    assert not looks_binary('abc'.encode('utf-16'))
+
+
+def test_legacy_encodings_decode():
+    lines, encoding = decode_lines('café “quoted”\r\n'.encode('cp1252'))
+    assert lines == ['café “quoted”\n']
+    assert encoding in ('cp1252', 'windows-1252')
+    # Bytes cp1252 leaves undefined still decode
+    assert decode_text(b'\x81\x8d')[0] == '\x81\x8d'
+
+
+def test_binary_data_is_refused():
+    with pytest.raises(BinaryDataError):
+        decode_text(b'PK\x03\x04\x00\x00')
+
+
+def test_latin1_files_are_diffed(tmp_path):
+    file1 = tmp_path / 'a.txt'
+    file2 = tmp_path / 'b.txt'
+    file1.write_bytes('Grüße\nDanke\n'.encode('latin-1'))
+    file2.write_bytes('Grüße\nMerci\n'.encode('latin-1'))
+    differ = FileDiffer(str(file1), str(file2))
+    assert differ.read_file(str(file1)) == ['Grüße\n', 'Danke\n']
+    assert 'Grüße' in differ.get_diff()['diff_html']
+    assert differ.get_stats()['changed'] == 1
+
+
+def test_binary_file_detection(tmp_path):
+    text = tmp_path / 'a.txt'
+    binary = tmp_path / 'a.bin'
+    text.write_text('plain\n')
+    binary.write_bytes(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR')
+    assert not is_binary_file(str(text))
+    assert is_binary_file(str(binary))
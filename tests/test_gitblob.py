@@ -0,0 +1,127 @@
+"""
+Tests for the gitblob module.
+"""
+import os
+import subprocess
+import pytest
+from unittest.mock import Mock, patch
+from live_differ.modules.differ import FileDiffer, DifferError
+from live_differ.modules.gitblob import (
+    GitError, GitRevision, blob_cache, get_cat_file, parse_revision_spec
+)
+from live_differ.modules.watcher import FileChangeHandler
+
+def git(repo, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+        cwd=repo, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, 'init', '-q')
+    tracked = repo / "config.txt"
+    tracked.write_text("Line 1\nLine 2\nLine 3\n")
+    git(repo, 'add', 'config.txt')
+    git(repo, 'commit', '-q', '-m', 'initial')
+    tracked.write_text("Line 1\nLine 2 modified\nLine 3\n")
+    monkeypatch.chdir(repo)
+    blob_cache.clear()
+    return repo
+
+def test_parse_revision_spec(tmp_path):
+    assert parse_revision_spec("HEAD:config.txt") == ("HEAD", "config.txt")
+    assert parse_revision_spec("v1.0~2:src/app.py") == ("v1.0~2", "src/app.py")
+    assert parse_revision_spec("plain.txt") is None
+    assert parse_revision_spec(":config.txt") is None
+    assert parse_revision_spec("HEAD:") is None
+    assert parse_revision_spec("C:\\file.txt") is None
+
+    # An existing file with a colon in its name is a path, not a spec
+    odd = tmp_path / "a:b.txt"
+    odd.write_text("x\n")
+    assert parse_revision_spec(str(odd)) is None
+
+def test_git_revision_reads_blob(git_repo):
+    revision = GitRevision("HEAD:config.txt")
+    assert revision.path == str(git_repo / "config.txt")
+    assert revision.read_lines() == ["Line 1\n", "Line 2\n", "Line 3\n"]
+    assert revision.blob().lines is revision.read_lines()
+
+    info = revision.get_info()
+    assert info['path'] == "HEAD:config.txt"
+    assert info['name'] == "config.txt @ HEAD"
+    assert info['size'] == len("Line 1\nLine 2\nLine 3\n")
+
+def test_git_revision_errors(git_repo):
+    with pytest.raises(GitError, match="Unknown revision or path"):
+        GitRevision("HEAD:missing.txt")
+    with pytest.raises(GitError, match="Unknown revision or path"):
+        GitRevision("no-such-tag:config.txt")
+
+def test_git_revision_uses_one_process(git_repo):
+    GitRevision("HEAD:config.txt")
+    get_cat_file(os.path.realpath(str(git_repo))).close()
+    with patch('subprocess.Popen', wraps=subprocess.Popen) as mock_popen:
+        for _ in range(5):
+            GitRevision("HEAD:config.txt").read_lines()
+        assert mock_popen.call_count == 1
+
+def test_git_revision_lines_are_cached(git_repo):
+    revision = GitRevision("HEAD:config.txt")
+    with patch.object(revision.cat_file, 'read') as mock_read:
+        assert revision.read_lines() == ["Line 1\n", "Line 2\n", "Line 3\n"]
+        mock_read.assert_not_called()
+
+def test_differ_against_revision(git_repo):
+    differ = FileDiffer("HEAD:config.txt", "config.txt")
+    assert differ.file1_revision is not None
+    assert differ.file2_revision is None
+    assert differ.watch_paths() == [str(git_repo / "config.txt")]
+
+    diff = differ.get_diff()
+    assert diff['file1_info']['name'] == "config.txt @ HEAD"
+    assert diff['file2_info']['name'] == "config.txt"
+    assert "modified" in diff['diff_html']
+
+def test_differ_revision_errors(git_repo):
+    with pytest.raises(DifferError, match="Unknown revision or path"):
+        FileDiffer("HEAD:missing.txt", "config.txt")
+
+def test_binary_revision_is_diffed_by_bytes(git_repo):
+    data = bytes(range(256)) * 64
+    blob = git_repo / "image.bin"
+    blob.write_bytes(data)
+    git(git_repo, 'add', 'image.bin')
+    git(git_repo, 'commit', '-q', '-m', 'binary')
+    blob.write_bytes(data[:5000] + b'\x00new\x00' + data[5000:])
+    differ = FileDiffer("HEAD:image.bin", str(blob))
+    assert differ.file1_revision.is_binary()
+    with pytest.raises(DifferError, match="is a binary file"):
+        differ.get_opcodes()
+    diff = differ.get_diff()
+    assert diff['binary'] and 'diff-binary' in diff['diff_html']
+    stats = differ.get_stats()
+    assert (stats['added'], stats['removed'], stats['changed']) == (5, 0, 0)
+
+def test_binary_revision_updates_live(git_repo):
+    blob = git_repo / "image.bin"
+    blob.write_bytes(b"\x00\x01\x02" * 100)
+    git(git_repo, 'add', 'image.bin')
+    git(git_repo, 'commit', '-q', '-m', 'binary')
+    blob.write_bytes(b"\x00\x01\x03" * 100)
+    socket = Mock()
+    handler = FileChangeHandler(FileDiffer("HEAD:image.bin", str(blob)), socket)
+    handler.update()
+    event, data = socket.emit.call_args[0]
+    assert event == 'update_diff' and data['binary']
+
+def test_text_revision_against_binary_file(git_repo):
+    (git_repo / "config.txt").write_bytes(b"Line 1\x00\n")
+    differ = FileDiffer("HEAD:config.txt", "config.txt")
+    assert not differ.file1_revision.is_binary()
+    stats = differ.get_stats()
+    assert stats['binary'] and not stats['identical']
+    assert stats['sizes'] == {'file1': 21, 'file2': 8}
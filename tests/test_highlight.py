@@ -0,0 +1,84 @@
+"""
+Tests for the highlight module.
+"""
+import pytest
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.highlight import (
+    FileHighlighter, ROOT_STATE, get_highlighter, token_cache
+)
+
+pygments = pytest.importorskip("pygments")
+from pygments.lexers import PythonLexer
+
+SOURCE = [
+    'import os\n',
+    'def f(x):\n',
+    '    """Docstring\n',
+    '    still docstring\n',
+    '    """\n',
+    '    return x + 1\n',
+] + [f'value_{i} = {i}\n' for i in range(50)]
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+
+def test_state_carries_across_lines():
+    highlighter = FileHighlighter(PythonLexer(stripnl=False, ensurenl=False))
+    highlighter.update(SOURCE)
+    result = highlighter.highlight([1, 4, 6])
+    assert '<span class="hl-kn">import</span>' in result[1]
+    # Line 4 only makes sense as a string if line 3's state was carried over
+    assert result[4].startswith('<span class="hl-s')
+    assert '<span class="hl-k">return</span>' in result[6]
+    assert highlighter.end_states[-1] == ROOT_STATE
+
+def test_highlight_is_lazy():
+    highlighter = FileHighlighter(PythonLexer(stripnl=False, ensurenl=False))
+    highlighter.update(SOURCE)
+    highlighter.highlight([3])
+    assert len(highlighter.end_states) == 2
+    assert token_cache.misses == 3
+
+def test_only_changed_lines_are_retokenized():
+    highlighter = FileHighlighter(PythonLexer(stripnl=False, ensurenl=False))
+    highlighter.update(SOURCE)
+    highlighter.highlight(range(1, len(SOURCE) + 1))
+    misses = token_cache.misses
+
+    edited = list(SOURCE)
+    edited[1] = 'def g(x):\n'
+    highlighter.update(edited)
+    highlighter.highlight(range(1, len(edited) + 1))
+    # Only the edited line is new; the state resynchronises right after it
+    assert token_cache.misses - misses == 1
+
+def test_opening_a_string_retokenizes_until_resync():
+    highlighter = FileHighlighter(PythonLexer(stripnl=False, ensurenl=False))
+    lines = ['a = 1\n', 'b = 2\n', 'c = 3\n', 'd = 4\n']
+    highlighter.update(lines)
+    highlighter.highlight(range(1, 5))
+    misses = token_cache.misses
+
+    highlighter.update(['x = """\n', 'b = 2\n', '"""\n', 'd = 4\n'])
+    result = highlighter.highlight(range(1, 5))
+    assert result[2].startswith('<span class="hl-s')
+    assert token_cache.misses - misses == 3
+
+def test_get_highlighter_by_filename():
+    assert get_highlighter('/tmp/example.py', '/tmp/example.py', SOURCE) is not None
+    assert get_highlighter('/tmp/example.unknownext', '/tmp/example.unknownext', SOURCE) is None
+
+def test_differ_highlights_rows(tmp_path):
+    file1 = tmp_path / "a.py"
+    file2 = tmp_path / "b.py"
+    file1.write_text("".join(SOURCE))
+    file2.write_text("".join(SOURCE).replace("return x + 1", "return x + 2"))
+
+    plain = FileDiffer(str(file1), str(file2)).get_diff()['diff_html']
+    assert 'hl-k' not in plain
+
+    html = FileDiffer(str(file1), str(file2), highlight=True).get_diff()['diff_html']
+    assert '<span class="hl-k">def</span>' in html
+    # The changed row keeps its intraline markup
+    assert '<span class="diff_chg">' in html
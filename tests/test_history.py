@@ -0,0 +1,158 @@
+"""
+Tests for the history module.
+"""
+import time
+import tracemalloc
+import pytest
+from unittest.mock import Mock
+from watchdog.events import FileModifiedEvent
+from live_differ.core import app
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.history import (
+    FileHistory, HistoryError, HistoryStore, apply_reverse_delta, reverse_delta
+)
+from live_differ.modules.watcher import FileChangeHandler
+
+def make_version(n, size=200):
+    lines = [f"line {i}\n" for i in range(size)]
+    lines[n % size] = f"line {n % size} edited in revision {n}\n"
+    return lines
+
+def test_reverse_delta_roundtrip():
+    cases = [
+        (["a\n", "b\n", "c\n"], ["a\n", "B\n", "c\n"]),
+        (["a\n", "b\n"], ["a\n", "b\n", "c\n", "d\n"]),
+        (["a\n", "b\n", "c\n", "d\n"], ["b\n", "d\n"]),
+        ([], ["x\n"]),
+        (["x\n"], []),
+        (["same\n"], ["same\n"]),
+    ]
+    for older, newer in cases:
+        assert apply_reverse_delta(newer, reverse_delta(older, newer)) == older
+
+def test_reverse_delta_stores_only_changes():
+    older = make_version(1)
+    newer = make_version(2)
+    delta = reverse_delta(older, newer)
+    assert sum(len(lines) for _, _, lines in delta) == 2
+
+def test_file_history_reconstructs_every_version():
+    history = FileHistory(keyframe_interval=5)
+    expected = {}
+    for n in range(23):
+        lines = make_version(n, size=20)
+        expected[history.record(lines)] = lines
+    for version_id, lines in expected.items():
+        assert history.get(version_id) == lines
+
+    # Older versions are deltas except for the periodic keyframes
+    keyframes = [v.id for v in history.versions if v.is_keyframe]
+    assert keyframes == [5, 10, 15, 20, 23]
+
+def test_file_history_skips_unchanged_content():
+    history = FileHistory()
+    assert history.record(["a\n"]) == 1
+    assert history.record(["a\n"]) is None
+    assert len(history.list_versions()) == 1
+
+def test_file_history_evicts_by_count():
+    history = FileHistory(max_versions=3)
+    for n in range(10):
+        history.record(make_version(n, size=10))
+    assert [v['id'] for v in history.list_versions()] == [8, 9, 10]
+    with pytest.raises(HistoryError, match="Version 1 is not available"):
+        history.get(1)
+    assert history.get(8) == make_version(7, size=10)
+
+def test_file_history_evicts_by_memory():
+    history = FileHistory(max_bytes=20_000, keyframe_interval=1000)
+    for n in range(500):
+        history.record(make_version(n))
+    assert history.nbytes <= 20_000
+    newest = history.list_versions()[-1]['id']
+    oldest = history.list_versions()[0]['id']
+    assert oldest > 1
+    assert history.get(newest) == make_version(499)
+    assert history.get(oldest) == make_version(oldest - 1)
+
+def test_file_history_soak_10k_revisions():
+    """Record 10k revisions and check memory stays within the cap"""
+    cap = 2 * 1024 * 1024
+    history = FileHistory(max_versions=20_000, max_bytes=cap, keyframe_interval=100)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    for n in range(10_000):
+        history.record(make_version(n))
+    elapsed = time.perf_counter() - started
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert history.nbytes <= cap
+    # Measured usage must track the accounted size, not 10k full copies
+    full_copy = sum(len(line) for line in make_version(0)) * 10_000
+    assert used - baseline < min(1.25 * cap, full_copy / 4)
+    assert elapsed < 30
+
+    # Reconstruction stays fast thanks to keyframes
+    versions = history.list_versions()
+    started = time.perf_counter()
+    for version in versions[::97]:
+        assert history.get(version['id']) == make_version(version['id'] - 1)
+    assert time.perf_counter() - started < 5
+
+def test_history_store_record_and_get():
+    store = HistoryStore()
+    store.record("/tmp/a.txt", ["1\n"])
+    store.record("/tmp/a.txt", ["2\n"])
+    assert store.get("/tmp/a.txt", 1) == ["1\n"]
+    assert [v['id'] for v in store.to_dict()["/tmp/a.txt"]] == [1, 2]
+    with pytest.raises(HistoryError, match="No history"):
+        store.get("/tmp/b.txt", 1)
+
+def test_watcher_records_history(tmp_path):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    file1.write_text("a\n")
+    file2.write_text("b\n")
+    differ = FileDiffer(str(file1), str(file2))
+    store = HistoryStore()
+    for path in differ.watch_paths():
+        store.record(path, differ.read_file(path))
+    socket = Mock()
+    handler = FileChangeHandler(differ, socket, store)
+
+    file1.write_text("a changed\n")
+    handler.on_modified(FileModifiedEvent(str(file1)))
+
+    assert store.get(str(file1), 2) == ["a changed\n"]
+    assert len(store.to_dict()[str(file2)]) == 1
+    socket.emit.assert_any_call('history_updated', {'path': str(file1)}, namespace='/')
+
+@pytest.fixture
+def history_client():
+    store = HistoryStore()
+    store.record("/tmp/a.txt", ["Line 1\n", "Line 2\n"])
+    store.record("/tmp/a.txt", ["Line 1\n", "Line 2 modified\n"])
+    app.config['HISTORY'] = store
+    with app.test_client() as client:
+        yield client
+    app.config['HISTORY'] = None
+
+def test_history_api(history_client):
+    response = history_client.get('/api/history')
+    assert response.status_code == 200
+    assert [v['id'] for v in response.json['files']['/tmp/a.txt']] == [1, 2]
+
+def test_history_diff_api(history_client):
+    response = history_client.get('/api/history/diff?path=/tmp/a.txt&from=1&to=2')
+    assert response.status_code == 200
+    assert response.json['from'] == 1
+    assert "modified" in response.json['diff_html']
+    assert "a.txt (v1)" in response.json['diff_html']
+
+def test_history_diff_api_errors(history_client):
+    assert history_client.get('/api/history/diff?path=/tmp/a.txt').status_code == 400
+    assert history_client.get('/api/history/diff?path=/tmp/a.txt&from=1&to=9').status_code == 404
+    app.config['HISTORY'] = None
+    assert history_client.get('/api/history').status_code == 404
@@ -0,0 +1,62 @@
+"""
+Tests for queue-based logging and diff timing records.
+"""
+import json
+import logging
+import threading
+import time
+from logging.handlers import QueueHandler
+from unittest.mock import patch
+from live_differ import core
+from live_differ.core import setup_logging
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.timing import TIMING_LOGGER, TimingFormatter, log_timing
+
+def queue_handlers():
+    return [h for h in logging.getLogger().handlers if isinstance(h, QueueHandler)]
+
+def test_setup_logging_is_idempotent():
+    setup_logging(debug=False)
+    setup_logging(debug=True)
+    try:
+        assert len(queue_handlers()) == 1
+        assert core._log_handlers['file'].level == logging.DEBUG
+    finally:
+        setup_logging(debug=False)
+    assert core._log_handlers['file'].level == logging.WARNING
+    assert core._log_handlers['console'].level == logging.ERROR
+
+def test_records_are_written_off_the_calling_thread():
+    writers = []
+    file_handler = core._log_handlers['file']
+    with patch.object(file_handler, 'emit', side_effect=lambda record: writers.append(threading.current_thread())):
+        logging.getLogger('live_differ.test').error("written in the background")
+        deadline = time.time() + 5
+        while not writers and time.time() < deadline:
+            time.sleep(0.01)
+    assert writers and writers[0] is not threading.current_thread()
+
+def test_timing_records_only_go_to_the_timing_log():
+    record = logging.LogRecord(TIMING_LOGGER, logging.INFO, __file__, 1, "diff", None, None)
+    assert not core._log_handlers['file'].filter(record)
+    assert not core._log_handlers['console'].filter(record)
+
+def test_get_diff_logs_timing(sample_files, caplog):
+    with caplog.at_level(logging.INFO, logger=TIMING_LOGGER):
+        FileDiffer(*sample_files).get_diff()
+        FileDiffer(*sample_files).get_diff()
+    timings = [record.timing for record in caplog.records if record.name == TIMING_LOGGER]
+    assert [timing['source'] for timing in timings] == ['render', 'memory']
+    first = timings[0]
+    assert first['event'] == 'diff'
+    assert (first['lines1'], first['lines2']) == (3, 4)
+    assert first['total_ms'] >= first['table_ms'] >= 0
+
+def test_timing_formatter_writes_json_lines(caplog):
+    with caplog.at_level(logging.INFO, logger=TIMING_LOGGER):
+        log_timing('diff', total_ms=1.5, source='cache')
+    line = TimingFormatter().format(caplog.records[-1])
+    payload = json.loads(line)
+    assert payload['event'] == 'diff'
+    assert payload['total_ms'] == 1.5
+    assert 'time' in payload
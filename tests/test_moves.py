@@ -0,0 +1,67 @@
+"""
+Tests for the moves module.
+"""
+import difflib
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.moves import Move, find_moves
+from live_differ.modules.render import MOVED_FROM, MOVED_TO, build_rows
+
+SECTION_A = [f"a.option{n} = {n}\n" for n in range(10)]
+SECTION_B = [f"b.option{n} = {n}\n" for n in range(10)]
+HEADER = ["# config\n", "\n"]
+
+def _moves(lines1, lines2, min_lines=3):
+    opcodes = difflib.SequenceMatcher(None, lines1, lines2).get_opcodes()
+    return find_moves(lines1, lines2, lines1, lines2, opcodes, min_lines), opcodes
+
+def test_reordered_sections_are_a_move():
+    lines1 = HEADER + SECTION_A + SECTION_B
+    lines2 = HEADER + SECTION_B + SECTION_A
+    moves, opcodes = _moves(lines1, lines2)
+    assert len(moves) == 1
+    move = moves[0]
+    assert lines1[move.from_start:move.from_start + move.length] == \
+        lines2[move.to_start:move.to_start + move.length]
+    assert move.length == 10
+
+def test_moved_block_keeps_edits_separate():
+    lines1 = HEADER + SECTION_A + ["middle\n"] + SECTION_B
+    lines2 = HEADER + ["middle\n"] + SECTION_B + SECTION_A[:5] + ["inserted\n"] + SECTION_A[5:]
+    moves, _ = _moves(lines1, lines2)
+    assert [m.length for m in moves] == [5, 5]
+
+def test_short_and_blank_runs_are_not_moves():
+    lines1 = ["x\n", "\n", "\n", "\n", "y\n", "a\n", "b\n"]
+    lines2 = ["a\n", "b\n", "\n", "\n", "\n", "z\n"]
+    assert _moves(lines1, lines2)[0] == []
+
+def test_rows_are_compact():
+    lines1 = HEADER + SECTION_A + SECTION_B
+    lines2 = HEADER + SECTION_B + SECTION_A
+    moves, opcodes = _moves(lines1, lines2)
+    rows = build_rows(lines1, lines2, opcodes, moves=moves)
+    # One row for the old position, one per line at the new position
+    assert len(rows) == len(lines2) + 1
+    assert [row for row in rows if row[0] == MOVED_FROM] == [
+        (MOVED_FROM, moves[0].from_start, moves[0].to_start)
+    ]
+    assert sum(row[0] == MOVED_TO for row in rows) == moves[0].length
+
+def test_large_move_is_linear():
+    n = 200_000
+    ids1 = list(range(n))
+    ids2 = ids1[n // 2:] + ids1[:n // 2]
+    lines = [f"{i}\n" for i in ids1]
+    opcodes = [('delete', 0, n // 2, 0, 0), ('equal', n // 2, n, 0, n // 2),
+               ('insert', n, n, n // 2, n)]
+    assert find_moves(lines, lines, ids1, ids2, opcodes) == [Move(0, n // 2, n // 2)]
+
+def test_diff_links_moved_blocks(tmp_path):
+    file1 = tmp_path / "a.conf"
+    file2 = tmp_path / "b.conf"
+    file1.write_text("".join(HEADER + SECTION_A + SECTION_B))
+    file2.write_text("".join(HEADER + SECTION_B + SECTION_A))
+    html = FileDiffer(str(file1), str(file2)).get_diff()['diff_html']
+    assert "10 lines moved to line" in html
+    assert 'href="#from-' in html
+    assert 'diff_sub' not in html
@@ -0,0 +1,110 @@
+"""
+Tests for the normalize module.
+"""
+import pytest
+from unittest.mock import patch
+from live_differ.modules import normalize
+from live_differ.modules.differ import FileDiffer, DifferError
+from live_differ.modules.normalize import (
+    MASK_TOKEN, LineNormalizer, NormalizeOptions, get_normalizer
+)
+
+def _differ(tmp_path, text1, text2, **options):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    file1.write_text(text1)
+    file2.write_text(text2)
+    return FileDiffer(str(file1), str(file2), normalize=NormalizeOptions(**options))
+
+def _changed(opcodes):
+    return [op for op in opcodes if op[0] != 'equal']
+
+def test_keys():
+    assert LineNormalizer(NormalizeOptions()).key("A b\n") == "A b\n"
+    assert LineNormalizer(NormalizeOptions(ignore_whitespace=True)).key(" a \t b\r\n") == "ab"
+    assert LineNormalizer(NormalizeOptions(ignore_case=True)).key("ABC\n") == "abc\n"
+    masked = LineNormalizer(NormalizeOptions(mask_patterns=(r'\d+',)))
+    assert masked.key("t=12 n=3\n") == f"t={MASK_TOKEN} n={MASK_TOKEN}\n"
+
+def test_ids_equal_for_equivalent_lines():
+    normalizer = LineNormalizer(NormalizeOptions(ignore_whitespace=True, ignore_case=True))
+    ids, = normalizer.ids(["Foo Bar\n", "foobar\r\n", "baz\n"])
+    assert ids[0] == ids[1] != ids[2]
+
+def test_ids_normalize_each_line_once():
+    normalizer = LineNormalizer(NormalizeOptions(ignore_case=True))
+    lines = [f"Line {n}\n" for n in range(100)]
+    normalizer.ids(lines)
+    with patch.object(normalizer, 'key', wraps=normalizer.key) as key:
+        first, again = normalizer.ids(lines + ["New line\n"], lines)
+        assert key.call_count == 1
+    assert first[:100] == again
+
+def test_ids_cache_is_bounded():
+    normalizer = LineNormalizer(NormalizeOptions(), max_entries=10)
+    ids, = normalizer.ids([f"{n}\n" for n in range(50)] + ["0\n"])
+    assert ids[0] == ids[-1]
+    normalizer.ids(["x\n"])
+    assert len(normalizer.line_ids) == 1
+    assert normalizer.generation == 1
+
+def test_sides_are_numbered_in_one_generation(monkeypatch):
+    options = NormalizeOptions(ignore_case=True)
+    normalizer = LineNormalizer(options, max_entries=10)
+    monkeypatch.setitem(normalize._normalizers, options, normalizer)
+    normalizer.ids([f"warm {n}\n" for n in range(8)])
+    common = [f"common {n}\n" for n in range(6)]
+    # The first side alone overflows the table; the second must not start over
+    opcodes = FileDiffer.match_lines(["A\n"] + common + ["Z\n"], ["B\n"] + common + ["Y\n"], options)
+    assert opcodes == [('replace', 0, 1, 0, 1), ('equal', 1, 7, 1, 7), ('replace', 7, 8, 7, 8)]
+
+def test_get_normalizer_is_shared():
+    options = NormalizeOptions(ignore_case=True)
+    assert get_normalizer(options) is get_normalizer(NormalizeOptions(ignore_case=True))
+    assert get_normalizer(None) is get_normalizer(NormalizeOptions())
+
+def test_ignore_whitespace(tmp_path):
+    differ = _differ(tmp_path, "a b\nc\n", "a  b \r\nc\n", ignore_whitespace=True)
+    assert _changed(differ.get_opcodes()) == []
+    # The original text is still shown next to a real change
+    differ = _differ(tmp_path, "a b\nc\n", "a  b \r\nd\n", ignore_whitespace=True)
+    assert _changed(differ.get_opcodes()) == [('replace', 1, 2, 1, 2)]
+    assert "a  b " in differ.get_diff()['diff_html']
+
+def test_ignore_case(tmp_path):
+    assert _changed(_differ(tmp_path, "Hello\n", "HELLO\n", ignore_case=True).get_opcodes()) == []
+    assert _changed(_differ(tmp_path, "Hello\n", "HELLO\n").get_opcodes()) != []
+
+def test_ignore_blank_lines(tmp_path):
+    differ = _differ(tmp_path, "a\nb\n", "a\n\n\nb\n", ignore_blank_lines=True)
+    html = differ.get_diff()['diff_html']
+    assert "diff_add" not in html
+    assert "No differences found" in html
+
+def test_blank_lines_dont_anchor_the_matcher():
+    options = NormalizeOptions(ignore_blank_lines=True)
+    opcodes = FileDiffer.match_lines(['x\n', '\n', 'y\n', 'z\n'], ['x\n', 'y\n', '\n', 'z\n'], options)
+    assert opcodes == [
+        ('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 3, 1, 2),
+        ('insert', 3, 3, 2, 3), ('equal', 3, 4, 3, 4)
+    ]
+
+def test_moved_blank_lines_are_identical(tmp_path):
+    differ = _differ(tmp_path, "a\n\nb\n", "a\nb\n\n\n", ignore_blank_lines=True)
+    stats = differ.get_stats()
+    assert (stats['added'], stats['removed'], stats['changed']) == (0, 0, 0)
+    assert stats['identical']
+    assert "No differences found" in differ.get_diff()['diff_html']
+
+def test_mask_patterns(tmp_path):
+    differ = _differ(
+        tmp_path,
+        "2024-01-01 12:00:00 started\n2024-01-01 12:00:01 done\n",
+        "2024-02-03 08:30:00 started\n2024-02-03 08:30:09 failed\n",
+        mask_patterns=(r'\d{4}-\d{2}-\d{2} [\d:]+',)
+    )
+    assert _changed(differ.get_opcodes()) == [('replace', 1, 2, 1, 2)]
+
+def test_invalid_mask_pattern(tmp_path):
+    with pytest.raises(DifferError, match="Invalid mask pattern"):
+        _differ(tmp_path, "a\n", "b\n", mask_patterns=('(',))
@@ -0,0 +1,95 @@
+"""
+Tests for the profiling module.
+"""
+import os
+import pstats
+import threading
+import time
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from live_differ.core import app
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.profiling import Profiler, profiled, sample_stacks, set_profiler
+from live_differ.modules.watcher import FileChangeHandler
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(str(tmp_path / "profiles"), keep=3)
+    set_profiler(profiler)
+    yield profiler
+    set_profiler(None)
+
+def profiles(profiler):
+    return sorted(os.listdir(profiler.directory))
+
+def test_disabled_profiling_is_a_no_op():
+    assert isinstance(profiled('anything'), nullcontext)
+
+def test_profile_is_readable_by_pstats(profiler):
+    with profiled('work'):
+        sum(range(1000))
+    [name] = profiles(profiler)
+    assert name.endswith('-work.prof')
+    stats = pstats.Stats(os.path.join(profiler.directory, name))
+    assert stats.total_calls > 0
+
+def test_only_newest_profiles_are_kept(profiler):
+    for n in range(5):
+        with profiler.profile(f"run{n}"):
+            pass
+    names = profiles(profiler)
+    assert len(names) == 3
+    assert [name.split('-')[-1] for name in names] == ['run2.prof', 'run3.prof', 'run4.prof']
+
+def test_requests_are_profiled(profiler):
+    with app.test_client() as client:
+        assert client.get('/health').status_code == 200
+    assert [name.split('-', 3)[-1] for name in profiles(profiler)] == ['request-health_check.prof']
+
+def test_diff_updates_are_profiled(profiler, sample_files):
+    differ = FileDiffer(*sample_files)
+    handler = FileChangeHandler(differ, Mock())
+    handler.on_modified(Mock(is_directory=False, src_path=sample_files[0]))
+    assert profiles(profiler)[0].endswith('-diff-update.prof')
+
+def test_debug_profile_requires_profiling():
+    with app.test_client() as client:
+        assert client.get('/debug/profile?seconds=0.1').status_code == 404
+
+def test_debug_profile_is_local_only(profiler):
+    with app.test_client() as client:
+        response = client.get('/debug/profile?seconds=0.1', environ_base={'REMOTE_ADDR': '10.0.0.5'})
+        assert response.status_code == 403
+
+def test_debug_profile_validates_seconds(profiler):
+    with app.test_client() as client:
+        assert client.get('/debug/profile?seconds=0').status_code == 400
+        assert client.get('/debug/profile?seconds=600').status_code == 400
+
+def test_debug_profile_returns_folded_stacks(profiler):
+    with app.test_client() as client:
+        response = client.get('/debug/profile?seconds=0.1')
+    assert response.status_code == 200
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert response.mimetype == 'text/plain'
+    # The sampling request itself is not saved as a cProfile
+    assert profiles(profiler) == []
+
+def test_sample_stacks_sees_other_threads():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=busy_worker, name='busy', daemon=True)
+    thread.start()
+    try:
+        folded = sample_stacks(0.1)
+    finally:
+        stop.set()
+        thread.join()
+    line = next(line for line in folded.splitlines() if line.startswith('busy;'))
+    assert 'busy_worker (test_profiling.py:' in line
+    assert int(line.rsplit(' ', 1)[1]) > 0
@@ -0,0 +1,94 @@
+"""
+Tests for the reference module.
+"""
+import os
+
+import pytest
+
+from live_differ.modules import normalize
+from live_differ.modules.differ import BinaryFileError, FileDiffer
+from live_differ.modules.normalize import LineNormalizer, NormalizeOptions
+from live_differ.modules.reference import Reference, ReferenceDiffer
+
+def write(path, lines):
+    path.write_text(''.join(lines))
+    return str(path)
+
+def test_reference_is_read_once_per_version(tmp_path):
+    path = write(tmp_path / "golden.txt", ["a\n", "b\n"])
+    reference = Reference(path)
+    first = reference.current()
+    assert reference.current() is first
+    write(tmp_path / "golden.txt", ["a\n", "b\n", "c\n"])
+    os.utime(path, ns=(first.signature[2] + 10**9, first.signature[2] + 10**9))
+    second = reference.current()
+    assert second is not first
+    assert second.lines == ["a\n", "b\n", "c\n"]
+
+def test_matching_against_the_shared_index_gives_valid_opcodes(tmp_path):
+    golden = [f"setting{i} = {i}\n" for i in range(40)]
+    variant = list(golden)
+    variant[3] = "setting3 = changed\n"
+    variant[30:32] = []
+    variant.insert(20, "extra = 1\n")
+    variant.append("tail = 1\n")
+    version = Reference(write(tmp_path / "golden.txt", golden)).current()
+    opcodes = version.match(variant)
+    # Replaying the opcodes rebuilds the variant from the reference
+    rebuilt = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i2 - i1 == j2 - j1) if tag == 'equal' else True
+        rebuilt.extend(golden[i1:i2] if tag == 'equal' else variant[j1:j2])
+    assert rebuilt == variant
+    assert [tag for tag, *_ in opcodes] == [tag for tag, *_ in FileDiffer.match_lines(golden, variant)]
+
+def test_shared_index_is_rebuilt_after_the_normalizer_starts_over(tmp_path, monkeypatch):
+    options = NormalizeOptions(ignore_whitespace=True)
+    normalizer = LineNormalizer(options, max_entries=50)
+    monkeypatch.setitem(normalize._normalizers, options, normalizer)
+    golden = [f"setting{i} = {i}\n" for i in range(40)]
+    version = Reference(write(tmp_path / "golden.txt", golden), options).current()
+    generation, _ = version.matcher()
+    # Other diffs overflow the normalizer and renumber every line
+    normalizer.ids([f"other {n}\n" for n in range(60)])
+    normalizer.ids(["x\n"])
+    assert normalizer.generation != generation
+    variant = [golden[0]] + ["new\n"] + golden[1:20] + ["changed\n"] + golden[21:39] + ["tail\n"]
+    assert version.match(variant) == FileDiffer.match_lines(golden, variant, options)
+
+def test_reference_differ_diffs_the_shared_reference(tmp_path):
+    reference = Reference(
+        write(tmp_path / "golden.txt", ["Host = golden\n", "port = 80\n"]),
+        NormalizeOptions(ignore_case=True)
+    )
+    variant = write(tmp_path / "host.txt", ["host = GOLDEN\n", "port = 81\n"])
+    differ = ReferenceDiffer(reference, variant)
+    assert differ.normalize == reference.normalize
+    assert differ.watch_paths() == [reference.path, variant]
+    stats = differ.get_stats()
+    assert stats['changed'] == 1
+    assert differ.last_read[reference.path] is reference.current().lines
+    diff_data = differ.get_diff()
+    assert diff_data["file1_info"]["path"] == reference.path
+    assert "diff_chg" in diff_data["diff_html"]
+
+def test_reference_in_a_legacy_encoding(tmp_path):
+    golden = tmp_path / "golden.txt"
+    golden.write_bytes("Größe = 1\nfaçade = 2\n".encode('cp1252'))
+    reference = Reference(str(golden))
+    assert reference.current().lines == ["Größe = 1\n", "façade = 2\n"]
+    variant = write(tmp_path / "variant.txt", ["Größe = 1\n", "façade = 3\n"])
+    stats = ReferenceDiffer(reference, variant).get_stats()
+    assert (stats['added'], stats['removed'], stats['changed']) == (0, 0, 1)
+
+def test_binary_reference_is_diffed_by_bytes(tmp_path):
+    golden = tmp_path / "golden.bin"
+    golden.write_bytes(b"\x00" * 100)
+    variant = tmp_path / "variant.bin"
+    variant.write_bytes(b"\x00" * 50 + b"\x01" + b"\x00" * 49)
+    reference = Reference(str(golden))
+    with pytest.raises(BinaryFileError):
+        reference.current()
+    differ = ReferenceDiffer(reference, str(variant))
+    assert differ.get_diff()['binary']
+    assert differ.get_stats()['changed'] == 1
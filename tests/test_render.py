@@ -0,0 +1,169 @@
+"""
+Tests for the render module.
+"""
+import difflib
+import random
+import tracemalloc
+from live_differ.core import app
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.moves import Move
+from live_differ.modules.render import (
+    CHANGE, DELETE, EQUAL, IGNORED, INSERT, MOVED_FROM, MOVED_TO, REPLACE,
+    Hunk, RowTable, build_rows, group_rows, iter_table, iter_unified, render_table, rows_to_json
+)
+
+def test_build_rows():
+    lines1 = ["same\n", "hello world\n", "gone\n"]
+    lines2 = ["same\n", "hello there world\n", "something else entirely\n", "new\n"]
+    opcodes = [('equal', 0, 1, 0, 1), ('replace', 1, 3, 1, 4)]
+    assert build_rows(lines1, lines2, opcodes) == [
+        (EQUAL, 0, 0),
+        (CHANGE, 1, 1),
+        (REPLACE, 2, 2),
+        (INSERT, None, 3),
+    ]
+    assert build_rows(["a\n", "b\n"], [], [('delete', 0, 2, 0, 0)]) == [
+        (DELETE, 0, None), (DELETE, 1, None)
+    ]
+
+def test_build_rows_ignores_blank_lines():
+    rows = build_rows(["a\n"], ["a\n", "\n"], [('equal', 0, 1, 0, 1), ('insert', 1, 1, 1, 2)],
+                      ignore_blank_lines=True)
+    assert rows == [(EQUAL, 0, 0), (IGNORED, None, 1)]
+
+def test_group_rows():
+    rows = [(EQUAL, n, n) for n in range(30)]
+    rows[3] = (CHANGE, 3, 3)
+    rows[8] = (CHANGE, 8, 8)
+    rows[25] = (CHANGE, 25, 25)
+    assert group_rows(rows, 1) == [(2, 5), (7, 10), (24, 27)]
+    assert group_rows(rows, 2) == [(1, 11), (23, 28)]
+    assert group_rows(rows, 3) == [(0, 12), (22, 29)]
+    assert group_rows([(EQUAL, 0, 0)], 5) == []
+
+def test_render_table_markup():
+    html = render_table(
+        [(EQUAL, 0, 0), (CHANGE, 1, 1), (DELETE, 2, None)],
+        ["a<b>\n", "value = 1\n", "old\n"], ["a<b>\n", "value = 2\n"],
+        "left.txt", "right.txt"
+    )
+    assert '<th colspan="2" class="diff_header">left.txt</th>' in html
+    assert '<td class="diff_header" id="from-1">1</td><td nowrap="nowrap">a&lt;b&gt;</td>' in html
+    assert 'value = <span class="diff_chg">1</span>' in html
+    assert 'value = <span class="diff_chg">2</span>' in html
+    assert '<span class="diff_sub">old</span>' in html
+    assert html.count('<tbody') == 1
+    assert '<tbody data-rows="0-3">' in html
+
+def test_render_table_without_changes():
+    html = render_table([(EQUAL, 0, 0)], ["a\n"], ["a\n"], "l", "r")
+    assert 'class="diff_none"' in html
+
+def test_row_table_behaves_like_a_list_of_rows():
+    rows = RowTable.from_rows([(EQUAL, 0, 0), (DELETE, 1, None), (INSERT, None, 1)])
+    assert len(rows) == 3
+    assert rows[1] == (DELETE, 1, None)
+    assert rows[-1] == (INSERT, None, 1)
+    assert rows[1:] == [(DELETE, 1, None), (INSERT, None, 1)]
+    assert list(rows) == [(EQUAL, 0, 0), (DELETE, 1, None), (INSERT, None, 1)]
+    assert RowTable.from_rows(rows) is rows
+
+def test_rows_take_nine_bytes_each():
+    n = 100_000
+    lines = [f"a fairly long line of text number {k}\n" for k in range(n)]
+    tracemalloc.start()
+    try:
+        rows = build_rows(lines, lines, [('equal', 0, n, 0, n)])
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert rows.nbytes == 9 * n
+    # No per-row objects, and no copies of the text
+    assert current < 12 * n
+
+def test_hunks_are_slotted_ranges():
+    hunk = Hunk(2, 5)
+    assert not hasattr(hunk, '__dict__')
+    start, stop = hunk
+    assert (start, stop) == (2, 5)
+
+def test_iter_table_streams_hunks():
+    rows = [(EQUAL, n, n) for n in range(30)]
+    rows[3] = (CHANGE, 3, 3)
+    rows[25] = (CHANGE, 25, 25)
+    lines = [f"line {n}\n" for n in range(30)]
+    chunks = list(iter_table(rows, lines, lines, "l", "r", context=1))
+    # Header, one tbody per hunk, footer
+    assert len(chunks) == 4
+    assert ''.join(chunks) == render_table(rows, lines, lines, "l", "r", context=1)
+
+def test_rows_to_json():
+    lines1 = ["keep\n", "a\n", "b\n", "c\n", "old\n"]
+    lines2 = ["keep\n", "new\n", "a\n", "b\n", "c\n"]
+    rows = [(EQUAL, 0, 0), (INSERT, None, 1), (MOVED_FROM, 1, 2), (DELETE, 4, None)]
+    items = rows_to_json(rows, 1, 4, lines1, lines2, [Move(1, 2, 3)])
+    assert items == [
+        {'row': 1, 'kind': INSERT, 'old': None, 'new': 2, 'old_text': None, 'new_text': 'new'},
+        {'row': 2, 'kind': MOVED_FROM, 'old': 2, 'new': None, 'length': 3, 'moved_to': 3,
+         'old_text': 'a', 'new_text': None},
+        {'row': 3, 'kind': DELETE, 'old': 5, 'new': None, 'old_text': 'old', 'new_text': None},
+    ]
+
+def test_unified_matches_difflib():
+    randomizer = random.Random(7)
+    lines1 = [f"line {n}\n" for n in range(300)]
+    for _ in range(20):
+        lines2 = list(lines1)
+        for _ in range(randomizer.randint(1, 6)):
+            k = randomizer.randrange(len(lines2))
+            action = randomizer.choice(['change', 'delete', 'insert'])
+            if action == 'change':
+                lines2[k] = f"changed {k}\n"
+            elif action == 'delete':
+                del lines2[k]
+            else:
+                lines2.insert(k, f"inserted {k}\n")
+        opcodes = FileDiffer.match_lines(lines1, lines2)
+        rows = build_rows(lines1, lines2, opcodes)
+        ours = ''.join(iter_unified(rows, lines1, lines2, "a", "b", context=3))
+        assert ours == ''.join(difflib.unified_diff(lines1, lines2, "a", "b", n=3))
+
+def test_unified_shows_moves_as_removal_and_addition():
+    lines1 = ["a\n", "b\n", "c\n", "x\n"]
+    lines2 = ["x\n", "a\n", "b\n", "c\n"]
+    rows = [(MOVED_FROM, 0, 1), (EQUAL, 3, 0), (MOVED_TO, None, 1), (MOVED_TO, None, 2), (MOVED_TO, None, 3)]
+    unified = ''.join(iter_unified(rows, lines1, lines2, "a", "b", moves=[Move(0, 1, 3)]))
+    assert unified == (
+        "--- a\n+++ b\n@@ -1,4 +1,4 @@\n"
+        "-a\n-b\n-c\n x\n+a\n+b\n+c\n"
+    )
+
+def test_unified_marks_missing_newline():
+    rows = build_rows(["a"], ["b"], [('replace', 0, 1, 0, 1)])
+    unified = ''.join(iter_unified(rows, ["a"], ["b"], "l", "r"))
+    assert unified.endswith("-a\n\\ No newline at end of file\n+b\n\\ No newline at end of file\n")
+
+def test_unified_without_changes_is_empty():
+    assert list(iter_unified([(EQUAL, 0, 0)], ["a\n"], ["a\n"], "l", "r")) == []
+
+def test_rows_and_unified_endpoints(sample_files):
+    app.config.update(FILE1=sample_files[0], FILE2=sample_files[1])
+    try:
+        with app.test_client() as client:
+            response = client.get('/api/rows?start=0&stop=10&format=json')
+            assert response.status_code == 200
+            items = response.get_json()['items']
+            assert [item['kind'] for item in items] == [EQUAL, REPLACE, EQUAL, INSERT]
+            assert items[1]['new_text'] == 'Line 2 modified'
+            assert client.get('/api/rows?start=0&stop=10&format=xml').status_code == 400
+
+            response = client.get('/api/unified')
+            assert response.status_code == 200
+            assert response.mimetype == 'text/x-diff'
+            with open(sample_files[0]) as f1, open(sample_files[1]) as f2:
+                expected = ''.join(difflib.unified_diff(
+                    f1.readlines(), f2.readlines(), sample_files[0], sample_files[1]
+                ))
+            assert response.get_data(as_text=True) == expected
+    finally:
+        app.config.update(FILE1=None, FILE2=None)
@@ -0,0 +1,276 @@
+"""
+Tests for running a producer and web nodes over a message queue.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import pytest
+from unittest.mock import Mock
+from live_differ.modules.broker import (
+    UnixSocketBroker, UnixSocketManager, socketio_options, unix_socket_path
+)
+from live_differ.modules.cache import DiffCache
+from live_differ.modules.differ import DifferError, FileDiffer
+from live_differ.modules.shared import SharedState, SnapshotDiffer
+from live_differ.modules.watcher import FileChangeHandler
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def pair(tmp_path):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    file1.write_text("Line 1\nLine 2\nLine 3\n")
+    file2.write_text("Line 1\nLine 2 modified\nLine 3\n")
+    return str(file1), str(file2)
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = DiffCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    yield cache
+    cache.close()
+
+def test_unix_socket_path():
+    assert unix_socket_path('unix:///tmp/broker.sock') == '/tmp/broker.sock'
+    assert unix_socket_path('redis://localhost:6379') is None
+
+def test_socketio_options():
+    assert socketio_options(None) == {}
+    assert socketio_options('redis://localhost') == {'message_queue': 'redis://localhost'}
+    manager = socketio_options('unix:///tmp/broker.sock', write_only=True)['client_manager']
+    assert isinstance(manager, UnixSocketManager)
+    assert manager.write_only
+
+def test_broker_fans_out_to_subscribers(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    broker = UnixSocketBroker(path)
+    broker.start()
+    try:
+        subscribers = [UnixSocketManager(f"unix://{path}") for _ in range(2)]
+        received = [[] for _ in subscribers]
+
+        def listen(manager, messages):
+            for message in manager._listen():
+                messages.append(message)
+
+        for manager, messages in zip(subscribers, received):
+            threading.Thread(target=listen, args=(manager, messages), daemon=True).start()
+        deadline = time.time() + 5
+        while len(broker.subscribers) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        UnixSocketManager(f"unix://{path}", write_only=True)._publish({'method': 'emit', 'n': 1})
+        while any(not messages for messages in received) and time.time() < deadline:
+            time.sleep(0.05)
+        assert received == [[{'method': 'emit', 'n': 1}]] * 2
+    finally:
+        broker.stop()
+    assert not os.path.exists(path)
+
+def test_broker_keeps_concurrent_publishers_apart(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    broker = UnixSocketBroker(path)
+    broker.start()
+    try:
+        subscriber = UnixSocketManager(f"unix://{path}")
+        received = []
+
+        def listen():
+            for message in subscriber._listen():
+                received.append(message)
+
+        threading.Thread(target=listen, daemon=True).start()
+        deadline = time.time() + 10
+        while not broker.subscribers and time.time() < deadline:
+            time.sleep(0.05)
+
+        def publish(name):
+            publisher = UnixSocketManager(f"unix://{path}", write_only=True)
+            for n in range(10):
+                publisher._publish({'name': name, 'n': n, 'payload': name * 1_000_000})
+
+        publishers = [threading.Thread(target=publish, args=(name,)) for name in 'ab']
+        for thread in publishers:
+            thread.start()
+        for thread in publishers:
+            thread.join()
+        while len(received) < 20 and time.time() < deadline:
+            time.sleep(0.05)
+        # Large lines written at once arrive whole, none lost to interleaving
+        assert sorted((m['name'], m['n']) for m in received) == [
+            (name, n) for name in 'ab' for n in range(10)
+        ]
+    finally:
+        broker.stop()
+
+def test_shared_state_round_trip(pair, cache):
+    differ = FileDiffer(*pair, cache=cache)
+    state = SharedState(cache, *pair)
+    with pytest.raises(DifferError):
+        state.differ()
+    diff_data = differ.get_diff()
+    state.publish(differ, diff_data)
+
+    # A web node in another process only has the cache
+    reader = SharedState(cache, *pair)
+    snapshot_differ = reader.differ()
+    assert isinstance(snapshot_differ, SnapshotDiffer)
+    assert snapshot_differ.watch_paths() == []
+    assert snapshot_differ.get_diff() == diff_data
+    assert snapshot_differ.get_rows(0, 3)['rows'] == differ.get_rows(0, 3)['rows']
+    assert snapshot_differ.search('modified')['total'] == 1
+
+def test_shared_state_follows_new_versions(pair, cache):
+    differ = FileDiffer(*pair, cache=cache)
+    state = SharedState(cache, *pair)
+    first = state.publish(differ, differ.get_diff())
+    with open(pair[1], 'w') as f:
+        f.write("Line 1\nLine 2 changed again\nLine 3\n")
+    second = state.publish(differ, differ.get_diff())
+    assert first != second
+    assert 'changed again' in state.differ().get_diff()['diff_html']
+
+def test_web_node_serves_a_revision_side(tmp_path, cache, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    tracked = repo / "config.txt"
+    tracked.write_text("Line 1\nLine 2\nLine 3\n")
+    for args in (['init', '-q'], ['add', 'config.txt'], ['commit', '-q', '-m', 'initial']):
+        subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+            cwd=repo, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    tracked.write_text("Line 1\nLine 2 modified\nLine 3\n")
+    monkeypatch.chdir(repo)
+    differ = FileDiffer('HEAD:config.txt', 'config.txt', cache=cache)
+    diff_data = differ.get_diff()
+    SharedState(cache, 'HEAD:config.txt', 'config.txt').publish(differ, diff_data)
+
+    # The web node's copy of the working file isn't the published one
+    tracked.write_bytes(b"\x00\x01\x02")
+    snapshot_differ = SharedState(cache, 'HEAD:config.txt', 'config.txt').differ()
+    assert not snapshot_differ.is_binary()
+    assert snapshot_differ.get_diff() == diff_data
+    stats = snapshot_differ.get_stats()
+    assert not stats['identical'] and stats['changed'] == 1
+    snapshot_differ.update_search_index()
+    assert snapshot_differ.search('modified')['total'] == 1
+
+def test_watcher_publishes_before_emitting(pair, cache):
+    differ = FileDiffer(*pair, cache=cache)
+    calls = []
+    shared_state = Mock()
+    shared_state.publish.side_effect = lambda *args: calls.append('publish')
+    socket = Mock()
+    socket.emit.side_effect = lambda *args, **kwargs: calls.append('emit')
+    handler = FileChangeHandler(differ, socket, shared_state=shared_state)
+    event = Mock(is_directory=False, src_path=pair[0])
+    handler.on_modified(event)
+    assert calls == ['publish', 'emit']
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class PollingClient:
+    """A minimal socket.io client over engine.io long-polling."""
+
+    def __init__(self, port):
+        self.base = f"http://127.0.0.1:{port}/socket.io/?EIO=4&transport=polling"
+        handshake = self._request(self.base)
+        self.sid = json.loads(handshake[1:])['sid']
+        self.url = f"{self.base}&sid={self.sid}"
+        self._request(self.url, b'40')
+        self.events = []
+        self.closed = False
+        threading.Thread(target=self._poll, daemon=True).start()
+
+    def _request(self, url, data=None):
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30) as response:
+            return response.read().decode('utf-8')
+
+    def _poll(self):
+        while not self.closed:
+            try:
+                payload = self._request(self.url)
+            except OSError:
+                return
+            for packet in payload.split('\x1e'):
+                if packet == '2':
+                    self._request(self.url, b'3')
+                elif packet.startswith('42'):
+                    # Strip an ack id between the packet type and the payload
+                    body = packet[2:].lstrip('0123456789')
+                    self.events.append(json.loads(body))
+
+    def updates(self):
+        return [data for name, data in self.events if name == 'update_diff']
+
+def start_node(args, log_path):
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    log = open(log_path, 'w')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'live_differ', *args],
+        stdout=log, stderr=subprocess.STDOUT, env=env
+    )
+
+def wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+def test_producer_and_two_web_nodes(pair, tmp_path):
+    queue = f"unix://{tmp_path / 'broker.sock'}"
+    common = [*pair, '--message-queue', queue, '--cache-dir', str(tmp_path / 'cache')]
+    ports = [free_port(), free_port()]
+    nodes = [start_node([*common, '--role', 'producer'], tmp_path / 'producer.log')]
+    try:
+        assert wait_for(lambda: os.path.exists(unix_socket_path(queue)))
+        for port in ports:
+            nodes.append(start_node([*common, '--role', 'web', '--port', str(port)], tmp_path / f'web-{port}.log'))
+
+        def serving(port):
+            try:
+                return urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).status == 200
+            except OSError:
+                return False
+
+        for port in ports:
+            assert wait_for(lambda: serving(port))
+        # Every node serves the producer's diff and its row ranges
+        for port in ports:
+            rows = json.loads(urllib.request.urlopen(
+                f"http://127.0.0.1:{port}/api/rows?start=0&stop=3", timeout=5
+            ).read())
+            assert 'Line 2 modified' in rows['html']
+
+        clients = [PollingClient(port) for port in ports]
+        # Web nodes subscribe to the queue when their first client connects
+        time.sleep(1)
+        # Overwrite in place: truncating first would be a separate, debounced change
+        with open(pair[1], 'r+') as f:
+            f.write("Line 1\nLine 2 changed by the producer\nLine 3\n")
+
+        def updated(client):
+            return any('changed by the producer' in data['diff_html'] for data in client.updates())
+
+        assert wait_for(lambda: all(updated(client) for client in clients))
+        for client in clients:
+            client.closed = True
+        # And fetch the new version from the shared cache
+        for port in ports:
+            page = urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).read().decode('utf-8')
+            assert 'changed by the producer' in page
+    finally:
+        for node in nodes:
+            node.terminate()
+        for node in nodes:
+            node.wait(timeout=10)
@@ -0,0 +1,144 @@
+"""
+Tests for the search module.
+"""
+import pytest
+from unittest.mock import patch
+from live_differ.core import app
+from live_differ.modules import search
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.normalize import NormalizeOptions
+from live_differ.modules.search import LineIndex, get_line_index
+
+LINES = ["def alpha():\n", "    return 'Alpha'\n", "beta = 2\n", "alpha = beta\n"]
+
+@pytest.fixture
+def temp_files(tmp_path):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    common = [f"line {n}\n" for n in range(100)]
+    file1.write_text("".join(common[:50] + ["needle old\n"] + common[50:]))
+    file2.write_text("".join(common[:50] + ["needle new\n"] + common[50:] + ["last needle\n"]))
+    return str(file1), str(file2)
+
+@pytest.fixture
+def search_client(temp_files):
+    file1, file2 = temp_files
+    app.config.update(FILE1=file1, FILE2=file2)
+    with app.test_client() as client:
+        yield client
+    app.config.update(FILE1=None, FILE2=None)
+
+def test_search_ignores_case():
+    index = LineIndex()
+    index.update(LINES)
+    assert index.search("ALPHA") == [0, 1, 3]
+    assert index.search("beta") == [2, 3]
+    assert index.search("missing") == []
+    assert index.search("") == []
+
+def test_short_queries_scan_every_line():
+    index = LineIndex()
+    index.update(LINES)
+    assert index.search("=") == [2, 3]
+
+def test_duplicate_lines_all_match():
+    index = LineIndex()
+    index.update(["x = 1\n", "y\n", "x = 1\n"])
+    assert index.search("x = 1") == [0, 2]
+
+def test_update_only_indexes_changed_lines():
+    index = LineIndex()
+    lines = [f"line number {n}\n" for n in range(1000)]
+    index.update(lines)
+    with patch.object(search, '_grams', wraps=search._grams) as grams:
+        assert index.update(lines[:10] + ["inserted line\n"] + lines[10:])
+        assert grams.call_count == 1
+        assert not index.update(list(index.lines))
+        assert grams.call_count == 1
+    assert index.search("inserted") == [10]
+    assert index.search("number 10\n") == [11]
+
+def test_update_drops_removed_lines():
+    index = LineIndex()
+    index.update(["only here\n", "kept\n"])
+    index.update(["kept\n"])
+    assert index.search("only") == []
+    assert "onl" not in index.postings
+
+def test_get_line_index_is_shared():
+    index = get_line_index("shared-key", ["a\n"])
+    assert get_line_index("shared-key", ["b\n"]) is index
+    assert index.lines == ["b\n"]
+
+def test_differ_search_returns_rows(temp_files):
+    file1, file2 = temp_files
+    result = FileDiffer(file1, file2).search("needle")
+    assert result['total'] == 3
+    sides = [(m['side'], m['line']) for m in result['matches']]
+    assert sides == [('from', 51), ('to', 51), ('to', 102)]
+    rows = [m['row'] for m in result['matches']]
+    assert rows == sorted(rows)
+    assert result['matches'][0]['anchor'] == 'from-51'
+    assert result['matches'][0]['item'] == 50
+
+def test_search_reports_file_lines_of_segments(tmp_path):
+    file1 = tmp_path / "a.js"
+    file2 = tmp_path / "b.js"
+    minified = "".join(f"var v{n} = {n};" for n in range(2000))
+    file1.write_text("// header\n" + minified + "\n")
+    file2.write_text("// header\n" + minified.replace("v1500 ", "needle ") + "\n")
+    match = FileDiffer(str(file1), str(file2)).search("needle")['matches'][0]
+    # A segment of the second line, well past its first item
+    assert match['line'] == 2 and match['item'] > 1
+
+def test_search_in_structure_mode_has_no_file_line(tmp_path):
+    file1 = tmp_path / "a.json"
+    file2 = tmp_path / "b.json"
+    file1.write_text('{"b": 1, "a": "needle"}\n')
+    file2.write_text('{"a": "needle", "b": 2}\n')
+    differ = FileDiffer(str(file1), str(file2), normalize=NormalizeOptions(structure='auto'))
+    matches = differ.search("needle")['matches']
+    assert [(m['item'], m['line']) for m in matches] == [(0, None), (0, None)]
+
+def test_differ_search_paging(temp_files):
+    file1, file2 = temp_files
+    differ = FileDiffer(file1, file2)
+    everything = differ.search("line", limit=1000)
+    page = differ.search("line", offset=10, limit=5)
+    assert page['total'] == everything['total'] == 200
+    assert page['matches'] == everything['matches'][10:15]
+
+def test_differ_search_in_moved_block(tmp_path):
+    block = [f"moved {n}\n" for n in range(5)]
+    file1 = tmp_path / "a.txt"
+    file2 = tmp_path / "b.txt"
+    rest = [f"rest {n}\n" for n in range(10)]
+    file1.write_text("".join(block + rest))
+    file2.write_text("".join(rest + block))
+    match = FileDiffer(str(file1), str(file2)).search("moved 3")['matches']
+    # The old position is the block's single summary row
+    assert [m['anchor'] for m in match] == ['from-1', 'to-14']
+
+def test_get_rows_renders_trimmed_rows(temp_files):
+    file1, file2 = temp_files
+    differ = FileDiffer(file1, file2)
+    assert 'id="from-1"' not in differ.get_diff()['diff_html']
+    rows = differ.get_rows(0, 3)
+    assert rows['start'] == 0 and rows['stop'] == 3
+    assert '<tbody data-rows="0-3">' in rows['html']
+    assert 'id="from-1"' in rows['html']
+    assert differ.get_rows(500, 600)['html'].count('<tr') == 0
+
+def test_search_api(search_client):
+    response = search_client.get('/api/search?q=needle&limit=2')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['total'] == 3
+    assert len(data['matches']) == 2
+    assert search_client.get('/api/search').status_code == 400
+
+def test_rows_api(search_client):
+    response = search_client.get('/api/rows?start=0&stop=2')
+    assert response.status_code == 200
+    assert 'id="to-2"' in response.get_json()['html']
+    assert search_client.get('/api/rows?start=0').status_code == 400
@@ -0,0 +1,79 @@
+import json
+import random
+
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.segments import (
+    LONG_LINE, MAX_SEGMENT, MIN_SEGMENT, SegmentedLines, line_count, segment_line, segment_lines
+)
+
+
+def minified(count, seed=1):
+    rng = random.Random(seed)
+    items = [{"id": i, "name": f"item{i}", "v": rng.random()} for i in range(count)]
+    return json.dumps(items, separators=(',', ':'))
+
+
+def test_short_lines_are_returned_as_they_are():
+    lines = ['a\n', 'b' * (LONG_LINE - 1) + '\n']
+    assert segment_lines(lines) is lines
+
+
+def test_segments_rebuild_the_line():
+    line = minified(2000) + '\n'
+    segments = segment_line(line)
+    assert ''.join(segments) == line
+    assert len(segments) > 1
+    assert all(len(segment) <= MAX_SEGMENT for segment in segments)
+    assert all(len(segment) >= MIN_SEGMENT for segment in segments[:-1])
+    assert [segment.endswith('\n') for segment in segments].count(True) == 1
+
+
+def test_text_without_delimiters_is_segmented():
+    rng = random.Random(2)
+    line = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(20_000))
+    segments = segment_line(line)
+    assert ''.join(segments) == line
+    assert len(segments) > 1
+
+
+def test_insertion_changes_only_nearby_segments():
+    line = minified(2000)
+    middle = len(line) // 2
+    edited = line[:middle] + '"inserted",' + line[middle:]
+    before, after = segment_line(line), segment_line(edited)
+    assert len(set(before) ^ set(after)) <= 4
+
+
+def test_segmented_lines_are_numbered_by_line_and_column():
+    long_line = minified(2000) + '\n'
+    lines = segment_lines(['first\n', long_line, 'last\n'])
+    assert isinstance(lines, SegmentedLines)
+    assert ''.join(lines) == 'first\n' + long_line + 'last\n'
+    assert lines.label(0) == '1'
+    assert lines.label(1) == '2:1'
+    assert lines.label(2) == f"2:{len(lines[1]) + 1}"
+    assert lines.label(len(lines) - 1) == '3'
+    assert lines.continues(1)
+    assert not lines.continues(len(lines) - 2)
+    assert line_count(lines) == 3
+    assert segment_lines(lines) is lines
+
+
+def test_minified_file_diff_shows_positions(tmp_path):
+    line = minified(5000)
+    middle = len(line) // 2
+    file1 = tmp_path / 'a.json'
+    file2 = tmp_path / 'b.json'
+    file1.write_text(line)
+    file2.write_text(line[:middle] + '"inserted",' + line[middle:])
+    differ = FileDiffer(str(file1), str(file2))
+    diff_html = differ.get_diff()['diff_html']
+    assert 'inserted' in diff_html
+    assert '>1:' in diff_html
+    # Only the hunk around the insertion is shown, not the whole file
+    assert len(diff_html) < len(line) // 10
+    stats = differ.get_stats()
+    assert stats['lines'] == {'file1': 1, 'file2': 1}
+    assert not stats['identical']
+    unified = ''.join(differ.iter_unified())
+    assert '+' in unified and 'No newline' not in unified
@@ -0,0 +1,309 @@
+"""
+Tests for the sessions module.
+"""
+import time
+import pytest
+from unittest.mock import Mock, patch
+from typer.testing import CliRunner
+from watchdog.events import FileModifiedEvent
+from live_differ.cli import cli
+from live_differ.core import app, socketio
+from live_differ.modules import highlight, search
+from live_differ.modules.normalize import NormalizeOptions
+from live_differ.modules.sessions import SessionError, SessionManager
+
+@pytest.fixture
+def pair(tmp_path):
+    file1 = tmp_path / "file1.txt"
+    file2 = tmp_path / "file2.txt"
+    file1.write_text("Line 1\nLine 2\n")
+    file2.write_text("Line 1\nLine 2 modified\n")
+    return str(file1), str(file2)
+
+@pytest.fixture
+def manager():
+    manager = SessionManager(Mock(), idle_timeout=60, max_workers=2)
+    yield manager
+    manager.stop()
+
+@pytest.fixture
+def daemon_client(pair):
+    manager = SessionManager(socketio, idle_timeout=60)
+    app.config['SESSIONS'] = manager
+    with app.test_client() as client:
+        yield client, manager
+    app.config['SESSIONS'] = None
+    manager.stop()
+
+def test_create_get_delete(manager, pair):
+    session = manager.create(*pair)
+    assert manager.get(session.id) is session
+    assert [s.id for s in manager.list()] == [session.id]
+    assert session.url == f"/s/{session.id}"
+    assert session.to_dict()['file1'] == pair[0]
+    manager.delete(session.id)
+    with pytest.raises(SessionError):
+        manager.get(session.id)
+    manager.socket.emit.assert_called_with(
+        'session_closed', {'id': session.id}, namespace='/', to=session.room
+    )
+
+def test_deleting_sessions_releases_their_files(manager, tmp_path):
+    file1 = tmp_path / "a.py"
+    file2 = tmp_path / "b.py"
+    other = tmp_path / "c.py"
+    file1.write_text("x = 1\n")
+    file2.write_text("x = 2\n")
+    other.write_text("x = 3\n")
+    first = manager.create(str(file1), str(file2), highlight=True)
+    second = manager.create(str(file1), str(other), highlight=True)
+    for session in (first, second):
+        session.differ.get_diff()
+        session.differ.search("x")
+    manager.delete(first.id)
+    # The file both sessions show is kept for the one still open
+    assert set(search._indexes) >= {str(file1), str(other)}
+    assert str(file2) not in search._indexes
+    if highlight.PYGMENTS_AVAILABLE:
+        assert str(file1) in highlight._highlighters
+        assert str(file2) not in highlight._highlighters
+    manager.delete(second.id)
+    assert not {str(file1), str(other)} & set(search._indexes)
+    assert not {str(file1), str(other)} & set(highlight._highlighters)
+
+def test_create_rejects_missing_files(manager, tmp_path):
+    with pytest.raises(SessionError, match="File not found"):
+        manager.create(str(tmp_path / "missing.txt"), str(tmp_path / "other.txt"))
+
+def test_sessions_share_directory_watches(manager, pair):
+    first = manager.create(*pair)
+    second = manager.create(*pair, normalize=NormalizeOptions(ignore_case=True))
+    assert len(manager.watches) == 1
+    assert len(manager.observer.emitters) == 1
+    manager.delete(first.id)
+    assert len(manager.watches) == 1
+    manager.delete(second.id)
+    assert manager.watches == {}
+    assert len(manager.observer.emitters) == 0
+
+def test_events_are_dispatched_on_the_pool(manager, pair):
+    session = manager.create(*pair)
+    other = manager.create(pair[1], pair[1])
+    with patch.object(session.handler, 'on_modified') as first, \
+         patch.object(other.handler, 'on_modified') as second:
+        manager.handler.on_modified(FileModifiedEvent(pair[0]))
+        manager.pool.shutdown(wait=True)
+        first.assert_called_once()
+        second.assert_not_called()
+
+def test_evict_idle_sessions(manager, pair):
+    idle = manager.create(*pair)
+    viewed = manager.create(*pair)
+    manager.join("sid-1", viewed.id)
+    later = time.time() + 120
+    assert manager.evict_idle(now=later) == [idle.id]
+    assert manager.get(viewed.id) is viewed
+    manager.leave("sid-1")
+    assert viewed.clients == 0
+    assert manager.evict_idle(now=time.time() + 120) == [viewed.id]
+
+def test_reaper_evicts_in_background(pair):
+    manager = SessionManager(Mock(), idle_timeout=0.2)
+    manager.start()
+    try:
+        manager.create(*pair)
+        deadline = time.time() + 5
+        while manager.list() and time.time() < deadline:
+            time.sleep(0.1)
+        assert manager.list() == []
+    finally:
+        manager.stop()
+
+def test_session_api(daemon_client, pair):
+    client, manager = daemon_client
+    response = client.post('/api/sessions', json={"file1": pair[0], "file2": pair[1], "ignore_case": True})
+    assert response.status_code == 201
+    session = response.get_json()
+    assert session['normalize']['ignore_case'] is True
+    assert [s['id'] for s in client.get('/api/sessions').get_json()['sessions']] == [session['id']]
+    assert client.get(f"/api/sessions/{session['id']}").status_code == 200
+
+    page = client.get(session['url'])
+    assert page.status_code == 200
+    assert b"modified" in page.data
+    assert f'"/s/{session["id"]}"'.encode() in page.data
+    search = client.get(f"{session['url']}/api/search?q=modified").get_json()
+    assert search['total'] == 1
+    assert client.get(f"{session['url']}/api/history").status_code == 200
+
+    assert client.delete(f"/api/sessions/{session['id']}").status_code == 204
+    assert client.get(session['url']).status_code == 404
+    assert client.get(f"{session['url']}/api/search?q=x").status_code == 404
+    assert client.delete(f"/api/sessions/{session['id']}").status_code == 404
+
+def test_session_api_errors(daemon_client, tmp_path):
+    client, _ = daemon_client
+    assert client.post('/api/sessions', json={"file1": "a"}).status_code == 400
+    response = client.post('/api/sessions', json={"file1": str(tmp_path / "x"), "file2": str(tmp_path / "y")})
+    assert response.status_code == 400
+    assert "File not found" in response.get_json()['error']
+
+def test_session_api_is_same_origin_only(daemon_client, pair):
+    client, manager = daemon_client
+    body = {"file1": pair[0], "file2": pair[1]}
+    response = client.post('/api/sessions', json=body, headers={"Origin": "http://evil.example"})
+    assert response.status_code == 403
+    assert 'Access-Control-Allow-Origin' not in response.headers
+    assert manager.list() == []
+    response = client.post('/api/sessions', json=body, headers={"Origin": "http://localhost"})
+    assert response.status_code == 201
+    assert 'Access-Control-Allow-Origin' not in response.headers
+    rows = client.get(f"{response.get_json()['url']}/api/rows", headers={"Origin": "http://evil.example"})
+    assert rows.status_code == 403
+
+def test_sessions_are_confined_to_the_roots(pair, tmp_path):
+    allowed = tmp_path / "allowed"
+    allowed.mkdir()
+    inside = allowed / "file.txt"
+    inside.write_text("x\n")
+    manager = SessionManager(Mock(), idle_timeout=0, roots=[str(allowed)])
+    try:
+        with pytest.raises(SessionError, match="outside the allowed roots"):
+            manager.create(pair[0], str(inside))
+        escape = allowed / "link.txt"
+        escape.symlink_to(pair[0])
+        with pytest.raises(SessionError, match="outside the allowed roots"):
+            manager.create(str(inside), str(escape))
+        with pytest.raises(SessionError, match="outside the allowed roots"):
+            manager.create_set(str(inside), [pair[1]])
+        assert manager.create(str(inside), str(inside)).differ.file1_path == str(inside)
+    finally:
+        manager.stop()
+
+def test_session_api_requires_daemon():
+    with app.test_client() as client:
+        assert client.get('/api/sessions').status_code == 404
+
+def test_updates_go_to_the_session_room(daemon_client, pair):
+    client, manager = daemon_client
+    session = manager.create(*pair)
+    other = manager.create(*pair)
+    viewer = socketio.test_client(app, flask_test_client=client)
+    bystander = socketio.test_client(app, flask_test_client=client)
+    viewer.emit('join', {'session': session.id})
+    bystander.emit('join', {'session': other.id})
+    assert session.clients == 1
+    viewer.get_received()
+    bystander.get_received()
+
+    session.handler.on_modified(FileModifiedEvent(pair[1]))
+    assert 'update_diff' in [message['name'] for message in viewer.get_received()]
+    assert bystander.get_received() == []
+
+    viewer.disconnect()
+    assert session.clients == 0
+    bystander.disconnect()
+
+def test_cli_requires_files_without_daemon():
+    result = CliRunner().invoke(cli, [])
+    assert result.exit_code == 1
+    assert "FILE1 and FILE2 are required unless --daemon is given" in result.output
+
+@pytest.fixture
+def variants(tmp_path):
+    reference = tmp_path / "golden.conf"
+    reference.write_text("host = golden\nport = 80\nworkers = 4\n")
+    paths = []
+    for n in range(3):
+        variant = tmp_path / f"host{n}.conf"
+        variant.write_text(f"host = host{n}\nport = 80\nworkers = {4 + n}\n")
+        paths.append(str(variant))
+    return str(reference), paths
+
+def test_compare_set_shares_the_reference(manager, variants):
+    reference, paths = variants
+    compare_set = manager.create_set(reference, paths)
+    assert manager.get_set(compare_set.id) is compare_set
+    assert len(compare_set.sessions) == 3
+    assert {id(session.differ.reference) for session in compare_set.sessions} == {id(compare_set.reference)}
+    # The reference is watched once per variant, in one directory watch
+    assert len(manager.watches) == 1
+    # ...and its timeline is shared, so it is recorded once
+    histories = {id(session.history) for session in compare_set.sessions}
+    assert len(histories) == 1
+    assert len(compare_set.sessions[0].history.to_dict()) == 4
+
+    summary = manager.summary(compare_set.id)
+    stats = [variant['stats'] for variant in summary['variants']]
+    assert [variant['file'] for variant in summary['variants']] == paths
+    assert [s['changed'] for s in stats] == [1, 2, 2]
+    assert stats[0]['identical'] is False
+
+def test_compare_set_dispatches_reference_edits_to_every_variant(manager, variants):
+    reference, paths = variants
+    compare_set = manager.create_set(reference, paths)
+    first, second, third = compare_set.sessions
+    with patch.object(first.handler, 'on_modified') as on_first, \
+         patch.object(second.handler, 'on_modified') as on_second, \
+         patch.object(third.handler, 'on_modified') as on_third:
+        manager.handler.on_modified(FileModifiedEvent(paths[1]))
+        manager.handler.on_modified(FileModifiedEvent(reference))
+        manager.pool.shutdown(wait=True)
+        assert on_first.call_count == 1
+        assert on_second.call_count == 2
+        assert on_third.call_count == 1
+
+def test_compare_set_with_a_binary_reference(manager, tmp_path):
+    reference = tmp_path / "golden.bin"
+    reference.write_bytes(b"\x00\x01" * 100)
+    variant = tmp_path / "host.bin"
+    variant.write_bytes(b"\x00\x01" * 50 + b"\x02" + b"\x00\x01" * 50)
+    compare_set = manager.create_set(str(reference), [str(variant)])
+    summary = manager.summary(compare_set.id)
+    assert summary['variants'][0]['stats']['binary']
+    assert summary['variants'][0]['stats']['added'] == 1
+
+def test_compare_set_rejects_bad_input(manager, variants, tmp_path):
+    reference, paths = variants
+    with pytest.raises(SessionError, match="At least one variant"):
+        manager.create_set(reference, [])
+    with pytest.raises(SessionError, match="can't also be a variant"):
+        manager.create_set(reference, [reference])
+    with pytest.raises(SessionError, match="File not found"):
+        manager.create_set(reference, paths + [str(tmp_path / "missing.conf")])
+    assert manager.list() == []
+
+def test_compare_set_is_evicted_as_a_whole(manager, variants):
+    reference, paths = variants
+    compare_set = manager.create_set(reference, paths)
+    manager.join("sid-1", compare_set.sessions[0].id)
+    assert manager.evict_idle(now=time.time() + 120) == []
+    manager.leave("sid-1")
+    evicted = manager.evict_idle(now=time.time() + 120)
+    assert sorted(evicted) == sorted(session.id for session in compare_set.sessions)
+    assert manager.list_sets() == []
+    assert manager.list() == []
+
+def test_compare_api(daemon_client, variants):
+    client, manager = daemon_client
+    reference, paths = variants
+    response = client.post('/api/compare', json={"reference": reference, "variants": paths})
+    assert response.status_code == 201
+    compare_set = response.get_json()
+    assert [s['id'] for s in client.get('/api/compare').get_json()['sets']] == [compare_set['id']]
+
+    page = client.get(compare_set['url'])
+    assert page.status_code == 200
+    for variant in compare_set['variants']:
+        assert variant['url'].encode() in page.data
+        # Each variant drills down to its own session page
+        assert client.get(variant['url']).status_code == 200
+
+    summary = client.get(f"/api/compare/{compare_set['id']}").get_json()
+    assert [variant['stats']['changed'] for variant in summary['variants']] == [1, 2, 2]
+
+    assert client.delete(f"/api/compare/{compare_set['id']}").status_code == 204
+    assert manager.list() == []
+    assert client.get(compare_set['url']).status_code == 404
+    assert client.get(f"/api/compare/{compare_set['id']}").status_code == 404
+    assert client.post('/api/compare', json={"reference": reference}).status_code == 400
@@ -0,0 +1,108 @@
+"""
+Tests for the singleflight module.
+"""
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from live_differ.cli import start_single_pair
+from live_differ.core import app
+from live_differ.modules import differ
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.singleflight import SingleFlight
+
+def run_concurrently(target, count=10):
+    results = [None] * count
+    errors = [None] * count
+    barrier = threading.Barrier(count)
+
+    def worker(n):
+        barrier.wait()
+        try:
+            results[n] = target()
+        except Exception as e:
+            errors[n] = e
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "diff"
+
+    results, errors = run_concurrently(lambda: flight.do("key", compute))
+    assert results == ["diff"] * 10
+    assert errors == [None] * 10
+    assert len(calls) == 1
+    assert flight.computed == 1
+    assert flight.shared == 9
+    # Nothing is kept by default, so a later call computes again
+    assert flight.do("key", compute) == "diff"
+    assert len(calls) == 2
+
+def test_errors_are_shared_but_not_kept():
+    flight = SingleFlight(keep=2)
+    compute = Mock(side_effect=lambda: time.sleep(0.2) or 1 / 0)
+    results, errors = run_concurrently(lambda: flight.do("key", compute))
+    assert all(isinstance(e, ZeroDivisionError) for e in errors)
+    assert compute.call_count == 1
+    compute.side_effect = None
+    compute.return_value = "ok"
+    assert flight.do("key", compute) == "ok"
+
+def test_keeps_most_recent_results():
+    flight = SingleFlight(keep=2)
+    for key in ("a", "b", "a", "c"):
+        flight.do(key, lambda: key.upper())
+    assert list(flight.results) == ["a", "c"]
+    flight.forget()
+    assert not flight.results
+
+def test_different_keys_compute_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.computed == 2
+
+def test_concurrent_get_diff_renders_once(sample_files):
+    render = FileDiffer.make_diff_table
+
+    def slow_render(*args, **kwargs):
+        time.sleep(0.2)
+        return render(*args, **kwargs)
+
+    with patch.object(FileDiffer, 'make_diff_table', side_effect=slow_render) as mock_render:
+        # Every request builds its own differ, like the index route
+        results, errors = run_concurrently(lambda: FileDiffer(*sample_files).get_diff())
+    assert errors == [None] * 10
+    assert mock_render.call_count == 1
+    assert len({result['diff_html'] for result in results}) == 1
+
+def test_new_version_is_not_served_from_older_result(sample_files):
+    first = FileDiffer(*sample_files).get_diff()
+    with open(sample_files[1], 'w') as f:
+        f.write("Completely different\n")
+    second = FileDiffer(*sample_files).get_diff()
+    assert "Completely" in second['diff_html']
+    assert second['diff_html'] != first['diff_html']
+
+def test_start_single_pair_warms_diff(sample_files):
+    app.config.update(DIFF_CACHE=None, HIGHLIGHT=False, NORMALIZE=None)
+    try:
+        with patch('live_differ.cli.Observer'):
+            start_single_pair(*sample_files, Mock(), 0, False, Mock())
+        assert len(differ._tables.results) == 1
+        with patch.object(FileDiffer, 'make_diff_table') as mock_render, app.test_client() as client:
+            assert client.get('/').status_code == 200
+            mock_render.assert_not_called()
+    finally:
+        app.config.update(FILE1=None, FILE2=None, HISTORY=None)
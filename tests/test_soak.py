@@ -0,0 +1,33 @@
+"""
+Tests for the end-to-end latency soak harness (scripts/soak.py).
+"""
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOAK = os.path.join(PROJECT_ROOT, 'scripts', 'soak.py')
+
+def test_soak_reports_latency_and_update_accounting(tmp_path):
+    output = tmp_path / "soak.jsonl"
+    result = subprocess.run(
+        [sys.executable, SOAK, '--clients', '2', '--rate', '5', '--duration', '2',
+         '--lines', '200', '--warmup', '0.5', '--per-client', '--output', str(output)],
+        capture_output=True, text=True, timeout=120, cwd=tmp_path
+    )
+    assert result.returncode == 0, result.stderr
+    runs = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(runs) == 1
+    run = runs[0]
+    assert run['writes'] >= 4
+    latency = run['latency_ms']
+    assert latency['count'] >= 2
+    assert 0 < latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+    assert set(run['updates']) == {'received', 'duplicates', 'out_of_order', 'superseded', 'missed_final'}
+    assert run['updates']['duplicates'] == 0
+    # The last write of a burst is always diffed and delivered
+    assert run['updates']['missed_final'] == 0
+    assert len(run['clients']) == 2
+    if sys.platform.startswith('linux'):
+        assert run['server']['rss_mb']['max'] > 0
@@ -0,0 +1,139 @@
+"""
+Tests for the stats module.
+"""
+import hashlib
+import os
+import pytest
+from unittest.mock import patch
+from live_differ.core import app
+from live_differ.modules.cache import DiffCache
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.normalize import NormalizeOptions
+from live_differ.modules.stats import diff_stats
+
+def test_counts_from_opcodes():
+    file1 = ["a\n", "b\n", "c\n", "d\n"]
+    file2 = ["a\n", "B\n", "c\n", "d\n", "e\n"]
+    opcodes = FileDiffer.match_lines(file1, file2)
+    stats = diff_stats(file1, file2, opcodes, context=5)
+    assert stats == {'added': 1, 'removed': 0, 'changed': 1, 'hunks': 1, 'similarity': round(6 / 9, 6)}
+
+def test_replace_leftovers_are_added_or_removed():
+    opcodes = [('replace', 0, 3, 0, 1)]
+    stats = diff_stats(["a\n", "b\n", "c\n"], ["x\n"], opcodes, context=5)
+    assert (stats['changed'], stats['removed'], stats['added']) == (1, 2, 0)
+
+def test_hunks_follow_table_grouping():
+    file1 = [f"{n}\n" for n in range(40)]
+    file2 = list(file1)
+    file2[2] = "changed\n"
+    file2[8] = "changed\n"   # within 2 * context of the first change
+    file2[30] = "changed\n"
+    opcodes = FileDiffer.match_lines(file1, file2)
+    assert diff_stats(file1, file2, opcodes, context=5)['hunks'] == 2
+    assert diff_stats(file1, file2, opcodes, context=2)['hunks'] == 3
+
+def test_ignored_blank_lines_dont_count():
+    file1 = ["a\n", "b\n"]
+    file2 = ["a\n", "\n", "b\n"]
+    opcodes = FileDiffer.match_lines(file1, file2)
+    assert diff_stats(file1, file2, opcodes, 5)['added'] == 1
+    stats = diff_stats(file1, file2, opcodes, 5, ignore_blank_lines=True)
+    assert (stats['added'], stats['hunks']) == (0, 0)
+
+def test_empty_files_are_similar():
+    assert diff_stats([], [], [], 5)['similarity'] == 1.0
+
+def test_differ_stats(sample_files):
+    stats = FileDiffer(*sample_files).get_stats()
+    assert stats['identical'] is False
+    assert (stats['added'], stats['removed'], stats['changed'], stats['hunks']) == (1, 0, 1, 1)
+    assert stats['lines'] == {'file1': 3, 'file2': 4}
+    # Checksums of the files themselves, whatever the diff mode
+    with open(sample_files[1], 'rb') as f:
+        assert stats['hashes']['file2'] == hashlib.sha256(f.read()).hexdigest()
+    assert stats['sizes']['file1'] == os.path.getsize(sample_files[0])
+
+def test_identical_files_skip_opcodes(tmp_path):
+    file1 = tmp_path / "a.txt"
+    file2 = tmp_path / "b.txt"
+    file1.write_text("same\ncontent\n")
+    file2.write_text("same\ncontent\n")
+    with patch.object(FileDiffer, 'match_lines') as mock_match:
+        stats = FileDiffer(str(file1), str(file2)).get_stats()
+        mock_match.assert_not_called()
+    assert stats['identical'] is True
+    assert stats['similarity'] == 1.0
+    assert stats['hashes']['file1'] == stats['hashes']['file2']
+
+def test_normalized_differences_are_identical(tmp_path):
+    file1 = tmp_path / "a.txt"
+    file2 = tmp_path / "b.txt"
+    file1.write_text("Same\n")
+    file2.write_text("same\n")
+    differ = FileDiffer(str(file1), str(file2), normalize=NormalizeOptions(ignore_case=True))
+    stats = differ.get_stats()
+    assert stats['identical'] is True
+    assert stats['hashes']['file1'] != stats['hashes']['file2']
+
+def test_unchanged_pair_is_not_reread(sample_files):
+    FileDiffer(*sample_files).get_stats()
+    with patch.object(FileDiffer, 'read_file') as mock_read:
+        FileDiffer(*sample_files).get_stats()
+        mock_read.assert_not_called()
+
+def test_stats_follow_changes(sample_files):
+    assert FileDiffer(*sample_files).get_stats()['identical'] is False
+    with open(sample_files[0]) as f:
+        content = f.read()
+    with open(sample_files[1], 'w') as f:
+        f.write(content)
+    assert FileDiffer(*sample_files).get_stats()['identical'] is True
+
+def test_same_size_rewrite_within_mtime_granularity(sample_files):
+    before = FileDiffer(*sample_files).get_stats()
+    stat = os.stat(sample_files[1])
+    with open(sample_files[1], 'r+') as f:
+        content = f.read()
+        f.seek(0)
+        f.write(content.replace('Line 2 modified', 'Line 2 Line 2 '))
+    # In place, same size, and no tick of the mtime clock
+    os.utime(sample_files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(sample_files[1]).st_ino == stat.st_ino
+    after = FileDiffer(*sample_files).get_stats()
+    assert after['hashes'] != before['hashes']
+    assert after['identical'] is False and after['similarity'] != before['similarity']
+
+def test_structure_mode_hashes_the_files(tmp_path):
+    file1 = tmp_path / "a.json"
+    file2 = tmp_path / "b.json"
+    file1.write_text('{"a": 1}\n')
+    file2.write_text('{"a": 2}\n')
+    stats = FileDiffer(str(file1), str(file2), normalize=NormalizeOptions(structure='auto')).get_stats()
+    assert stats['hashes']['file1'] == hashlib.sha256(file1.read_bytes()).hexdigest()
+
+def test_stats_use_persistent_cache(sample_files, tmp_path):
+    cache = DiffCache(str(tmp_path / "cache"))
+    first = FileDiffer(*sample_files, cache=cache).get_stats()
+    from live_differ.modules import differ
+    differ._stats.forget()
+    with patch.object(FileDiffer, 'match_lines') as mock_match:
+        assert FileDiffer(*sample_files, cache=cache).get_stats() == first
+        mock_match.assert_not_called()
+
+def test_stats_endpoint(sample_files):
+    app.config.update(FILE1=sample_files[0], FILE2=sample_files[1])
+    try:
+        with app.test_client() as client, \
+             patch.object(FileDiffer, 'make_diff_table') as mock_render:
+            response = client.get('/api/stats')
+            assert response.status_code == 200
+            assert response.get_json()['changed'] == 1
+            mock_render.assert_not_called()
+    finally:
+        app.config.update(FILE1=None, FILE2=None)
+
+def test_stats_endpoint_without_files():
+    app.config.update(FILE1=None, FILE2=None)
+    with app.test_client() as client:
+        assert client.get('/api/stats').status_code == 400
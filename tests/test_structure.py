@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from live_differ.modules.differ import DifferError, FileDiffer
+from live_differ.modules.normalize import NormalizeOptions
+from live_differ.modules.structure import (
+    YAML_AVAILABLE, document_format, match_documents, parse_document
+)
+
+
+def document(value):
+    return parse_document(json.dumps(value, indent=2).splitlines(True), 'json')
+
+
+def changed(opcodes):
+    return [opcode for opcode in opcodes if opcode[0] != 'equal']
+
+
+def _differ(tmp_path, text1, text2, structure='auto', suffix='.json'):
+    file1 = tmp_path / f"a{suffix}"
+    file2 = tmp_path / f"b{suffix}"
+    file1.write_text(text1)
+    file2.write_text(text2)
+    return FileDiffer(str(file1), str(file2), normalize=NormalizeOptions(structure=structure))
+
+
+def test_document_format():
+    assert document_format('a.json', 'auto') == 'json'
+    assert document_format('a.YML', 'auto') == 'yaml'
+    assert document_format('a.txt', 'auto') is None
+    assert document_format('a.txt', 'json') == 'json'
+    assert document_format('a.json', None) is None
+
+
+def test_flattened_lines_name_their_paths():
+    lines = document({"b": [1, {"c": None}], "a": "x", "odd key": {}, "e": []})
+    assert list(lines) == [
+        'a: "x"\n',
+        'b[0]: 1\n',
+        'b[1].c: null\n',
+        'e: []\n',
+        '["odd key"]: {}\n',
+    ]
+
+
+def test_key_order_doesnt_matter():
+    first = document({"a": 1, "b": {"c": 2, "d": 3}})
+    second = document({"b": {"d": 3, "c": 2}, "a": 1})
+    assert first.root.hash == second.root.hash
+    assert list(first) == list(second)
+    assert changed(match_documents(first, second)) == []
+
+
+def test_only_differing_paths_are_reported():
+    first = document({"a": 1, "big": {str(n): n for n in range(100)}, "z": "old"})
+    second = document({"a": 1, "big": {str(n): n for n in range(100)}, "z": "new", "y": True})
+    opcodes = match_documents(first, second)
+    # The unchanged subtree is one opcode, whatever its size
+    assert opcodes[0] == ('equal', 0, 101, 0, 101)
+    # Paths added next to a changed one make one replaced range
+    assert [(first[i1:i2], second[j1:j2]) for _, i1, i2, j1, j2 in changed(opcodes)] == [
+        (['z: "old"\n'], ['y: true\n', 'z: "new"\n'])
+    ]
+
+
+def test_sequence_items_are_aligned():
+    first = document([{"id": n} for n in range(5)])
+    second = document([{"id": n} for n in (0, 1, "new", 2, 3, 4)])
+    assert changed(match_documents(first, second)) == [('insert', 2, 2, 2, 3)]
+
+
+def test_structural_diff_of_reordered_files(tmp_path):
+    value = {"services": {f"svc{n}": {"image": f"img{n}:1"} for n in range(50)}}
+    reordered = {"services": dict(reversed(list(json.loads(json.dumps(value))["services"].items())))}
+    reordered["services"]["svc7"]["image"] = "img7:2"
+    differ = _differ(tmp_path, json.dumps(value, indent=2), json.dumps(reordered, indent=4))
+    stats = differ.get_stats()
+    assert (stats['added'], stats['removed'], stats['changed']) == (0, 0, 1)
+    unified = ''.join(differ.iter_unified(context=0))
+    assert '-services.svc7.image: "img7:1"' in unified
+    assert '+services.svc7.image: "img7:2"' in unified
+    assert 'services.svc7.image' in differ.get_diff()['diff_html']
+
+
+def test_unparsable_side_falls_back_to_lines(tmp_path):
+    differ = _differ(tmp_path, '{"a": 1}\n', '{"a": \n')
+    assert differ.get_opcodes() == [('replace', 0, 1, 0, 1)]
+    assert '{"a": ' in differ.get_diff()['diff_html']
+
+
+def test_unknown_extension_uses_lines_in_auto_mode(tmp_path):
+    differ = _differ(tmp_path, '{"a": 1, "b": 2}\n', '{"b": 2, "a": 1}\n', suffix='.txt')
+    assert changed(differ.get_opcodes()) != []
+    forced = _differ(tmp_path, '{"a": 1, "b": 2}\n', '{"b": 2, "a": 1}\n', 'json', suffix='.txt')
+    assert changed(forced.get_opcodes()) == []
+
+
+def test_invalid_structure_mode(tmp_path):
+    with pytest.raises(DifferError, match="Unknown structure mode"):
+        _differ(tmp_path, '{}', '{}', structure='xml')
+
+
+@pytest.mark.skipif(not YAML_AVAILABLE, reason="pyyaml is not installed")
+def test_yaml_documents(tmp_path):
+    differ = _differ(
+        tmp_path,
+        "name: app\nreplicas: 2\nports:\n  - 80\n",
+        "ports:\n  - 80\nreplicas: 3\nname: app\n",
+        suffix='.yaml'
+    )
+    unified = ''.join(differ.iter_unified(context=0))
+    assert '-replicas: 2' in unified and '+replicas: 3' in unified
+    assert 'name' not in unified
@@ -0,0 +1,72 @@
+import difflib
+
+import pytest
+
+from live_differ.modules import trim
+from live_differ.modules.differ import FileDiffer
+from live_differ.modules.moves import Move
+from live_differ.modules.normalize import NormalizeOptions
+from live_differ.modules.trim import common_affixes, untrim_opcodes
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Small blocks so the tests cross block boundaries
+    monkeypatch.setattr(trim, 'BLOCK_LINES', 4)
+
+
+def lines(*names):
+    return [f"{name}\n" for name in names]
+
+
+@pytest.mark.parametrize('file1,file2,expected', [
+    ([], [], (0, 0)),
+    (lines('a'), [], (0, 0)),
+    (lines('a', 'b'), lines('a', 'b'), (2, 0)),
+    (lines('a', 'b', 'c'), lines('a', 'x', 'c'), (1, 1)),
+    (lines('a', 'a', 'a'), lines('a', 'a'), (2, 0)),
+    (lines('x', 'a', 'b'), lines('a', 'b'), (0, 2)),
+    (lines(*'abcdefghij', 'x', *'klmnopqrst'), lines(*'abcdefghij', *'klmnopqrst'), (10, 10)),
+])
+def test_common_affixes(file1, file2, expected):
+    assert common_affixes(file1, file2) == expected
+
+
+def test_common_affixes_matches_a_line_by_line_scan():
+    file1 = [f"{i % 7}\n" for i in range(200)]
+    for edit in (0, 3, 4, 5, 99, 196, 199):
+        file2 = list(file1)
+        file2[edit] = 'changed\n'
+        prefix, suffix = common_affixes(file1, file2)
+        assert (prefix, suffix) == (edit, 199 - edit)
+
+
+@pytest.mark.parametrize('file1,file2', [
+    (lines('a', 'b', 'c'), lines('a', 'b', 'c')),
+    (lines(*'abcdef'), lines(*'abXdef')),
+    (lines(*'abcdef'), lines(*'abcdefgh')),
+    (lines(*'abcdef'), lines(*'ab')),
+    (lines(*'abcdef'), lines(*'xyabcdef')),
+    ([], lines('a')),
+])
+def test_trimmed_matching_gives_the_same_opcodes(file1, file2):
+    expected = difflib.SequenceMatcher(None, file1, file2).get_opcodes()
+    assert FileDiffer.match_lines(file1, file2) == expected
+
+
+def test_untrim_merges_lines_equal_after_normalizing():
+    opcodes = FileDiffer.match_lines(
+        lines('a', 'b  ', 'c', 'd'), lines('a', 'b', 'c', 'x'),
+        NormalizeOptions(ignore_whitespace=True)
+    )
+    assert opcodes == [('equal', 0, 3, 0, 3), ('replace', 3, 4, 3, 4)]
+    assert untrim_opcodes([], 3, 3, 3) == [('equal', 0, 3, 0, 3)]
+
+
+def test_moves_are_found_inside_the_middle_region():
+    block = lines(*'ghijk')
+    file1 = lines(*'ab') + block + lines(*'cdef') + lines('y', 'z')
+    file2 = lines(*'ab') + lines(*'cdef') + block + lines('y', 'z')
+    model = FileDiffer.build_row_model(file1, file2)
+    # The longer block is matched in place, so the shorter one is the move
+    assert model.moves == [Move(7, 2, 4)]
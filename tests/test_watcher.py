@@ -10,6 +10,7 @@ def mock_differ():
     differ = Mock()
     differ.file1_path = "/path/to/file1.txt"
     differ.file2_path = "/path/to/file2.txt"
+    differ.watch_paths.return_value = [differ.file1_path, differ.file2_path]
     differ.get_diff.return_value = {"diff": "test diff"}
     return differ
 
@@ -40,6 +41,7 @@ def test_on_modified_handles_watched_files(mock_differ, mock_socket):
     
     handler.on_modified(event)
     mock_differ.get_diff.assert_called_once()
+    mock_differ.update_search_index.assert_called_once()
     mock_socket.emit.assert_called_once_with('update_diff', {"diff": "test diff"}, namespace='/')
 
 def test_on_modified_debounce(mock_differ, mock_socket):
@@ -56,10 +58,28 @@ def test_on_modified_debounce(mock_differ, mock_socket):
     # Should still be 1 due to debounce
     assert mock_differ.get_diff.call_count == 1
     
-    # Wait for debounce period and try again
+    # The change inside the window is diffed once the window ends
     time.sleep(0.4)  # Debounce is 0.3s
-    handler.on_modified(event)
     assert mock_differ.get_diff.call_count == 2
+    
+    # Bursts are diffed at their start and once more at their end
+    time.sleep(0.4)
+    for _ in range(5):
+        handler.on_modified(event)
+    assert mock_differ.get_diff.call_count == 3
+    time.sleep(0.4)
+    assert mock_differ.get_diff.call_count == 4
+    # The diff never changed, so the catch-ups sent nothing
+    assert mock_socket.emit.call_count == 2
+
+def test_stop_drops_the_pending_catch_up(mock_differ, mock_socket):
+    handler = FileChangeHandler(mock_differ, mock_socket)
+    event = FileModifiedEvent(mock_differ.file1_path)
+    handler.on_modified(event)
+    handler.on_modified(event)
+    handler.stop()
+    time.sleep(0.4)
+    assert mock_differ.get_diff.call_count == 1
 
 def test_on_modified_ignores_unrelated_files(mock_differ, mock_socket):
     handler = FileChangeHandler(mock_differ, mock_socket)